@@ -1,13 +1,15 @@
 import json
-import random
-import string
-import paypalrestsdk
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from users.models import User
 from flights.models import Flight
 from bookings.models import Booking
+from bookings.inventory import place_hold, SeatsUnavailable
+from bookings.references import next_booking_reference
+from payments.gateway import approval_url, booking_sale, get_gateway
 from payments.models import Payment
+from core.db_router import replica_reads
 from .knowledge_base import KnowledgeBase
 
 # Modern LangChain imports
@@ -29,13 +31,6 @@ except ImportError as e:
     LANGCHAIN_AVAILABLE = False
     print(f"⚠️ LangChain not available: {e}")
 
-# Configure PayPal SDK
-paypalrestsdk.configure({
-    "mode": settings.PAYPAL_MODE,
-    "client_id": settings.PAYPAL_CLIENT_ID,
-    "client_secret": settings.PAYPAL_CLIENT_SECRET,
-})
-
 class TravelAIAgent:
     def __init__(self):
         """Initialize AI agent with Gemini Flash 2.5"""
@@ -227,7 +222,8 @@ class TravelAIAgent:
                     | Q(arrival_airport__code__icontains=arrival)
                 )
 
-            flights = flights.select_related("departure_airport", "arrival_airport")[:15]
+            with replica_reads():
+                flights = list(flights.select_related("departure_airport", "arrival_airport")[:15])
 
             results = []
             for flight in flights:
@@ -276,21 +272,26 @@ class TravelAIAgent:
             flight = Flight.objects.get(id=data["flight_id"])
             user = User.objects.get(id=data["user_id"])
 
-            if flight.available_seats < len(data["passengers"]):
+            booking_reference = next_booking_reference()
+            try:
+                # Seats are held atomically together with the booking insert
+                with transaction.atomic():
+                    booking = Booking.objects.create(
+                        user=user,
+                        flight=flight,
+                        booking_reference=booking_reference,
+                        status="pending_payment",
+                        passengers=data["passengers"],
+                        total_amount=flight.price * len(data["passengers"]),
+                    )
+                    place_hold(booking)
+            except SeatsUnavailable:
+                flight.refresh_from_db(fields=["available_seats"])
                 return json.dumps({
                     "success": False,
                     "error": f"Only {flight.available_seats} seats available"
                 })
 
-            booking = Booking.objects.create(
-                user=user,
-                flight=flight,
-                booking_reference=self._generate_booking_reference(),
-                status="pending_payment",
-                passengers=data["passengers"],
-                total_amount=flight.price * len(data["passengers"]),
-            )
-
             return json.dumps({
                 "success": True,
                 "booking_reference": booking.booking_reference,
@@ -311,46 +312,23 @@ class TravelAIAgent:
                 status="pending_payment",
             )
 
-            payment = paypalrestsdk.Payment({
-                "intent": "sale",
-                "payer": {"payment_method": "paypal"},
-                "redirect_urls": {
-                    "return_url": f"{settings.FRONTEND_URL}/payment/success/",
-                    "cancel_url": f"{settings.FRONTEND_URL}/payment/cancel/",
-                },
-                "transactions": [{
-                    "amount": {
-                        "total": f"{float(booking.total_amount):.2f}",
-                        "currency": "USD",
-                    },
-                    "description": f"Flight booking {booking.booking_reference}",
-                    "custom": json.dumps({"user_id": data["user_id"]}),
-                }],
-            })
-
-            if payment.create():
-                Payment.objects.create(
-                    booking=booking,
-                    amount=booking.total_amount,
-                    payment_method="paypal",
-                    paypal_order_id=payment.id,
-                    status="pending",
-                )
-
-                approval_url = next(
-                    link.href for link in payment.links if link.rel == "approval_url"
-                )
+            payment = get_gateway().create_payment(booking_sale(booking, {"user_id": data["user_id"]}))
+            Payment.objects.create(
+                booking=booking,
+                amount=booking.total_amount,
+                payment_method="paypal",
+                paypal_order_id=payment["id"],
+                status="pending",
+            )
 
-                return json.dumps({
-                    "success": True,
-                    "payment_id": payment.id,
-                    "approval_url": approval_url,
-                    "booking_reference": booking.booking_reference,
-                    "amount": float(booking.total_amount),
-                    "message": "PayPal payment created successfully.",
-                })
-            else:
-                return json.dumps({"success": False, "error": str(payment.error)})
+            return json.dumps({
+                "success": True,
+                "payment_id": payment["id"],
+                "approval_url": approval_url(payment),
+                "booking_reference": booking.booking_reference,
+                "amount": float(booking.total_amount),
+                "message": "PayPal payment created successfully.",
+            })
 
         except Exception as e:
             return json.dumps({"success": False, "error": str(e)})
@@ -381,7 +359,12 @@ class TravelAIAgent:
 
     def get_user_bookings(self, user_id):
         try:
-            bookings = Booking.objects.filter(user__id=user_id).select_related("flight").order_by("-created_at")[:10]
+            with replica_reads(user_id=user_id):
+                bookings = list(
+                    Booking.objects.filter(user__id=user_id)
+                    .select_related("flight__departure_airport", "flight__arrival_airport")
+                    .order_by("-created_at")[:10]
+                )
             results = [{
                 "booking_reference": b.booking_reference,
                 "status": b.status,
@@ -395,9 +378,6 @@ class TravelAIAgent:
         except Exception as e:
             return json.dumps({"error": f"Error retrieving bookings: {str(e)}"})
 
-    def _generate_booking_reference(self):
-        return "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
-
     def process_message(self, user_message, user_id=None):
         """Process user messages with Gemini Flash 2.5"""
         if not self.agent_executor:
@@ -1,3 +1,110 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.admission import AdaptiveLimiter, LocalTokenBuckets, get_limiter, reset_admission
+from users.models import User
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class AdaptiveLimiterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AdaptiveLimiter(
+            initial=2, minimum=1, maximum=4, max_queue=0, tolerance=2.0, backoff=0.5, alpha=0.1, clock=self.clock,
+        )
+
+    def run_request(self, seconds, failed=False):
+        started = self.limiter.acquire(0)
+        self.clock.now += seconds
+        self.limiter.release(started, failed)
+
+    def test_sheds_beyond_limit_and_queue(self):
+        self.assertIsNotNone(self.limiter.acquire(0))
+        self.assertIsNotNone(self.limiter.acquire(0))
+        self.assertIsNone(self.limiter.acquire(1))
+
+    def test_slow_requests_cut_the_limit_once_per_round_trip(self):
+        self.run_request(1.0)
+        first = self.limiter.acquire(0)
+        second = self.limiter.acquire(0)
+        self.clock.now += 5
+        self.limiter.release(first)
+        self.assertEqual(self.limiter.limit, 1.0)
+        # Started before the cut: no second decrease
+        self.limiter.release(second)
+        self.assertEqual(self.limiter.limit, 1.0)
+
+    def test_failures_cut_the_limit(self):
+        self.run_request(1.0)
+        self.run_request(0.1, failed=True)
+        self.assertEqual(self.limiter.capacity, 1)
+
+    def test_limit_grows_only_when_reached(self):
+        self.run_request(1.0)
+        self.assertEqual(self.limiter.limit, 2.0)
+        started = [self.limiter.acquire(0), self.limiter.acquire(0)]
+        self.clock.now += 1.0
+        for start in started:
+            self.limiter.release(start)
+        self.assertEqual(self.limiter.limit, 2.5)
+
+
+class LocalTokenBucketsTest(SimpleTestCase):
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        buckets = LocalTokenBuckets(max_entries=10, clock=clock)
+        self.assertTrue(buckets.take('user', rate=0.5, burst=2)[0])
+        self.assertTrue(buckets.take('user', rate=0.5, burst=2)[0])
+        allowed, wait = buckets.take('user', rate=0.5, burst=2)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 2.0)
+        self.assertTrue(buckets.take('other', rate=0.5, burst=2)[0])
+        clock.now += 2.0
+        self.assertTrue(buckets.take('user', rate=0.5, burst=2)[0])
+
+
+@override_settings(ADMISSION_CONTROL={'BACKEND': 'local', 'SCOPES': {'ai.chat': {
+    'INITIAL_LIMIT': 1, 'MAX_LIMIT': 1, 'MAX_QUEUE': 0, 'RATE_PER_MINUTE': 60, 'BURST': 2,
+}}})
+@mock.patch('ai_agent.views.TravelAIAgent')
+class ChatAdmissionTest(TestCase):
+
+    def setUp(self):
+        reset_admission()
+        self.addCleanup(reset_admission)
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def chat(self):
+        return self.client.post('/api/ai/chat/', {'message': 'Find me a flight'}, format='json')
+
+    def test_user_quota(self, agent):
+        agent.return_value.process_message.return_value = 'Here you go'
+        self.assertEqual(self.chat().status_code, 200)
+        self.assertEqual(self.chat().status_code, 200)
+        response = self.chat()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_sheds_when_busy(self, agent):
+        agent.return_value.process_message.return_value = 'Here you go'
+        started = get_limiter('ai.chat').acquire(0)
+        response = self.chat()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        agent.assert_not_called()
+        get_limiter('ai.chat').release(started)
+        self.assertEqual(self.chat().status_code, 200)
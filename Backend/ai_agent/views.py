@@ -1,10 +1,12 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import permissions
+from core.admission import admission_controlled
 from .agent import TravelAIAgent
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@admission_controlled('ai.chat')
 def chat_with_agent(request):
     user_message = request.data.get('message', '')
     user_id = request.user.id
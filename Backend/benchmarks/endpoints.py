@@ -0,0 +1,157 @@
+"""
+The endpoints the benchmark suite exercises: every route in ``core/urls.py``
+except the admin.
+
+Each ``Endpoint`` builds its request from the seeded data with ``build()``,
+which the runner calls before each request, outside the measurement.
+``prepare`` serves endpoints that consume what they act on (a payment
+needs an unpaid booking). A ``token`` in its context replaces the seeded
+user's token for the request.
+"""
+import uuid
+from datetime import timedelta
+
+from django.utils import timezone
+from knox.models import AuthToken
+
+from bookings.models import Booking, SeatHold
+from bookings.references import next_booking_reference
+from payments.models import Payment
+
+
+class Endpoint:
+
+    def __init__(self, name, method, path, data=None, expect=200, auth=True, staff=False, prepare=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.expect = expect
+        self.auth = auth
+        self.staff = staff
+        self.prepare = prepare
+
+    def build(self, seed):
+        """Return (path, data, token or None) for one request."""
+        context = self.prepare(seed) if self.prepare else {}
+        path = self.path(seed, context) if callable(self.path) else self.path
+        data = self.data(seed, context) if callable(self.data) else self.data
+        return path, data, context.get('token')
+
+
+def _own_token(seed):
+    # Logout deletes the token it is called with
+    return {'token': AuthToken.objects.create(seed.user)[1]}
+
+
+def _pending_booking(seed):
+    flight = seed.flights[0]
+    booking = Booking.objects.create(
+        user=seed.user,
+        flight=flight,
+        booking_reference=next_booking_reference(),
+        passengers=[{'name': 'Ann Example'}],
+        total_amount=flight.price,
+    )
+    SeatHold.objects.create(
+        booking=booking, flight=flight, seats=1, expires_at=timezone.now() + timedelta(minutes=15),
+    )
+    return {'booking': booking}
+
+
+def _pending_payment(seed):
+    context = _pending_booking(seed)
+    context['payment'] = Payment.objects.create(
+        booking=context['booking'],
+        amount=context['booking'].total_amount,
+        paypal_order_id=f"PAYID-{uuid.uuid4().hex[:20].upper()}",
+    )
+    return context
+
+
+def _search(seed, extra=''):
+    return (
+        f"/api/flights/search/?departure={seed.origin.code}&arrival={seed.destination.code}"
+        f"&date={seed.route_date.isoformat()}{extra}"
+    )
+
+
+def _passengers(count):
+    return [{'name': f"Passenger {index}", 'passport': f"X{index:07d}"} for index in range(count)]
+
+
+ENDPOINTS = [
+    # Auth
+    Endpoint(
+        'auth.register', 'post', '/api/auth/register/', auth=False, expect=201,
+        data=lambda seed, context: {'username': f"new-{uuid.uuid4().hex[:12]}", 'password': 'Str0ng-password!', 'email': 'new@bench.invalid'},
+    ),
+    Endpoint(
+        'auth.login', 'post', '/api/auth/login/', auth=False,
+        data=lambda seed, context: {'username': seed.user.username, 'password': 'bench-password'},
+    ),
+    Endpoint('auth.profile', 'get', '/api/auth/profile/'),
+    Endpoint('auth.logout', 'post', '/api/auth/logout/', prepare=_own_token),
+
+    # Flights
+    Endpoint('flights.airports', 'get', '/api/flights/airports/'),
+    Endpoint('flights.search', 'get', lambda seed, context: _search(seed)),
+    Endpoint('flights.search_all_dates', 'get', lambda seed, context: f"/api/flights/search/?departure={seed.origin.code}"),
+    Endpoint('flights.search_facets', 'get', lambda seed, context: _search(seed, '&facets=1&sort=price')),
+    Endpoint(
+        'flights.itineraries', 'get',
+        lambda seed, context: (
+            f"/api/flights/itineraries/?departure={seed.airports[7].code}&arrival={seed.airports[9].code}"
+            f"&date={seed.route_date.isoformat()}"
+        ),
+    ),
+    Endpoint(
+        'flights.calendar', 'get',
+        lambda seed, context: f"/api/flights/calendar/?departure={seed.origin.code}&arrival={seed.destination.code}&from={timezone.localdate().isoformat()}",
+    ),
+    Endpoint('flights.detail', 'get', lambda seed, context: f"/api/flights/{seed.flights[0].pk}/"),
+
+    # Bookings
+    Endpoint('bookings.list', 'get', '/api/bookings/'),
+    Endpoint('bookings.list_page_3', 'get', '/api/bookings/?page=3'),
+    Endpoint(
+        'bookings.detail', 'get',
+        lambda seed, context: f"/api/bookings/{Booking.objects.filter(user=seed.user).values_list('pk', flat=True).first()}/",
+    ),
+    Endpoint(
+        'bookings.create', 'post', '/api/bookings/create/', expect=201,
+        data=lambda seed, context: {'flight': seed.flights[1].pk, 'passengers': _passengers(2)},
+    ),
+    Endpoint(
+        'bookings.bulk', 'post', '/api/bookings/bulk/', expect=201,
+        data=lambda seed, context: {'bookings': [
+            {'flight': flight.pk, 'passengers': _passengers(2)} for flight in seed.flights[2:22]
+        ]},
+    ),
+    Endpoint('bookings.passengers_by_passport', 'get', lambda seed, context: f"/api/bookings/passengers/?passport={seed.passport}", staff=True),
+    Endpoint('bookings.passengers_by_name', 'get', '/api/bookings/passengers/?name=passenger%201', staff=True),
+    Endpoint('bookings.export_csv', 'get', '/api/bookings/export/', staff=True),
+    Endpoint('bookings.export_ndjson_zstd', 'get', '/api/bookings/export/?output=ndjson&compress=zstd', staff=True),
+    Endpoint('bookings.manifest', 'get', lambda seed, context: f"/api/bookings/manifest/{seed.flights[0].pk}/", staff=True),
+
+    # Payments
+    Endpoint(
+        'payments.create', 'post',
+        lambda seed, context: f"/api/payments/create-paypal-payment/{context['booking'].pk}/",
+        data=lambda seed, context: {'booking_reference': context['booking'].booking_reference},
+        prepare=_pending_booking,
+    ),
+    Endpoint(
+        'payments.execute', 'post', '/api/payments/execute-payment/',
+        data=lambda seed, context: {'payment_id': context['payment'].paypal_order_id, 'payer_id': 'BENCHPAYER'},
+        prepare=_pending_payment,
+    ),
+    Endpoint(
+        'payments.webhook', 'post', '/api/payments/webhook/paypal/', auth=False,
+        data=lambda seed, context: {'event_type': 'PAYMENT.SALE.COMPLETED', 'resource': {'id': uuid.uuid4().hex}},
+    ),
+
+    # AI
+    Endpoint('ai.chat', 'post', '/api/ai/chat/', data={'message': 'Find me a flight'}),
+    Endpoint('ai.policies', 'get', '/api/ai/policies/'),
+]
@@ -0,0 +1,75 @@
+"""
+Stand-ins for the external services the API calls, so benchmarks measure
+our own code and never reach PayPal, Gemini or the embedding model.
+"""
+import uuid
+from contextlib import ExitStack
+from unittest import mock
+
+from django.conf import settings
+
+
+class FakePayPalGateway:
+    """Mimics ``payments.gateway.PayPalGateway``; every call succeeds at once."""
+
+    def create_payment(self, payment, request_id=None):
+        payment_id = f"PAYID-{uuid.uuid4().hex[:20].upper()}"
+        return {
+            'id': payment_id,
+            'state': 'created',
+            'links': [{'rel': 'approval_url', 'href': f"https://paypal.invalid/approve/{payment_id}"}],
+        }
+
+    def find_payment(self, payment_id):
+        return {'id': payment_id, 'state': 'created'}
+
+    def execute_payment(self, payment_id, payer_id, request_id=None):
+        return {'id': payment_id, 'state': 'approved'}
+
+
+class FakeAgentExecutor:
+    """Plays the LLM: every message becomes one flight search tool call, like a typical agent turn."""
+
+    def __init__(self, agent, route):
+        self.agent = agent
+        self.route = route
+
+    def invoke(self, inputs):
+        return {'output': f"Here are some options:\n{self.agent.search_flights(self.route)}"}
+
+
+def fake_agent_init(route):
+    """A ``TravelAIAgent.__init__`` wired to FakeAgentExecutor and a knowledge base without the vector index."""
+    from ai_agent.knowledge_base import KnowledgeBase
+
+    class FakeKnowledgeBase(KnowledgeBase):
+        def __init__(self):
+            self.data_dir = settings.DATA_DIR
+            self.policies_csv = settings.COMPANY_POLICIES_CSV
+            self.flights_csv = settings.FLIGHT_DATA_CSV
+            self.index = None
+            self.vector_store = None
+
+        def query_knowledge_base(self, query):
+            return "Economy fares include one 23kg checked bag."
+
+    def init(agent):
+        agent.knowledge_base = FakeKnowledgeBase()
+        agent.casual_chat_llm = None
+        agent.memory = mock.Mock(chat_memory=mock.Mock(messages=[]))
+        agent.agent_executor = FakeAgentExecutor(agent, route)
+
+    return init
+
+
+def fake_backends(route):
+    """Context manager patching PayPal, the AI agent and the Celery broker for the duration of a benchmark run."""
+    from ai_agent.agent import TravelAIAgent
+
+    stack = ExitStack()
+    stack.enter_context(mock.patch('payments.gateway._gateway', FakePayPalGateway()))
+    stack.enter_context(mock.patch.object(TravelAIAgent, '__init__', fake_agent_init(route)))
+    stack.enter_context(mock.patch('payments.tasks.process_payment_webhooks.delay'))
+    # Deliveries carry no PayPal signature
+    stack.enter_context(mock.patch('payments.views.verify_signature'))
+    return stack
@@ -0,0 +1,151 @@
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from knox.models import AuthToken
+
+from benchmarks.fakes import FakeAgentExecutor, fake_backends
+from benchmarks.seed import seed
+from core.admission import admission_settings, get_limiter, reset_admission
+from users.models import User
+
+UNLIMITED = {'SCOPES': {'ai.chat': {'INITIAL_LIMIT': 10 ** 6, 'MAX_LIMIT': 10 ** 6, 'RATE_PER_MINUTE': 0}}}
+
+
+def _percentiles(values):
+    if not values:
+        return 0.0, 0.0, 0.0
+    quantiles = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else values * 99
+    return quantiles[49], quantiles[94], quantiles[98]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and flood the AI chat, whose LLM is a fake with the given '
+        'latency, while other clients search flights on the same pool of worker threads. Runs once '
+        'without admission control and once with ADMISSION_CONTROL, and reports search latency and '
+        'how the chat requests were answered. Clients honour Retry-After.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Worker threads shared by all requests, as in one app process')
+        parser.add_argument('--chat-clients', type=int, default=24)
+        parser.add_argument('--search-clients', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=15)
+        parser.add_argument('--llm-latency-ms', type=float, default=1500)
+        parser.add_argument('--llm-jitter-ms', type=float, default=500)
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options['keepdb'], serialized_aliases=set(),
+        )
+        try:
+            data = seed()
+            tokens = [
+                AuthToken.objects.create(User.objects.create_user(username=f"bench-chat-{index}", password='bench-password'))[1]
+                for index in range(options['chat_clients'])
+            ]
+            search = (
+                f"/api/flights/search/?departure={data.origin.code}&arrival={data.destination.code}"
+                f"&date={data.route_date.isoformat()}"
+            )
+            invoke = FakeAgentExecutor.invoke
+            latency = options['llm_latency_ms'] / 1000
+            jitter = options['llm_jitter_ms'] / 1000
+
+            def slow_invoke(executor, inputs):
+                time.sleep(max(0.0, random.gauss(latency, jitter / 2)))
+                return invoke(executor, inputs)
+
+            with fake_backends(f"{data.origin.city} to {data.destination.city}"), \
+                    mock.patch.object(FakeAgentExecutor, 'invoke', slow_invoke):
+                for name, config in (
+                    ('without admission control', UNLIMITED),
+                    ('with admission control', {**admission_settings(), 'BACKEND': 'local'}),
+                ):
+                    with override_settings(ADMISSION_CONTROL=config):
+                        reset_admission()
+                        try:
+                            self.report(name, self.run(data.token, tokens, search, options))
+                        finally:
+                            reset_admission()
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def run(self, search_token, chat_tokens, search, options):
+        local = threading.local()
+        deadline = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        search_ms, chat_ms, chat_statuses = [], [], Counter()
+
+        def serve(token, method, path, body=None):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            headers = {'Authorization': f"Token {token}"}
+            if method == 'get':
+                return local.client.get(path, headers=headers)
+            return local.client.post(path, body, content_type='application/json', headers=headers)
+
+        closing = threading.Barrier(options['workers'])
+
+        def close_connections():
+            connections.close_all()
+            # Holding every worker until all have closed makes each one run this once
+            closing.wait()
+
+        def search_client(pool):
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = pool.submit(serve, search_token, 'get', search).result()
+                with lock:
+                    if response.status_code == 200:
+                        search_ms.append((time.perf_counter() - started) * 1000)
+
+        def chat_client(pool, token):
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = pool.submit(serve, token, 'post', '/api/ai/chat/', {'message': 'Find me a flight'}).result()
+                with lock:
+                    chat_statuses[response.status_code] += 1
+                    if response.status_code == 200:
+                        chat_ms.append((time.perf_counter() - started) * 1000)
+                if 'Retry-After' in response:
+                    time.sleep(min(float(response['Retry-After']), max(0.0, deadline - time.perf_counter())))
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            clients = [threading.Thread(target=search_client, args=(pool,)) for _ in range(options['search_clients'])]
+            clients += [threading.Thread(target=chat_client, args=(pool, token)) for token in chat_tokens]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            for _ in range(options['workers']):
+                pool.submit(close_connections)
+        return {
+            'search': _percentiles(search_ms), 'searches': len(search_ms),
+            'chat': _percentiles(chat_ms), 'chat_statuses': chat_statuses,
+            'limit': get_limiter('ai.chat').capacity,
+        }
+
+    def report(self, name, result):
+        s50, s95, s99 = result['search']
+        c50, c95, c99 = result['chat']
+        statuses = ', '.join(f"{code}: {count}" for code, count in sorted(result['chat_statuses'].items()))
+        self.stdout.write(
+            f"{name}\n"
+            f"  search  {result['searches']:5d} ok  p50 {s50:8.1f} ms  p95 {s95:8.1f} ms  p99 {s99:8.1f} ms\n"
+            f"  chat    p50 {c50:8.1f} ms  p95 {c95:8.1f} ms  p99 {c99:8.1f} ms  ({statuses}); final limit {result['limit']}"
+        )
@@ -0,0 +1,148 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from benchmarks.paypal_emulator import PayPalEmulator
+from benchmarks.seed import seed
+from payments.gateway import PayPalGateway, gateway_settings, reset_gateway
+
+_flow = threading.local()
+
+
+class FlowFailed(Exception):
+    pass
+
+
+def _percentiles(values):
+    quantiles = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else values * 99
+    return quantiles[49], quantiles[94], quantiles[98]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and run complete payment flows (create booking, create '
+        'PayPal payment, buyer approval, execute) concurrently against the local PayPal emulator. '
+        'Reports flows/s, end-to-end percentiles and how much of each flow is spent waiting on PayPal.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flows', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--latency-ms', type=float, default=150, help='Emulated PayPal latency per call')
+        parser.add_argument('--jitter-ms', type=float, default=100)
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of PayPal calls answered with 503')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options['keepdb'], serialized_aliases=set(),
+        )
+        emulator = PayPalEmulator(
+            latency_ms=options['latency_ms'], jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'], seed=42,
+        )
+        try:
+            data = seed()
+            with emulator, override_settings(PAYPAL_GATEWAY={**gateway_settings(), 'BASE_URL': emulator.url}):
+                reset_gateway()
+                try:
+                    self.run(data, emulator, options)
+                finally:
+                    reset_gateway()
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def run(self, data, emulator, options):
+        if connection.vendor == 'sqlite' and options['concurrency'] > 1:
+            # SQLite's in-memory test database locks whole tables on write
+            self.stdout.write(self.style.WARNING('SQLite: running flows one at a time; use PostgreSQL to measure concurrency'))
+            options['concurrency'] = 1
+        flights = [flight.pk for flight in data.flights[1:201]]
+        original_request = PayPalGateway._request
+
+        def timed_request(gateway, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original_request(gateway, *args, **kwargs)
+            finally:
+                _flow.gateway_seconds += time.perf_counter() - started
+
+        def flow(index):
+            client = Client(HTTP_AUTHORIZATION=f"Token {data.token}")
+            _flow.gateway_seconds = 0.0
+            started = time.perf_counter()
+            try:
+                response = client.post('/api/bookings/create/', {
+                    'flight': flights[index % len(flights)],
+                    'passengers': [{'name': f"Flow Passenger {index}", 'passport': f"F{index:07d}"}],
+                }, content_type='application/json')
+                self.expect(response, 201)
+                booking = response.json()
+
+                response = client.post(
+                    f"/api/payments/create-paypal-payment/{booking['id']}/",
+                    {'booking_reference': booking['booking_reference']}, content_type='application/json',
+                )
+                self.expect(response, 200)
+                order_id = response.json()['paypal_order_id']
+
+                # The buyer approves on PayPal's side; not our latency, so not timed
+                approve_started = time.perf_counter()
+                payer_id = f"FLOWPAYER{index}"
+                requests.get(f"{emulator.url}/checkout/approve", params={'paymentId': order_id, 'PayerID': payer_id}, timeout=5)
+                approve_seconds = time.perf_counter() - approve_started
+
+                response = client.post(
+                    '/api/payments/execute-payment/', {'payment_id': order_id, 'payer_id': payer_id},
+                    content_type='application/json',
+                )
+                self.expect(response, 200)
+                return time.perf_counter() - started - approve_seconds, _flow.gateway_seconds
+            finally:
+                connections.close_all()
+
+        latencies, gateway_times, failures = [], [], []
+        with mock.patch.object(PayPalGateway, '_request', timed_request):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                for future in [pool.submit(flow, index) for index in range(options['flows'])]:
+                    try:
+                        total, gateway = future.result()
+                    except FlowFailed as e:
+                        failures.append(str(e))
+                        continue
+                    latencies.append(total * 1000)
+                    gateway_times.append(gateway * 1000)
+            elapsed = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError(f"Every flow failed, e.g. {failures[0]}")
+        p50, p95, p99 = _percentiles(latencies)
+        g50, g95, g99 = _percentiles(gateway_times)
+        self.stdout.write(
+            f"{len(latencies)} flows in {elapsed:.1f} s at concurrency {options['concurrency']}: "
+            f"{len(latencies) / elapsed:.1f} flows/s, {len(failures)} failed\n"
+            f"  end to end  p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  p99 {p99:8.1f} ms\n"
+            f"  PayPal      p50 {g50:8.1f} ms  p95 {g95:8.1f} ms  p99 {g99:8.1f} ms  "
+            f"({sum(gateway_times) / sum(latencies):.0%} of flow time)\n"
+            f"  emulator    " + ', '.join(f"{key} {count}" for key, count in sorted(emulator.stats.items()))
+        )
+        for failure in sorted(set(failures))[:5]:
+            self.stdout.write(self.style.WARNING(f"  failure: {failure}"))
+
+    @staticmethod
+    def expect(response, status):
+        if response.status_code != status:
+            raise FlowFailed(f"{response.request['PATH_INFO']} answered {response.status_code}: {response.content[:200]!r}")
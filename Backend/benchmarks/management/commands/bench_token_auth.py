@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from users.authentication import CachedTokenAuthentication, invalidate_token, local_cache
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the authentication overhead of one request: plain knox against the cached '
+        'authentication with a cold cache, a shared-cache hit and a local hit. Reports queries '
+        'and p50/p95 microseconds per authentication on a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+        parser.add_argument('--tokens', type=int, default=5, help='Other live tokens of the same user, which knox also reads')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options['keepdb'], serialized_aliases=set(),
+        )
+        try:
+            user = User.objects.create_user(username='bench-auth', password='bench-password')
+            for _ in range(options['tokens']):
+                AuthToken.objects.create(user)
+            _, token = AuthToken.objects.create(user)
+            digest = hash_token(token)
+            request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f"Token {token}"))
+
+            cases = [
+                ('knox', TokenAuthentication(), None),
+                ('cached, cold', CachedTokenAuthentication(), lambda: invalidate_token(digest)),
+                ('cached, shared hit', CachedTokenAuthentication(), lambda: local_cache().delete(digest)),
+                ('cached, local hit', CachedTokenAuthentication(), None),
+            ]
+            cache.clear()
+            local_cache().clear()
+            for name, authenticator, reset in cases:
+                self.report(name, self.measure(authenticator, request, reset, options['iterations']))
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def measure(self, authenticator, request, reset, iterations):
+        authenticator.authenticate(request)
+        timings, queries = [], []
+        for _ in range(iterations):
+            if reset:
+                reset()
+            with CaptureQueriesContext(connections['default']) as captured:
+                started = time.perf_counter()
+                authenticator.authenticate(request)
+                timings.append((time.perf_counter() - started) * 1e6)
+            queries.append(len(captured))
+        quantiles = statistics.quantiles(timings, n=20, method='inclusive')
+        return {
+            'queries': statistics.mean(queries),
+            'p50_us': statistics.median(timings),
+            'p95_us': quantiles[18],
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<20} queries {result['queries']:5.2f}  p50 {result['p50_us']:9.1f} us  p95 {result['p95_us']:9.1f} us"
+        )
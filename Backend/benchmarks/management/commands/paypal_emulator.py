@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.paypal_emulator import PayPalEmulator
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local stand-in for the PayPal REST API until interrupted. '
+        'Point the app at it with PAYPAL_BASE_URL=http://<host>:<port>.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=150, help='Added to every API call')
+        parser.add_argument('--jitter-ms', type=float, default=100, help='Random extra latency, up to this much')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of API calls answered with 503')
+        parser.add_argument('--stall-rate', type=float, default=0.0, help='Share of API calls stalled first')
+        parser.add_argument('--stall-seconds', type=float, default=15.0)
+        parser.add_argument('--webhook-url', default='', help='Where to POST PAYMENT.SALE.COMPLETED after an execute')
+
+    def handle(self, *args, **options):
+        emulator = PayPalEmulator(
+            options['host'], options['port'],
+            latency_ms=options['latency_ms'], jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'], stall_rate=options['stall_rate'],
+            stall_seconds=options['stall_seconds'], webhook_url=options['webhook_url'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"PayPal emulator listening on {emulator.url}"))
+        with emulator:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                self.stdout.write(f"Served: {dict(emulator.stats)}")
@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from benchmarks.endpoints import ENDPOINTS
+from benchmarks.fakes import fake_backends
+from benchmarks.runner import EndpointFailed, budgets_from, check_budgets, measure
+from benchmarks.seed import seed
+from core.admission import admission_settings, reset_admission
+
+DEFAULT_BUDGETS = Path(__file__).resolve().parents[2] / 'budgets.json'
+
+
+def _unmetered_admission():
+    # One user sends every request: quotas are still checked, but never run out
+    config = admission_settings()
+    scopes = {scope: {**options, 'BURST': 10 ** 6} for scope, options in config['SCOPES'].items()}
+    return {**config, 'BACKEND': 'local', 'SCOPES': scopes}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and benchmark every API endpoint: SQL queries, p50/p95 '
+        'latency and peak allocations per request. Fails when a budget in the budget file is exceeded. '
+        'PayPal and the AI agent are replaced by in-process fakes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Multiplier for the seeded flights, users and bookings')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', default='', help='Comma-separated endpoint name prefixes, e.g. flights.,bookings.list')
+        parser.add_argument('--budgets', default=str(DEFAULT_BUDGETS))
+        parser.add_argument('--update-budgets', action='store_true', help='Write budgets from this run instead of checking them')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+
+    def handle(self, *args, **options):
+        prefixes = [prefix for prefix in options['only'].split(',') if prefix]
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not prefixes or any(endpoint.name.startswith(prefix) for prefix in prefixes)
+        ]
+        if not endpoints:
+            raise CommandError('No endpoint matches --only')
+
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options['keepdb'], serialized_aliases=set(),
+        )
+        try:
+            data = seed(scale=options['scale'])
+            results = {}
+            reset_admission()
+            with fake_backends(f"{data.origin.city} to {data.destination.city}"), \
+                    override_settings(ADMISSION_CONTROL=_unmetered_admission()):
+                client = Client()
+                for endpoint in endpoints:
+                    try:
+                        results[endpoint.name] = measure(
+                            client, endpoint, data, data.staff_token if endpoint.staff else data.token,
+                            iterations=options['iterations'], warmup=options['warmup'],
+                        )
+                    except EndpointFailed as e:
+                        raise CommandError(str(e))
+                    self.report(endpoint.name, results[endpoint.name])
+        finally:
+            reset_admission()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        budgets_path = Path(options['budgets'])
+        if options['update_budgets']:
+            budgets = json.loads(budgets_path.read_text()) if budgets_path.exists() else {}
+            budgets.update(budgets_from(results))
+            budgets_path.write_text(json.dumps(dict(sorted(budgets.items())), indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote budgets for {len(results)} endpoints to {budgets_path}"))
+            return
+
+        failures = check_budgets(results, json.loads(budgets_path.read_text()))
+        if failures:
+            raise CommandError('Performance budgets exceeded:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS(f"All {len(results)} endpoints within budget"))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<26} queries {result['queries']:>3}  p50 {result['p50_ms']:8.2f} ms  "
+            f"p95 {result['p95_ms']:8.2f} ms  alloc {result['alloc_kib']:>6} KiB"
+        )
@@ -0,0 +1,273 @@
+"""
+A local stand-in for the PayPal REST endpoints we use, for load tests that
+must not touch PayPal's rate-limited sandbox.
+
+Implemented: OAuth client-credentials tokens; v1 payment create, find and
+execute, with ``PayPal-Request-Id`` idempotency; webhook signature
+verification and simulated webhook events. The buyer's approval step,
+normally a browser redirect, is ``GET /checkout/approve?paymentId=...&PayerID=...``.
+Executing a payment delivers PAYMENT.SALE.COMPLETED to ``webhook_url`` if
+one is set.
+
+Every API call (not the approval step) waits ``latency_ms`` plus up to
+``jitter_ms``. With probability ``error_rate`` it answers 503 instead; with
+probability ``stall_rate`` it first stalls for ``stall_seconds``, to trip
+client read timeouts. Run it on its own with ``manage.py paypal_emulator``
+and point ``PAYPAL_BASE_URL`` at it, or start it in-process as
+``bench_payment_flow`` does.
+"""
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+import requests
+
+
+class EmulatorConfig:
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, stall_rate=0.0, stall_seconds=15.0,
+                 webhook_url='', seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.webhook_url = webhook_url
+        self.random = random.Random(seed)
+
+
+class PayPalEmulator:
+    """Threaded HTTP server holding payments in memory. ``start()`` runs it in a daemon thread."""
+
+    def __init__(self, host='127.0.0.1', port=0, **config):
+        self.config = EmulatorConfig(**config)
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.payments = {}
+        # (PayPal-Request-Id, route) -> (status, body) of the first response
+        self.replies = {}
+        self.stats = Counter()
+        self.server = ThreadingHTTPServer((host, port), _handler(self))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='paypal-emulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ------------------------------
+    # Behaviour
+    # ------------------------------
+    def delay(self):
+        """Injected latency and faults; returns an error reply instead of the real one, or None."""
+        config = self.config
+        with self.lock:
+            roll, jitter = config.random.random(), config.random.uniform(0, config.jitter_ms)
+        if roll < config.error_rate:
+            self.count('injected_errors')
+            return 503, {'name': 'SERVICE_UNAVAILABLE', 'message': 'Injected by the emulator'}
+        if roll < config.error_rate + config.stall_rate:
+            self.count('injected_stalls')
+            time.sleep(config.stall_seconds)
+        time.sleep((config.latency_ms + jitter) / 1000)
+        return None
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def issue_token(self):
+        token = f"EMU-{uuid.uuid4().hex}"
+        with self.lock:
+            self.tokens.add(token)
+        return 200, {'access_token': token, 'token_type': 'Bearer', 'expires_in': 32400, 'app_id': 'APP-EMULATOR'}
+
+    def create_payment(self, body):
+        payment_id = f"PAYID-EMU{uuid.uuid4().hex[:18].upper()}"
+        payment = {
+            'id': payment_id,
+            'intent': body.get('intent', 'sale'),
+            'state': 'created',
+            'payer': body.get('payer', {}),
+            'transactions': body.get('transactions', []),
+            'create_time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'links': [
+                {'href': f"{self.url}/v1/payments/payment/{payment_id}", 'rel': 'self', 'method': 'GET'},
+                {'href': f"{self.url}/checkout/approve?paymentId={payment_id}", 'rel': 'approval_url', 'method': 'REDIRECT'},
+                {'href': f"{self.url}/v1/payments/payment/{payment_id}/execute", 'rel': 'execute', 'method': 'POST'},
+            ],
+        }
+        with self.lock:
+            self.payments[payment_id] = {'payment': payment, 'payer_id': None}
+        return 201, payment
+
+    def approve(self, payment_id, payer_id):
+        with self.lock:
+            record = self.payments.get(payment_id)
+            if record is None:
+                return 404, {'name': 'INVALID_RESOURCE_ID', 'message': 'Requested resource ID was not found.'}
+            record['payer_id'] = payer_id or f"PAYER{uuid.uuid4().hex[:8].upper()}"
+        return 200, {'paymentId': payment_id, 'PayerID': record['payer_id']}
+
+    def find_payment(self, payment_id):
+        with self.lock:
+            record = self.payments.get(payment_id)
+        if record is None:
+            return 404, {'name': 'INVALID_RESOURCE_ID', 'message': 'Requested resource ID was not found.'}
+        return 200, record['payment']
+
+    def execute_payment(self, payment_id, body):
+        with self.lock:
+            record = self.payments.get(payment_id)
+            if record is None:
+                return 404, {'name': 'INVALID_RESOURCE_ID', 'message': 'Requested resource ID was not found.'}
+            payment = record['payment']
+            if payment['state'] == 'approved':
+                return 400, {'name': 'PAYMENT_ALREADY_DONE', 'message': 'Payment has been done already for this cart.'}
+            if record['payer_id'] is None or record['payer_id'] != body.get('payer_id'):
+                return 400, {'name': 'PAYMENT_NOT_APPROVED_FOR_EXECUTION', 'message': 'Payer has not approved payment'}
+            sale_id = uuid.uuid4().hex[:17].upper()
+            payment['state'] = 'approved'
+            payment['payer'] = {**payment['payer'], 'payer_info': {'payer_id': record['payer_id']}}
+            for transaction in payment['transactions']:
+                transaction['related_resources'] = [{'sale': {
+                    'id': sale_id, 'state': 'completed', 'amount': transaction.get('amount'), 'parent_payment': payment_id,
+                }}]
+        if self.config.webhook_url:
+            self.send_event('PAYMENT.SALE.COMPLETED', {'id': sale_id, 'state': 'completed', 'parent_payment': payment_id})
+        return 200, payment
+
+    def send_event(self, event_type, resource, url=None):
+        """POST a webhook event to ``url`` (default: the configured webhook URL) from a background thread."""
+        event = {
+            'id': f"WH-EMU{uuid.uuid4().hex[:18].upper()}",
+            'event_version': '1.0',
+            'create_time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'resource_type': event_type.split('.')[1].lower() if event_type.count('.') >= 2 else '',
+            'event_type': event_type,
+            'resource': resource,
+        }
+
+        def deliver():
+            try:
+                requests.post(url or self.config.webhook_url, data=orjson.dumps(event),
+                              headers={'Content-Type': 'application/json'}, timeout=10)
+                self.count('webhooks_sent')
+            except requests.RequestException:
+                self.count('webhooks_failed')
+
+        threading.Thread(target=deliver, daemon=True).start()
+        return event
+
+
+PAYMENT_PATH = re.compile(r'^/v1/payments/payment/(?P<payment_id>[^/]+)(?P<execute>/execute)?$')
+
+
+def _handler(emulator):
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so pooled clients reuse connections as they would with PayPal
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes; with Nagle the body waits for the client's delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, body):
+            payload = orjson.dumps(body)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def read_body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def authorized(self):
+            token = self.headers.get('Authorization', '').removeprefix('Bearer ')
+            with emulator.lock:
+                return token in emulator.tokens
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == '/checkout/approve':
+                query = parse_qs(parts.query)
+                emulator.count('approve')
+                return self.reply(*emulator.approve(query.get('paymentId', [''])[0], query.get('PayerID', [''])[0]))
+            match = PAYMENT_PATH.match(parts.path)
+            if not match or match['execute']:
+                return self.reply(404, {'name': 'NOT_FOUND'})
+            self.api('find', lambda body: emulator.find_payment(match['payment_id']))
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            if path == '/v1/oauth2/token':
+                return self.api('token', lambda body: emulator.issue_token(), auth=False)
+            if path == '/v1/payments/payment':
+                return self.api('create', emulator.create_payment)
+            if path == '/v1/notifications/verify-webhook-signature':
+                return self.api('verify', lambda body: (200, {'verification_status': 'SUCCESS'}))
+            if path == '/v1/notifications/simulate-event':
+                return self.api('simulate', lambda body: (202, emulator.send_event(
+                    body.get('event_type', 'PAYMENT.SALE.COMPLETED'), body.get('resource', {}), body.get('url'),
+                )))
+            match = PAYMENT_PATH.match(path)
+            if match and match['execute']:
+                return self.api('execute', lambda body: emulator.execute_payment(match['payment_id'], body))
+            self.read_body()
+            self.reply(404, {'name': 'NOT_FOUND'})
+
+        def api(self, route, handle, auth=True):
+            raw = self.read_body()
+            emulator.count(route)
+            fault = emulator.delay()
+            if fault:
+                return self.reply(*fault)
+            if auth and not self.authorized():
+                return self.reply(401, {'error': 'invalid_token', 'error_description': 'Token signature verification failed'})
+            try:
+                body = orjson.loads(raw) if raw and self.headers.get('Content-Type', '').startswith('application/json') else {}
+            except orjson.JSONDecodeError:
+                return self.reply(400, {'name': 'MALFORMED_REQUEST', 'message': 'Invalid JSON'})
+
+            # PayPal answers a repeated request id with the original response
+            request_id = self.headers.get('PayPal-Request-Id')
+            key = (request_id, self.command, self.path)
+            if request_id:
+                with emulator.lock:
+                    previous = emulator.replies.get(key)
+                if previous:
+                    emulator.count('idempotent_replays')
+                    return self.reply(*previous)
+            status, body = handle(body if isinstance(body, dict) else {})
+            if request_id and status < 500:
+                with emulator.lock:
+                    emulator.replies.setdefault(key, (status, orjson.loads(orjson.dumps(body))))
+            self.reply(status, body)
+
+    return Handler
@@ -0,0 +1,108 @@
+"""
+Measurement of single endpoints through the full Django stack (URL
+routing, middleware, authentication, rendering) with the test client.
+
+For each endpoint this records the SQL queries per request, summed over
+every database alias, the p50/p95 wall-clock latency, and the peak memory
+allocated while serving one request. Allocation tracing slows Python down,
+so it runs on a separate request after the timed ones.
+"""
+import json
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+METRICS = ('queries', 'p95_ms', 'alloc_kib')
+
+
+class EndpointFailed(Exception):
+    """An endpoint answered with a status other than the expected one."""
+
+
+def _send(client, endpoint, request, token):
+    """Send a request built by ``endpoint.build()``, so its ``prepare`` is not measured with it."""
+    path, data, own_token = request
+    token = own_token or token
+    headers = {'Authorization': f"Token {token}"} if endpoint.auth else {}
+    if endpoint.method == 'get':
+        response = client.get(path, data, headers=headers, secure=True)
+    else:
+        response = getattr(client, endpoint.method)(
+            path, json.dumps(data or {}), content_type='application/json', headers=headers, secure=True,
+        )
+    if response.streaming:
+        # Streamed bodies are produced as they are read; drain without keeping them
+        for _ in response.streaming_content:
+            pass
+    if response.status_code != endpoint.expect:
+        raise EndpointFailed(
+            f"{endpoint.name}: expected {endpoint.expect}, got {response.status_code}: {response.content[:300]!r}"
+        )
+    return response
+
+
+def measure(client, endpoint, seed, token, iterations=20, warmup=2):
+    for _ in range(warmup):
+        _send(client, endpoint, endpoint.build(seed), token)
+
+    latencies, queries = [], []
+    for _ in range(iterations):
+        request = endpoint.build(seed)
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            started = time.perf_counter()
+            _send(client, endpoint, request, token)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(sum(len(capture) for capture in captured))
+
+    request = endpoint.build(seed)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        _send(client, endpoint, request, token)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=20, method='inclusive')
+    return {
+        'queries': max(queries),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(quantiles[18], 2),
+        'alloc_kib': round(peak / 1024),
+    }
+
+
+def check_budgets(results, budgets):
+    """Return a message for every endpoint without a budget or over one."""
+    failures = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            failures.append(f"{name}: no budget")
+            continue
+        for metric in METRICS:
+            if metric in budget and result[metric] > budget[metric]:
+                failures.append(f"{name}: {metric} {result[metric]} exceeds budget {budget[metric]}")
+    return failures
+
+
+def budgets_from(results, latency_headroom=3.0, alloc_headroom=1.5):
+    """
+    Budgets derived from a run: the exact query count, since a new query is
+    always a regression, and generous headroom on the machine-dependent
+    latency and allocation figures.
+    """
+    return {
+        name: {
+            'queries': result['queries'],
+            'p95_ms': round(max(result['p95_ms'] * latency_headroom, 25.0), 1),
+            'alloc_kib': round(max(result['alloc_kib'] * alloc_headroom, 256)),
+        }
+        for name, result in sorted(results.items())
+    }
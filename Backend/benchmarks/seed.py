@@ -0,0 +1,140 @@
+"""
+Synthetic data at realistic volumes for the endpoint benchmarks.
+
+Everything is inserted with ``bulk_create``. ``scale`` multiplies the
+flight, user and booking counts; at scale 1 there are 40 airports, 4,000
+flights over the next 60 days, 200 users and 4,000 bookings. The
+benchmark user owns enough bookings to fill several list pages. A staff
+user calls the passenger search and manifest endpoints.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from knox.models import AuthToken
+
+from bookings.models import Booking, BookingHistory, SeatHold
+from bookings.passengers import sync_passengers
+from bookings.references import booking_references
+from flights.fare_calendar import rebuild_fare_calendar
+from flights.models import Airport, Flight
+from payments.models import Payment
+from users.models import User
+
+AIRPORTS = 40
+HUBS = 6
+FLIGHTS = 4000
+USERS = 200
+BOOKINGS = 4000
+BENCH_USER_BOOKINGS = 60
+PASSWORD = 'bench-password'
+
+
+class SeedData:
+    """Handles on the seeded rows the endpoint definitions need."""
+
+    def __init__(self, user, token, staff_token, airports, flights, route_date, passport):
+        self.user = user
+        self.token = token
+        self.staff_token = staff_token
+        self.airports = airports
+        self.flights = flights
+        self.origin, self.destination = airports[0], airports[1]
+        self.route_date = route_date
+        self.passport = passport
+
+
+def seed(scale=1, seed=42):
+    rng = random.Random(seed)
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    airports = Airport.objects.bulk_create([
+        Airport(code=f"B{index:02d}", name=f"Bench {index} International", city=f"Benchcity {index}", country='Benchland')
+        for index in range(AIRPORTS)
+    ])
+    hubs = airports[:HUBS]
+
+    flights = []
+    for index in range(FLIGHTS * scale):
+        # Most traffic touches a hub, like a real network; the first route is the busiest
+        if index % 10 == 0:
+            origin, destination = airports[0], airports[1]
+        else:
+            origin = rng.choice(hubs) if rng.random() < 0.6 else rng.choice(airports)
+            destination = rng.choice([airport for airport in airports if airport != origin])
+        departure = now + timedelta(days=rng.randint(1, 60), minutes=rng.randrange(0, 1440, 5))
+        flights.append(Flight(
+            flight_number=f"BN{index:05d}",
+            departure_airport=origin,
+            arrival_airport=destination,
+            departure_time=departure,
+            arrival_time=departure + timedelta(minutes=rng.randrange(45, 720, 5)),
+            price=Decimal(rng.randrange(4000, 90000)) / 100,
+            available_seats=rng.randint(20, 300),
+            airline=rng.choice(['Bench Air', 'Seed Airways', 'Fixture Jet']),
+            aircraft_type=rng.choice(['A320', 'B737', 'E190', '']),
+        ))
+    flights = Flight.objects.bulk_create(flights)
+    rebuild_fare_calendar()
+
+    # One shared hash: hashing thousands of passwords would dominate seeding
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create([
+        User(username=f"bench-user-{index}", email=f"user{index}@bench.invalid", password=password)
+        for index in range(USERS * scale)
+    ])
+    user = users[0]
+
+    owners = [user] * BENCH_USER_BOOKINGS + [rng.choice(users[1:]) for _ in range(BOOKINGS * scale - BENCH_USER_BOOKINGS)]
+    references = booking_references(len(owners))
+    bookings = []
+    for owner, reference in zip(owners, references):
+        flight = rng.choice(flights)
+        passengers = [{'name': f"Passenger {n}", 'passport': f"P{rng.randrange(10**7, 10**8)}"} for n in range(rng.randint(1, 4))]
+        bookings.append(Booking(
+            user=owner,
+            flight=flight,
+            booking_reference=reference,
+            status=rng.choice(['pending_payment', 'confirmed', 'confirmed', 'cancelled']),
+            total_amount=flight.price * len(passengers),
+            passengers=passengers,
+        ))
+    bookings = Booking.objects.bulk_create(bookings)
+    sync_passengers(bookings)
+
+    expires_at = now + timedelta(minutes=15)
+    SeatHold.objects.bulk_create([
+        SeatHold(
+            booking=booking,
+            flight_id=booking.flight_id,
+            seats=len(booking.passengers),
+            status={'pending_payment': 'held', 'confirmed': 'sold', 'cancelled': 'released'}[booking.status],
+            expires_at=expires_at,
+        )
+        for booking in bookings
+    ])
+    BookingHistory.objects.bulk_create([
+        BookingHistory(booking=booking, status=booking.status, notes='Seeded')
+        for booking in bookings if booking.status != 'pending_payment'
+    ])
+    Payment.objects.bulk_create([
+        Payment(
+            booking=booking,
+            amount=booking.total_amount,
+            paypal_order_id=f"PAYID-SEED-{booking.pk}",
+            paypal_payer_id='SEEDPAYER',
+            status='completed',
+        )
+        for booking in bookings if booking.status == 'confirmed'
+    ])
+
+    _, token = AuthToken.objects.create(user)
+    staff = User.objects.create(username='bench-staff', email='staff@bench.invalid', password=password, is_staff=True)
+    _, staff_token = AuthToken.objects.create(staff)
+    route_date = timezone.localdate(
+        Flight.objects.filter(departure_airport=airports[0], arrival_airport=airports[1])
+        .order_by('departure_time').values_list('departure_time', flat=True)[0]
+    )
+    return SeedData(user, token, staff_token, airports, flights, route_date, bookings[0].passengers[0]['passport'])
@@ -0,0 +1,141 @@
+"""
+Archival of departed flights.
+
+Once a flight has departed and none of its bookings can change any more
+(every booking is completed or cancelled, and no payment is still pending),
+the flight, its bookings and their payments are copied into the archive
+tables and deleted from the live ones. The live tables, and the indexes every
+search walks, then only hold flights that can still be booked.
+
+On PostgreSQL ``flights_archive`` is range-partitioned by departure month,
+so old months can be detached or dropped wholesale.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.partitions import ensure_monthly_partitions
+from flights.fare_calendar import defer_route_day_refresh, refresh_route_days, route_day
+from flights.models import ArchivedFlight, Flight
+from payments.models import ArchivedPayment, Payment
+from .lifecycle import transition_many
+from .models import ArchivedBooking, Booking
+from .serializers import BookingHistorySerializer
+
+TERMINAL_BOOKING_STATUSES = ('completed', 'cancelled')
+
+
+def archivable_flights(cutoff):
+    """Flights that departed before ``cutoff`` and have no booking that can still change."""
+    open_bookings = Booking.objects.filter(flight=OuterRef('pk')).filter(
+        ~Q(status__in=TERMINAL_BOOKING_STATUSES) | Q(payment__status='pending')
+    )
+    return Flight.objects.filter(departure_time__lt=cutoff).exclude(Exists(open_bookings))
+
+
+def archive_flights(flight_ids, cutoff):
+    """
+    Move the given flights, with their bookings and payments, into the archive.
+    Eligibility is checked again under a row lock, so a flight that picked up
+    an open booking since it was selected is left alone. Returns the counts moved.
+    """
+    with transaction.atomic():
+        flights = list(archivable_flights(cutoff).filter(pk__in=flight_ids).select_for_update(of=('self',)))
+        if not flights:
+            return 0, 0, 0
+        ids = [flight.pk for flight in flights]
+        bookings = list(
+            Booking.objects.filter(flight_id__in=ids).prefetch_related('history').order_by('pk')
+        )
+        payments = list(Payment.objects.filter(booking__flight_id__in=ids))
+
+        ensure_monthly_partitions(ArchivedFlight._meta.db_table, [flight.departure_time for flight in flights])
+        ArchivedFlight.objects.bulk_create([
+            ArchivedFlight(
+                id=flight.pk,
+                flight_number=flight.flight_number,
+                departure_airport_id=flight.departure_airport_id,
+                arrival_airport_id=flight.arrival_airport_id,
+                departure_time=flight.departure_time,
+                arrival_time=flight.arrival_time,
+                price=flight.price,
+                available_seats=flight.available_seats,
+                airline=flight.airline,
+                aircraft_type=flight.aircraft_type,
+                created_at=flight.created_at,
+            )
+            for flight in flights
+        ])
+        ArchivedBooking.objects.bulk_create([
+            ArchivedBooking(
+                id=booking.pk,
+                user_id=booking.user_id,
+                flight_id=booking.flight_id,
+                booking_reference=booking.booking_reference,
+                status=booking.status,
+                total_amount=booking.total_amount,
+                created_at=booking.created_at,
+                updated_at=booking.updated_at,
+                passengers=booking.passengers,
+                # Kept in the shape the booking API already returns it in
+                history=BookingHistorySerializer(booking.history.all(), many=True).data,
+            )
+            for booking in bookings
+        ])
+        ArchivedPayment.objects.bulk_create([
+            ArchivedPayment(
+                id=payment.pk,
+                booking_id=payment.booking_id,
+                amount=payment.amount,
+                payment_method=payment.payment_method,
+                paypal_order_id=payment.paypal_order_id,
+                paypal_payer_id=payment.paypal_payer_id,
+                status=payment.status,
+                created_at=payment.created_at,
+                updated_at=payment.updated_at,
+            )
+            for payment in payments
+        ])
+
+        # Cascades to bookings, their history, seat holds and payments
+        with defer_route_day_refresh():
+            Flight.objects.filter(pk__in=ids).delete()
+        keys = {route_day(f.departure_airport_id, f.arrival_airport_id, f.departure_time) for f in flights}
+        refresh_route_days(keys)
+        return len(flights), len(bookings), len(payments)
+
+
+def complete_departed_bookings(cutoff, batch_size=500):
+    """Mark confirmed bookings on flights that departed before ``cutoff`` completed; returns how many."""
+    completed = 0
+    while True:
+        ids = list(
+            Booking.objects.filter(status='confirmed', flight__departure_time__lt=cutoff)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return completed
+        completed += len(transition_many(ids, 'completed', 'Flight departed'))
+
+
+def archive_departed_flights(grace=timedelta(days=1), batch_size=500):
+    """
+    Complete the confirmed bookings of flights that departed more than
+    ``grace`` ago, then archive every such flight that is eligible, in batches.
+    """
+    cutoff = timezone.now() - grace
+    complete_departed_bookings(cutoff, batch_size)
+    totals = [0, 0, 0]
+    last_id = 0
+    while True:
+        ids = list(
+            archivable_flights(cutoff).filter(pk__gt=last_id)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return tuple(totals)
+        last_id = ids[-1]
+        for index, count in enumerate(archive_flights(ids, cutoff)):
+            totals[index] += count
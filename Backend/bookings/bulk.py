@@ -0,0 +1,115 @@
+"""
+Bulk booking creation for travel agents.
+
+A batch costs a fixed number of queries whatever its size: one to load the
+flights, one locked read and one UPDATE per flight to reserve seats, and
+one ``bulk_create`` each for the bookings, their passengers and their seat
+holds. Items are
+validated and seated independently, so a bad or unseatable item is
+reported in its own result and the rest of the batch still goes through.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from flights.models import Flight
+from .inventory import SeatsUnavailable, inventory_settings, reserve_seat_batch
+from .models import Booking, SeatHold
+from .passengers import sync_passengers
+from .references import booking_references
+from .serializers import BulkBookingItemSerializer
+
+
+def bulk_booking_settings():
+    defaults = {
+        'MAX_ITEMS': 100,
+    }
+    defaults.update(getattr(settings, 'BULK_BOOKINGS', {}))
+    return defaults
+
+
+def _failure(index, code, errors):
+    return {'index': index, 'status': code, 'errors': errors}
+
+
+def create_bookings(user, items):
+    """
+    Create a booking, with its seat hold, for each valid and seatable item.
+    Returns one result per item, in order: ``status`` is 201 with the new
+    ``booking``, or 400/404/409 with ``errors``, mirroring the single
+    booking endpoint.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = BulkBookingItemSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = _failure(index, status.HTTP_400_BAD_REQUEST, serializer.errors)
+
+    flights = Flight.objects.in_bulk({data['flight'] for _, data in valid})
+    pending = []
+    for index, data in valid:
+        if data['flight'] in flights:
+            pending.append((index, data))
+        else:
+            results[index] = _failure(index, status.HTTP_404_NOT_FOUND, {'flight': ['Flight not found']})
+    if not pending:
+        return results
+
+    # Reserved before the transaction, see bookings.references
+    references = booking_references(len(pending))
+    try:
+        with transaction.atomic():
+            granted, refused = reserve_seat_batch(
+                [(index, data['flight'], len(data['passengers'])) for index, data in pending]
+            )
+            bookings = [
+                Booking(
+                    user=user,
+                    flight=flights[data['flight']],
+                    booking_reference=reference,
+                    passengers=data['passengers'],
+                    total_amount=flights[data['flight']].price * len(data['passengers']),
+                )
+                for (index, data), reference in zip(pending, references)
+                if index in granted
+            ]
+            Booking.objects.bulk_create(bookings)
+            sync_passengers(bookings)
+            expires_at = timezone.now() + timedelta(minutes=inventory_settings()['HOLD_MINUTES'])
+            SeatHold.objects.bulk_create([
+                SeatHold(booking=booking, flight_id=booking.flight_id, seats=len(booking.passengers), expires_at=expires_at)
+                for booking in bookings
+            ])
+    except SeatsUnavailable as e:
+        for index, _ in pending:
+            results[index] = _failure(index, status.HTTP_409_CONFLICT, {'error': str(e)})
+        return results
+
+    created = iter(bookings)
+    for index, data in pending:
+        if index in granted:
+            booking = next(created)
+            results[index] = {
+                'index': index,
+                'status': status.HTTP_201_CREATED,
+                'booking': {
+                    'id': booking.pk,
+                    'booking_reference': booking.booking_reference,
+                    'flight': booking.flight_id,
+                    'status': booking.status,
+                    'total_amount': f"{booking.total_amount:.2f}",
+                    'passengers': booking.passengers,
+                },
+            }
+        else:
+            flight = flights[data['flight']]
+            results[index] = _failure(index, status.HTTP_409_CONFLICT, {
+                'flight': [f"Only {refused[index]} seats available on flight {flight.flight_number}"],
+            })
+    return results
@@ -0,0 +1,70 @@
+"""
+Expiry of unpaid bookings.
+
+A booking still in ``pending_payment`` once its seat hold has expired, plus
+``EXPIRY_GRACE_MINUTES`` for payments already under way, is cancelled by a
+periodic sweep (``bookings.tasks.expire_unpaid_bookings``, or the
+``expire_unpaid_bookings`` command where Celery beat is not running).
+
+Each batch is its own short transaction over at most ``EXPIRY_BATCH_SIZE``
+bookings. It claims rows with ``SKIP LOCKED`` so concurrent sweepers and
+checkouts never wait on each other, cancels them with one
+``UPDATE ... WHERE id IN (...)`` that also writes their history, releases
+any seats still held, and cancels their pending payments.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from payments.models import Payment
+from .inventory import inventory_settings, release_expired_holds, release_holds
+from .lifecycle import transition_many
+from .models import Booking, SeatHold
+
+
+def expired_unpaid_bookings(now=None):
+    config = inventory_settings()
+    cutoff = (now or timezone.now()) - timedelta(minutes=config['EXPIRY_GRACE_MINUTES'])
+    return Booking.objects.filter(status='pending_payment').filter(
+        Q(seat_hold__expires_at__lte=cutoff)
+        # Bookings from before seat holds existed have no hold to go by
+        | Q(seat_hold__isnull=True, created_at__lte=cutoff - timedelta(minutes=config['HOLD_MINUTES']))
+    )
+
+
+def expire_batch(batch_size, now=None):
+    """Cancel up to ``batch_size`` expired unpaid bookings; returns (bookings, payments) cancelled."""
+    with transaction.atomic():
+        ids = list(
+            expired_unpaid_bookings(now)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, 0
+        cancelled = transition_many(ids, 'cancelled', 'Payment window expired')
+        release_holds(SeatHold.objects.filter(booking_id__in=cancelled))
+        payments = Payment.objects.filter(booking_id__in=cancelled, status='pending').update(
+            status='cancelled', updated_at=Now()
+        )
+        return len(cancelled), payments
+
+
+def expire_unpaid_bookings(batch_size=None, now=None):
+    """
+    Release expired seat holds, then cancel every expired unpaid booking,
+    batch by batch. Returns (holds released, bookings cancelled, payments cancelled).
+    """
+    batch_size = batch_size or inventory_settings()['EXPIRY_BATCH_SIZE']
+    released = release_expired_holds(batch_size=batch_size)
+    totals = [0, 0]
+    while True:
+        bookings, payments = expire_batch(batch_size, now)
+        if not bookings:
+            return released, totals[0], totals[1]
+        totals[0] += bookings
+        totals[1] += payments
@@ -0,0 +1,77 @@
+"""
+``.values()``-based builders for booking representations, matching
+``BookingSerializer`` and ``ArchivedBookingSerializer`` field for field.
+A page of bookings costs one query for the rows, including flights and
+airports, and one for the history of the live ones.
+"""
+from django.db.models import Value
+
+from core.renderers import datetime_formatter, format_decimal, json_fragment
+from flights.fast_path import FlightRowBuilder, flight_values
+from .models import BookingHistory
+
+BOOKING_COLUMNS = (
+    'id', 'booking_reference', 'status', 'total_amount', 'created_at',
+    'updated_at', 'passengers', 'user_id',
+)
+LIVE_BOOKING_VALUES = [*BOOKING_COLUMNS, *flight_values('flight__'), 'archived']
+ARCHIVED_BOOKING_VALUES = [*BOOKING_COLUMNS, *flight_values('flight__'), 'history', 'archived']
+
+
+def live_booking_rows(queryset):
+    return queryset.annotate(archived=Value(False)).values_list(*LIVE_BOOKING_VALUES)
+
+
+def archived_booking_rows(queryset):
+    return queryset.annotate(archived=Value(True)).values_list(*ARCHIVED_BOOKING_VALUES)
+
+
+def history_by_booking(booking_ids):
+    history = {}
+    format_datetime = datetime_formatter()
+    rows = (
+        BookingHistory.objects.filter(booking_id__in=booking_ids)
+        .order_by('pk')
+        .values_list('id', 'status', 'notes', 'created_at', 'booking_id')
+    )
+    for history_id, status, notes, created_at, booking_id in rows:
+        history.setdefault(booking_id, []).append({
+            'id': history_id,
+            'status': status,
+            'notes': notes,
+            'created_at': format_datetime(created_at),
+            'booking': booking_id,
+        })
+    return history
+
+
+def serialize_booking_rows(rows):
+    """Booking dicts for rows from live_booking_rows() and archived_booking_rows(), in order."""
+    flights = FlightRowBuilder()
+    history = history_by_booking([row[0] for row in rows if not row[-1]])
+    width = len(BOOKING_COLUMNS)
+    format_datetime = flights.format_datetime
+
+    bookings = []
+    for row in rows:
+        (booking_id, booking_reference, status, total_amount, created_at,
+         updated_at, passengers, user_id) = row[:width]
+        if row[-1]:
+            flight = flights.build(row[width:-2])
+            booking_history = json_fragment(row[-2])
+        else:
+            flight = flights.build(row[width:-1])
+            booking_history = history.get(booking_id, [])
+        bookings.append({
+            'id': booking_id,
+            'flight': flight,
+            'history': booking_history,
+            'booking_reference': booking_reference,
+            'status': status,
+            'total_amount': format_decimal(total_amount),
+            'created_at': format_datetime(created_at),
+            'updated_at': format_datetime(updated_at),
+            'passengers': json_fragment(passengers),
+            'user': user_id,
+        })
+    return bookings
@@ -0,0 +1,313 @@
+"""
+Seat inventory: time-limited holds on ``Flight.available_seats``.
+
+Seats are taken with a single conditional UPDATE
+(``available_seats >= n`` -> ``available_seats - n``), so two requests can
+never both get the last seat, however they interleave. With the ``redis``
+backend a Redis counter per flight is checked first. Requests for a sold-out
+flight are then turned away without queueing on the flight row lock. The
+database update stays the source of truth and the final guard against oversell.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from flights.fare_calendar import refresh_route_days, route_day
+from flights.models import Flight
+from .models import Booking, SeatHold
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class SeatsUnavailable(Exception):
+    """Raised when a flight does not have enough seats left for a hold."""
+
+
+class _ReleaseConflict(Exception):
+    """A concurrent release transitioned some of the holds this one claimed."""
+
+
+class _ReserveConflict(Exception):
+    """Seats counted under the flight row locks were gone by the UPDATE (no row locks on SQLite)."""
+
+
+def inventory_settings():
+    defaults = {
+        'BACKEND': 'db',
+        'REDIS_URL': 'redis://localhost:6379/0',
+        'HOLD_MINUTES': 15,
+        'COUNTER_TTL_SECONDS': 300,
+        'EXPIRY_GRACE_MINUTES': 5,
+        'EXPIRY_BATCH_SIZE': 500,
+    }
+    defaults.update(getattr(settings, 'SEAT_INVENTORY', {}))
+    return defaults
+
+
+class RedisSeatCounter:
+    """
+    Per-flight seat counters in Redis, seeded from the database on first use
+    and re-seeded after ``COUNTER_TTL_SECONDS`` so any drift heals itself.
+    """
+
+    # Returns -1 when the counter is not seeded yet, 0 when too few seats are left, 1 on success
+    TAKE_SCRIPT = """
+        local available = redis.call('GET', KEYS[1])
+        if not available then return -1 end
+        if tonumber(available) < tonumber(ARGV[1]) then return 0 end
+        redis.call('DECRBY', KEYS[1], ARGV[1])
+        return 1
+    """
+    GIVE_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 1 then redis.call('INCRBY', KEYS[1], ARGV[1]) end
+        return 1
+    """
+
+    def __init__(self, url, ttl):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.take_script = self.client.register_script(self.TAKE_SCRIPT)
+        self.give_script = self.client.register_script(self.GIVE_SCRIPT)
+
+    def key(self, flight_id):
+        return f"seats:flight:{flight_id}"
+
+    def take(self, flight_id, seats):
+        key = self.key(flight_id)
+        result = self.take_script(keys=[key], args=[seats])
+        if result == -1:
+            available = Flight.objects.filter(pk=flight_id).values_list('available_seats', flat=True).first() or 0
+            self.client.set(key, available, ex=self.ttl, nx=True)
+            result = self.take_script(keys=[key], args=[seats])
+        return result == 1
+
+    def give(self, flight_id, seats):
+        self.give_script(keys=[self.key(flight_id)], args=[seats])
+
+
+_counter = None
+
+
+def get_counter():
+    """The shared Redis counter, or None when the database backend is configured."""
+    global _counter
+    config = inventory_settings()
+    if config['BACKEND'] != 'redis':
+        return None
+    if not REDIS_AVAILABLE:
+        raise RuntimeError("SEAT_INVENTORY['BACKEND'] is 'redis' but the redis package is not installed")
+    if _counter is None:
+        _counter = RedisSeatCounter(config['REDIS_URL'], config['COUNTER_TTL_SECONDS'])
+    return _counter
+
+
+def _refresh_calendar(flights):
+    keys = {route_day(f.departure_airport_id, f.arrival_airport_id, f.departure_time) for f in flights}
+    # The calendar is derived data: a failed refresh is logged, never surfaced to the booking
+    transaction.on_commit(lambda: refresh_route_days(keys), robust=True)
+
+
+def reserve_seats(flight, seats):
+    """Atomically take ``seats`` off ``flight``; raises SeatsUnavailable if it cannot."""
+    counter = get_counter()
+    if counter and not counter.take(flight.pk, seats):
+        raise SeatsUnavailable(f"Not enough seats available on flight {flight.flight_number}")
+
+    updated = Flight.objects.filter(pk=flight.pk, available_seats__gte=seats).update(
+        available_seats=F('available_seats') - seats, updated_at=Now()
+    )
+    if not updated:
+        if counter:
+            counter.give(flight.pk, seats)
+        raise SeatsUnavailable(f"Not enough seats available on flight {flight.flight_number}")
+    _refresh_calendar([flight])
+
+
+def reserve_seat_batch(requests, attempts=3):
+    """
+    Reserve seats for many ``(key, flight_id, seats)`` requests in one go.
+    Call inside ``transaction.atomic()``. The flight rows are locked in id
+    order, requests are granted in the order given while seats last, and
+    each flight then gets a single UPDATE. Returns the granted keys, and for
+    each refused key the seats that were left when it was considered.
+    """
+    for _ in range(attempts):
+        try:
+            with transaction.atomic():
+                return _reserve_batch(requests)
+        except _ReserveConflict:
+            continue
+    raise SeatsUnavailable("Seat inventory changed while reserving; please retry")
+
+
+def _reserve_batch(requests):
+    # Locks are taken in id order, so concurrent batches cannot deadlock
+    flights = {
+        flight.pk: flight
+        for flight in Flight.objects.select_for_update().filter(
+            pk__in={flight_id for _, flight_id, _ in requests}
+        ).order_by('pk')
+    }
+    remaining = {pk: flight.available_seats for pk, flight in flights.items()}
+    granted, refused, taken = set(), {}, defaultdict(int)
+    for key, flight_id, seats in requests:
+        if remaining.get(flight_id, 0) >= seats:
+            remaining[flight_id] -= seats
+            taken[flight_id] += seats
+            granted.add(key)
+        else:
+            refused[key] = remaining.get(flight_id, 0)
+
+    counter = get_counter()
+    counted = {}
+    for flight_id, seats in taken.items():
+        # Keeps the Redis gate in step; the database below stays authoritative
+        if counter and counter.take(flight_id, seats):
+            counted[flight_id] = seats
+        updated = Flight.objects.filter(pk=flight_id, available_seats__gte=seats).update(
+            available_seats=F('available_seats') - seats, updated_at=Now()
+        )
+        if not updated:
+            for counted_id, counted_seats in counted.items():
+                counter.give(counted_id, counted_seats)
+            raise _ReserveConflict()
+    _refresh_calendar([flights[pk] for pk in taken])
+    return granted, refused
+
+
+def return_seats(flights, seats_by_flight):
+    """Put seats back, one UPDATE per flight. ``seats_by_flight`` maps flight id to seat count."""
+    counter = get_counter()
+    for flight_id, seats in seats_by_flight.items():
+        Flight.objects.filter(pk=flight_id).update(
+            available_seats=F('available_seats') + seats, updated_at=Now()
+        )
+        if counter:
+            counter.give(flight_id, seats)
+    _refresh_calendar(flights)
+
+
+def place_hold(booking):
+    """
+    Hold one seat per passenger for ``booking``. Call inside ``transaction.atomic()``
+    so a failed hold also rolls back the booking. The flight row is updated
+    last, which keeps its lock for only as long as the commit takes.
+    """
+    seats = len(booking.passengers)
+    hold = SeatHold.objects.create(
+        booking=booking,
+        flight_id=booking.flight_id,
+        seats=seats,
+        expires_at=timezone.now() + timedelta(minutes=inventory_settings()['HOLD_MINUTES']),
+    )
+    reserve_seats(booking.flight, seats)
+    return hold
+
+
+def mark_sold(booking):
+    """
+    Convert the booking's hold into sold seats once it is paid for. A hold that
+    already expired is re-reserved. Returns False if the seats are gone by then.
+    """
+    with transaction.atomic():
+        if SeatHold.objects.filter(booking=booking, status='held').update(status='sold', updated_at=Now()):
+            return True
+        hold = SeatHold.objects.select_for_update().filter(booking=booking, status='released').first()
+        if hold is None:
+            return SeatHold.objects.filter(booking=booking, status='sold').exists()
+        try:
+            reserve_seats(booking.flight, hold.seats)
+        except SeatsUnavailable:
+            return False
+        hold.status = 'sold'
+        hold.save(update_fields=['status', 'updated_at'])
+        return True
+
+
+def mark_sold_many(booking_ids):
+    """
+    ``mark_sold()`` for many bookings. Holds still held are converted with
+    one UPDATE; only the rest go through ``mark_sold()`` one by one. Returns
+    the ids of the bookings whose seats are sold.
+    """
+    booking_ids = set(booking_ids)
+    with transaction.atomic():
+        held = set(
+            SeatHold.objects.select_for_update()
+            .filter(booking_id__in=booking_ids, status='held')
+            .values_list('booking_id', flat=True)
+        )
+        if held and SeatHold.objects.filter(booking_id__in=held, status='held').update(
+            status='sold', updated_at=Now()
+        ) != len(held):
+            # Without row locks (SQLite) a concurrent release may have won some; those go one by one
+            held = set(SeatHold.objects.filter(booking_id__in=held, status='sold').values_list('booking_id', flat=True))
+        rest = booking_ids - held
+        others = Booking.objects.filter(pk__in=rest).select_related('flight') if rest else []
+        return held | {booking.pk for booking in others if mark_sold(booking)}
+
+
+def release_holds(holds, attempts=3, status='held'):
+    """
+    Release ``holds`` (a SeatHold queryset) that are still in ``status`` and
+    give their seats back; pass ``status='sold'`` for a refunded booking. Only
+    rows this call moves to released are counted, so concurrent releases never
+    return the same seats twice.
+    """
+    for _ in range(attempts):
+        try:
+            return _release(holds, status)
+        except _ReleaseConflict:
+            continue
+    return 0
+
+
+def _release(holds, status):
+    with transaction.atomic():
+        claimed = list(
+            holds.filter(status=status)
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('flight')
+            .order_by('pk')
+        )
+        if not claimed:
+            return 0
+        updated = SeatHold.objects.filter(pk__in=[hold.pk for hold in claimed], status=status).update(
+            status='released', updated_at=Now()
+        )
+        # Without row locks (SQLite) another release may have won some rows; start over
+        if updated != len(claimed):
+            raise _ReleaseConflict()
+
+        seats_by_flight = defaultdict(int)
+        flights = {}
+        for hold in claimed:
+            seats_by_flight[hold.flight_id] += hold.seats
+            flights[hold.flight_id] = hold.flight
+        return_seats(flights.values(), seats_by_flight)
+        return len(claimed)
+
+
+def release_expired_holds(batch_size=500):
+    """Release expired holds in batches; returns how many were released."""
+    released = 0
+    while True:
+        ids = list(
+            SeatHold.objects.filter(status='held', expires_at__lte=timezone.now())
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        count = release_holds(SeatHold.objects.filter(pk__in=ids))
+        released += count
+        if count == 0:
+            return released
@@ -0,0 +1,97 @@
+"""
+Booking lifecycle.
+
+    pending_payment -> confirmed -> completed
+           |               |
+           +---------------+-----> cancelled
+
+Every status change goes through ``transition()`` or ``transition_many()``.
+They enforce ``TRANSITIONS`` and append one ``BookingHistory`` row per
+booking that changed. The allowed source statuses are part of the UPDATE's
+WHERE clause, so two concurrent transitions of one booking cannot both
+apply.
+
+On PostgreSQL the UPDATE and the history INSERT are a single statement (a
+data-modifying CTE). Elsewhere they are an ``UPDATE ... RETURNING`` followed
+by one bulk INSERT, in the same transaction. Either way a batch of bookings
+costs the same round-trips as a single booking.
+"""
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import Booking, BookingHistory
+
+TRANSITIONS = {
+    'pending_payment': ('confirmed', 'cancelled'),
+    'confirmed': ('completed', 'cancelled'),
+    'completed': (),
+    'cancelled': (),
+}
+
+
+class InvalidTransition(Exception):
+    """Raised when a booking's current status does not allow the requested one."""
+
+
+def source_statuses(to_status):
+    """The statuses a booking can move to ``to_status`` from."""
+    if to_status not in TRANSITIONS:
+        raise ValueError(f"Unknown booking status: {to_status}")
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def transition_many(booking_ids, to_status, notes=''):
+    """
+    Move every booking in ``booking_ids`` whose status allows it to
+    ``to_status``, recording history. Returns the ids that changed; the
+    others are left as they are.
+    """
+    booking_ids = list(booking_ids)
+    from_statuses = source_statuses(to_status)
+    if not booking_ids:
+        return []
+
+    connection = connections[router.db_for_write(Booking)]
+    quote = connection.ops.quote_name
+    bookings, history = quote(Booking._meta.db_table), quote(BookingHistory._meta.db_table)
+    now = timezone.now()
+    updated_at = connection.ops.adapt_datetimefield_value(now)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"""
+                WITH changed AS (
+                    UPDATE {bookings} SET status = %s, updated_at = %s
+                    WHERE id = ANY(%s) AND status = ANY(%s)
+                    RETURNING id
+                )
+                INSERT INTO {history} (booking_id, status, notes, created_at)
+                SELECT id, %s, %s, %s FROM changed
+                RETURNING booking_id
+                """,
+                [to_status, updated_at, booking_ids, from_statuses, to_status, notes, updated_at],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(
+            f"UPDATE {bookings} SET status = %s, updated_at = %s "
+            f"WHERE id IN ({', '.join(['%s'] * len(booking_ids))}) "
+            f"AND status IN ({', '.join(['%s'] * len(from_statuses))}) RETURNING id",
+            [to_status, updated_at, *booking_ids, *from_statuses],
+        )
+        changed = [row[0] for row in cursor.fetchall()]
+        BookingHistory.objects.using(connection.alias).bulk_create([
+            BookingHistory(booking_id=booking_id, status=to_status, notes=notes, created_at=now)
+            for booking_id in changed
+        ])
+        return changed
+
+
+def transition(booking, to_status, notes=''):
+    """Move ``booking`` to ``to_status``, recording history; raises InvalidTransition if not allowed."""
+    if not transition_many([booking.pk], to_status, notes):
+        current = Booking.objects.filter(pk=booking.pk).values_list('status', flat=True).first()
+        raise InvalidTransition(f"Booking {booking.booking_reference} cannot go from {current} to {to_status}")
+    booking.status = to_status
+    return booking
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from bookings.archive import archive_departed_flights
+
+
+class Command(BaseCommand):
+    help = 'Move departed flights whose bookings are all terminal, with those bookings and payments, into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24, help='Only archive flights that departed at least this long ago')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        flights, bookings, payments = archive_departed_flights(
+            grace=timedelta(hours=options['grace_hours']),
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {flights} flights, {bookings} bookings and {payments} payments"
+        ))
@@ -0,0 +1,96 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bookings.bulk import create_bookings
+from bookings.serializers import CreateBookingSerializer
+from flights.models import Airport, Flight
+from users.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare booking throughput of one POST /api/bookings/create/ per item with the bulk '
+        'endpoint, on synthetic flights that are rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-sizes', default='10,50,100')
+        parser.add_argument('--flights', type=int, default=5, help='Distinct flights per batch')
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.populate(options['flights'])
+                for size in (int(size) for size in options['batch_sizes'].split(',')):
+                    self.compare(size, options['rounds'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def populate(self, count):
+        origin = Airport.objects.create(code='ZBA', name='Bench A', city='Bench', country='Benchland')
+        destination = Airport.objects.create(code='ZBB', name='Bench B', city='Bench', country='Benchland')
+        departure = timezone.now() + timedelta(days=30)
+        self.flights = [
+            Flight.objects.create(
+                flight_number=f"BB{index:03d}",
+                departure_airport=origin,
+                arrival_airport=destination,
+                departure_time=departure + timedelta(hours=index),
+                arrival_time=departure + timedelta(hours=index + 2),
+                price=Decimal('199.00'),
+                available_seats=1_000_000,
+                airline='Bench Air',
+            )
+            for index in range(count)
+        ]
+        self.user = User.objects.create_user(username=f"bench-{uuid.uuid4().hex[:8]}")
+
+    def items(self, size):
+        return [
+            {'flight': self.flights[index % len(self.flights)].pk, 'passengers': [{'name': 'Ann Example'}, {'name': 'Bo Example'}]}
+            for index in range(size)
+        ]
+
+    def single(self, items):
+        request = SimpleNamespace(user=self.user)
+        for item in items:
+            serializer = CreateBookingSerializer(data=item, context={'request': request})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+    def bulk(self, items):
+        results = create_bookings(self.user, items)
+        assert all(result['status'] == 201 for result in results), results
+
+    def compare(self, size, rounds):
+        timings, queries = {}, {}
+        for label, create in (('single', self.single), ('bulk', self.bulk)):
+            elapsed = []
+            for _ in range(rounds):
+                items = self.items(size)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    create(items)
+                    elapsed.append(time.perf_counter() - started)
+                queries[label] = len(captured)
+            timings[label] = size / statistics.median(elapsed)
+        self.stdout.write(
+            f"batch of {size:>3}: single {timings['single']:8.0f} bookings/s ({queries['single']:>4} queries), "
+            f"bulk {timings['bulk']:8.0f} bookings/s ({queries['bulk']:>3} queries), "
+            f"{timings['bulk'] / timings['single']:.1f}x"
+        )
@@ -0,0 +1,126 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from bookings.fast_path import live_booking_rows, serialize_booking_rows
+from bookings.models import Booking, BookingHistory
+from bookings.serializers import BookingSerializer
+from core.renderers import ORJSONRenderer
+from flights.fast_path import flight_rows, serialize_flight_rows
+from flights.models import Airport, Flight
+from flights.serializers import FlightSerializer
+from users.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-item cost of the DRF serializer path and the .values()/orjson fast path '
+        'for flight search and booking list pages, on synthetic rows that are rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', default='20,100')
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options['page_sizes'].split(',')]
+        try:
+            with transaction.atomic():
+                self.populate(random.Random(options['seed']), max(page_sizes))
+                for size in page_sizes:
+                    self.compare('flights', size, options['rounds'], self.flight_pages(size))
+                    self.compare('bookings', size, options['rounds'], self.booking_pages(size))
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def populate(self, rng, count):
+        airports = [
+            Airport.objects.create(code=f"Z{index:02d}", name=f"Bench {index} – Intl", city=f"City {index}", country='Benchland')
+            for index in range(20)
+        ]
+        now = timezone.now()
+        self.flights = []
+        for index in range(count):
+            origin, destination = rng.sample(airports, 2)
+            departure = now + timedelta(days=rng.randint(1, 60), minutes=rng.randrange(0, 1440, 5))
+            self.flights.append(Flight.objects.create(
+                flight_number=f"BN{index:04d}",
+                departure_airport=origin,
+                arrival_airport=destination,
+                departure_time=departure,
+                arrival_time=departure + timedelta(minutes=rng.randrange(45, 720, 5)),
+                price=Decimal(rng.randrange(5000, 90000)) / 100,
+                available_seats=rng.randint(1, 180),
+                airline='Bench Air',
+                aircraft_type=rng.choice(['A320', 'B737', '']),
+            ))
+        self.user = User.objects.create_user(username=f"bench-{uuid.uuid4().hex[:8]}")
+        for flight in self.flights:
+            booking = Booking.objects.create(
+                user=self.user,
+                flight=flight,
+                booking_reference=uuid.uuid4().hex[:10].upper(),
+                status='confirmed',
+                total_amount=flight.price * 2,
+                passengers=[{'name': 'Ann Example', 'age': 34}, {'name': 'Zoë Example', 'age': 7}],
+            )
+            BookingHistory.objects.create(booking=booking, status='pending_payment', notes='Booking created')
+            BookingHistory.objects.create(booking=booking, status='confirmed', notes='Payment received')
+
+    def flight_pages(self, size):
+        queryset = Flight.objects.filter(departure_airport__code__startswith='Z').select_related(
+            'departure_airport', 'arrival_airport'
+        ).order_by('departure_time')[:size]
+        return (
+            (lambda: list(queryset.all()),
+             lambda flights: JSONRenderer().render(FlightSerializer(flights, many=True).data)),
+            (lambda: list(flight_rows(queryset)),
+             lambda rows: ORJSONRenderer().render(serialize_flight_rows(rows))),
+        )
+
+    def booking_pages(self, size):
+        queryset = Booking.objects.filter(user=self.user).select_related('flight').order_by('-created_at')[:size]
+        # The DRF path loads airports and history lazily while serializing; that is part of its cost
+        return (
+            (lambda: list(queryset.all()),
+             lambda bookings: JSONRenderer().render(BookingSerializer(bookings, many=True).data)),
+            (lambda: list(live_booking_rows(queryset)),
+             lambda rows: ORJSONRenderer().render(serialize_booking_rows(rows))),
+        )
+
+    def compare(self, name, size, rounds, paths):
+        outputs = [serialize(fetch()) for fetch, serialize in paths]
+        if outputs[0] != outputs[1]:
+            raise CommandError(f"{name}: fast path output differs from the DRF serializer output")
+
+        timings = {}
+        for label, (fetch, serialize) in zip(('drf', 'fast'), paths):
+            fetched, serialized = [], []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                items = fetch()
+                loaded = time.perf_counter()
+                serialize(items)
+                fetched.append((loaded - started) * 1e6 / size)
+                serialized.append((time.perf_counter() - loaded) * 1e6 / size)
+            timings[label] = (statistics.median(fetched), statistics.median(serialized))
+        (drf_fetch, drf_serialize), (fast_fetch, fast_serialize) = timings['drf'], timings['fast']
+        self.stdout.write(
+            f"{name:<9} page of {size:>3}: serialize+render drf {drf_serialize:7.1f} us/item, "
+            f"fast {fast_serialize:6.1f} us/item ({drf_serialize / fast_serialize:.1f}x); "
+            f"with query drf {drf_fetch + drf_serialize:7.1f}, fast {fast_fetch + fast_serialize:6.1f} us/item"
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from bookings.expiry import expire_unpaid_bookings
+
+
+class Command(BaseCommand):
+    help = (
+        'Release expired seat holds and cancel bookings left unpaid past their hold, with their pending '
+        'payments. Celery beat runs this every minute; use the command where beat is not running.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        released, bookings, payments = expire_unpaid_bookings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Released {released} expired seat holds, cancelled {bookings} bookings and {payments} payments"
+        ))
@@ -0,0 +1,54 @@
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.export import FORMATS, ExportError, ExportFilters, export_chunks
+
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings with their flight and payment to a CSV or NDJSON file (or stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--from', dest='date_from', type=_date, help='First booking date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', type=_date, help='Last booking date, YYYY-MM-DD')
+        parser.add_argument('--status', action='append', default=[], help='Only this status; repeatable')
+        parser.add_argument('--archived', action='store_true', help='Include archived bookings')
+        parser.add_argument('--compress', action='store_true', help='zstd-compress the output')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            filters = ExportFilters(
+                date_from=options['date_from'],
+                date_to=options['date_to'],
+                statuses=options['status'],
+                archived=options['archived'],
+            )
+            chunks = export_chunks(
+                filters, options['format'], compress=options['compress'],
+                using=options['database'], chunk_size=options['chunk_size'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bookings.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Release seat holds whose time limit has passed and return their seats to the flights'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = release_expired_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired seat holds"))
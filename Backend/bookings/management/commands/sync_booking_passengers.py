@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from bookings.models import Booking
+from bookings.passengers import rebuild_passengers
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the booking_passengers lookup table from Booking.passengers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = rebuild_passengers(Booking.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} passenger rows"))
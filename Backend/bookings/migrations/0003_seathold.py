@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_initial'),
+        ('flights', '0003_flight_flights_number_departure_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('held', 'Held'), ('sold', 'Sold'), ('released', 'Released')], default='held', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_hold', to='bookings.booking')),
+                ('flight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='flights.flight')),
+            ],
+            options={
+                'db_table': 'seat_holds',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='seat_holds_status_713635_idx')],
+            },
+        ),
+    ]
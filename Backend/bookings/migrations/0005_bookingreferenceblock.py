@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_archivedbooking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingReferenceBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allocated_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'booking_reference_blocks',
+            },
+        ),
+    ]
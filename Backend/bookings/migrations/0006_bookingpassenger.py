@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from bookings.passengers import rebuild_passengers
+
+
+def backfill_passengers(apps, schema_editor):
+    rebuild_passengers(apps.get_model('bookings', 'Booking').objects.all(), model=apps.get_model('bookings', 'BookingPassenger'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_bookingreferenceblock'),
+        ('flights', '0006_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingPassenger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('name_search', models.CharField(blank=True, max_length=200)),
+                ('passport_number', models.CharField(blank=True, max_length=50)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passenger_records', to='bookings.booking')),
+                ('flight', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.flight')),
+            ],
+            options={
+                'db_table': 'booking_passengers',
+                'indexes': [models.Index(fields=['passport_number'], name='booking_pax_passport_idx'), models.Index(fields=['name_search'], name='booking_pax_name_idx', opclasses=['varchar_pattern_ops']), models.Index(fields=['flight', 'name_search'], name='booking_pax_manifest_idx')],
+                'constraints': [models.UniqueConstraint(fields=('booking', 'position'), name='booking_passengers_position_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_passengers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_bookingpassenger'),
+        ('flights', '0006_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'id'], name='bookings_created_4f33ac_idx'),
+        ),
+    ]
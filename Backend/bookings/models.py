@@ -1,6 +1,6 @@
 from django.db import models
 from users.models import User
-from flights.models import Flight
+from flights.models import ArchivedFlight, Flight
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -24,11 +24,49 @@ class Booking(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['booking_reference']),
+            # Date-range exports, read in (created_at, id) order
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.booking_reference} - {self.user.username}"
 
+class BookingPassenger(models.Model):
+    """One passenger of a booking, projected from ``Booking.passengers`` for indexed lookups; see bookings.passengers."""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='passenger_records')
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='+')
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=200, blank=True)
+    # Case-folded, single-spaced name for exact and prefix search
+    name_search = models.CharField(max_length=200, blank=True)
+    passport_number = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        db_table = 'booking_passengers'
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'position'], name='booking_passengers_position_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['passport_number'], name='booking_pax_passport_idx'),
+            models.Index(fields=['name_search'], name='booking_pax_name_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['flight', 'name_search'], name='booking_pax_manifest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.booking_id})"
+
+
+class BookingReferenceBlock(models.Model):
+    """A block of booking reference sequence numbers reserved by one process; see bookings.references."""
+    allocated_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'booking_reference_blocks'
+
+    def __str__(self):
+        return f"Reference block {self.pk}"
+
+
 class BookingHistory(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='history')
     status = models.CharField(max_length=20)
@@ -36,4 +74,56 @@ class BookingHistory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        db_table = 'booking_history'
\ No newline at end of file
+        db_table = 'booking_history'
+
+
+class SeatHold(models.Model):
+    """Seats taken off a flight for a booking until it is paid for or the hold expires."""
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('sold', 'Sold'),
+        ('released', 'Released'),
+    ]
+
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='seat_hold')
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='seat_holds')
+    seats = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'seat_holds'
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.seats} seats on {self.flight_id} ({self.status})"
+
+
+class ArchivedBooking(models.Model):
+    """A terminal booking on an archived flight, with its history kept as a snapshot."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Partitioned archive tables cannot be referenced by a foreign key constraint
+    flight = models.ForeignKey(ArchivedFlight, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    booking_reference = models.CharField(max_length=10)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    passengers = models.JSONField()
+    history = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'bookings_archive'
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['booking_reference']),
+        ]
+
+    def __str__(self):
+        return f"{self.booking_reference} (archived)"
@@ -0,0 +1,110 @@
+"""
+Normalized passenger projection of ``Booking.passengers``.
+
+Each passenger in a booking's JSON list gets a ``BookingPassenger`` row,
+with the name case-folded for search and the passport number stripped of
+spaces and dashes. Passport, name-prefix and per-flight manifest lookups
+then use indexes instead of decoding every booking's JSON.
+
+Rows are rewritten whenever a booking is saved with its passengers (see
+bookings.signals). Code that inserts bookings with ``bulk_create`` calls
+``sync_passengers()`` itself. The ``sync_booking_passengers`` command
+rebuilds the table.
+"""
+import re
+
+from django.db import transaction
+
+from .models import BookingPassenger
+
+NAME_KEYS = ('name', 'full_name')
+PASSPORT_KEYS = ('passport_number', 'passport')
+
+
+def normalize_name(value):
+    return ' '.join(str(value).split()).casefold()[:200]
+
+
+def normalize_passport(value):
+    return re.sub(r'[\s-]', '', str(value)).upper()[:50]
+
+
+def passenger_name(passenger):
+    for key in NAME_KEYS:
+        if passenger.get(key):
+            return ' '.join(str(passenger[key]).split())[:200]
+    return ' '.join(
+        str(passenger[key]).strip() for key in ('first_name', 'last_name') if passenger.get(key)
+    )[:200]
+
+
+def passenger_fields(passengers):
+    """The BookingPassenger field values for each entry of a passenger list."""
+    for position, passenger in enumerate(passengers if isinstance(passengers, list) else []):
+        if not isinstance(passenger, dict):
+            passenger = {'name': passenger}
+        name = passenger_name(passenger)
+        passport = next((passenger[key] for key in PASSPORT_KEYS if passenger.get(key)), '')
+        yield {
+            'position': position,
+            'name': name,
+            'name_search': normalize_name(name),
+            'passport_number': normalize_passport(passport),
+        }
+
+
+def passenger_rows(booking_id, flight_id, passengers, model=BookingPassenger):
+    """Unsaved passenger rows for one booking; ``model`` may be a migration's historical model."""
+    return [
+        model(booking_id=booking_id, flight_id=flight_id, **fields)
+        for fields in passenger_fields(passengers)
+    ]
+
+
+def sync_passengers(bookings, replace=False):
+    """
+    Write the passenger rows of ``bookings`` in one bulk INSERT. With
+    ``replace``, their existing rows are deleted first, for bookings whose
+    passengers changed.
+    """
+    rows = [
+        row
+        for booking in bookings
+        for row in passenger_rows(booking.pk, booking.flight_id, booking.passengers)
+    ]
+    if not replace:
+        BookingPassenger.objects.bulk_create(rows)
+        return
+    with transaction.atomic():
+        BookingPassenger.objects.filter(booking__in=[booking.pk for booking in bookings]).delete()
+        BookingPassenger.objects.bulk_create(rows)
+
+
+def rebuild_passengers(bookings, batch_size=2000, model=BookingPassenger):
+    """
+    Rewrite the passenger rows of every booking in ``bookings`` (a queryset),
+    ``batch_size`` bookings per transaction. Returns the rows written.
+    """
+    written, last_id = 0, 0
+    while True:
+        batch = list(
+            bookings.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'flight_id', 'passengers')[:batch_size]
+        )
+        if not batch:
+            return written
+        last_id = batch[-1][0]
+        rows = [row for booking_id, flight_id, passengers in batch for row in passenger_rows(booking_id, flight_id, passengers, model)]
+        with transaction.atomic():
+            model.objects.filter(booking_id__in=[booking_id for booking_id, _, _ in batch]).delete()
+            model.objects.bulk_create(rows)
+        written += len(rows)
+
+
+def search_passengers(queryset, passport=None, name=None):
+    """Filter BookingPassenger rows by exact passport number and/or name prefix, both normalized."""
+    if passport:
+        queryset = queryset.filter(passport_number=normalize_passport(passport))
+    if name:
+        queryset = queryset.filter(name_search__startswith=normalize_name(name))
+    return queryset
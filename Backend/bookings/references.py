@@ -0,0 +1,133 @@
+"""
+Booking reference allocation.
+
+References are unique by construction, so bookings are inserted once with
+their reference and never retried on a collision:
+
+1. Each process reserves a block of ``BLOCK_SIZE`` sequence numbers by
+   inserting a ``BookingReferenceBlock`` row. Block ids come from the
+   table's identity sequence, so no two processes get the same block, and
+   one INSERT serves a thousand bookings.
+2. A sequence number is mixed by a keyed Feistel network, a bijection on
+   40-bit integers, so consecutive bookings get unrelated-looking
+   references and the counter (i.e. booking volume) is not exposed.
+3. The 40-bit value is written as 8 Crockford base32 characters (no I, L,
+   O or U) plus a mod-29 check character, which catches nearly every
+   single-character typo and swap of neighbouring characters.
+
+The 9-character references never collide with the 8-character random ones
+issued before. ``BLOCK_SIZE`` and ``BOOKING_REFERENCES['KEY']`` define the
+reference space: changing either after bookings exist can repeat a
+reference, which the unique constraint would then reject.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import BookingReferenceBlock
+
+BLOCK_SIZE = 1000
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+REFERENCE_BITS = 40
+HALF_BITS = REFERENCE_BITS // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+CHECK_MODULUS = 29
+
+
+def reference_settings():
+    defaults = {
+        'KEY': settings.SECRET_KEY,
+    }
+    defaults.update(getattr(settings, 'BOOKING_REFERENCES', {}))
+    return defaults
+
+
+def _round_keys(key):
+    return [hashlib.blake2b(f"{key}:{index}".encode(), digest_size=16).digest() for index in range(ROUNDS)]
+
+
+def permute(number, keys):
+    """Keyed bijection on [0, 2**40)."""
+    left, right = number >> HALF_BITS, number & HALF_MASK
+    for key in keys:
+        digest = hashlib.blake2b(right.to_bytes(3, 'big'), key=key, digest_size=3).digest()
+        left, right = right, left ^ (int.from_bytes(digest, 'big') & HALF_MASK)
+    return (left << HALF_BITS) | right
+
+
+def encode(value):
+    """8 base32 characters for a 40-bit value, followed by a check character."""
+    chars = [ALPHABET[(value >> shift) & 31] for shift in range(REFERENCE_BITS - 5, -5, -5)]
+    return ''.join(chars) + ALPHABET[value % CHECK_MODULUS]
+
+
+def is_valid_reference(reference):
+    """Whether ``reference`` has the shape and check character of an allocated reference."""
+    if len(reference) != 9 or any(char not in ALPHABET for char in reference):
+        return False
+    value = 0
+    for char in reference[:8]:
+        value = (value << 5) | ALPHABET.index(char)
+    return reference[8] == ALPHABET[value % CHECK_MODULUS]
+
+
+class ReferenceAllocator:
+    """
+    Hands out references from blocks reserved by this process. Thread-safe.
+
+    The block is reserved in its own INSERT. On PostgreSQL a sequence value
+    is never reused, even when the surrounding transaction rolls back. Other
+    databases can reuse the id of a rolled-back insert, so callers reserve
+    references before opening their transaction, as the booking entry points
+    do.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._keys = None
+
+    def _reserve_block(self):
+        with transaction.atomic():
+            block = BookingReferenceBlock.objects.create()
+        if (block.pk + 1) * BLOCK_SIZE > 1 << REFERENCE_BITS:
+            raise RuntimeError("Booking reference space exhausted")
+        self._next, self._end = block.pk * BLOCK_SIZE, (block.pk + 1) * BLOCK_SIZE
+
+    def next_number(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block()
+            number = self._next
+            self._next += 1
+        return number
+
+    def allocate(self, count=1):
+        """``count`` fresh references."""
+        if self._keys is None:
+            self._keys = _round_keys(reference_settings()['KEY'])
+        return [encode(permute(self.next_number(), self._keys)) for _ in range(count)]
+
+    def reset(self):
+        """Forget the current block, e.g. after forking or when tests flush the table."""
+        with self._lock:
+            self._next = self._end = 0
+            self._keys = None
+
+
+allocator = ReferenceAllocator()
+# A forked worker must not keep handing out its parent's block
+os.register_at_fork(after_in_child=allocator.reset)
+
+
+def next_booking_reference():
+    return allocator.allocate()[0]
+
+
+def booking_references(count):
+    return allocator.allocate(count)
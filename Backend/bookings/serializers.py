@@ -1,11 +1,16 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Booking, BookingHistory
-from flights.serializers import FlightSerializer
+from .models import ArchivedBooking, Booking, BookingHistory, BookingPassenger
+from .inventory import place_hold
+from .references import next_booking_reference
+from flights.serializers import ArchivedFlightSerializer, FlightSerializer
 
 class BookingHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = BookingHistory
         fields = '__all__'
+        # Order of prefetched history, see core.loading
+        ordering = ('pk',)
 
 class BookingSerializer(serializers.ModelSerializer):
     flight = FlightSerializer(read_only=True)
@@ -16,6 +21,15 @@ class BookingSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('booking_reference', 'created_at', 'updated_at')
 
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    """Renders an archived booking in the same shape as BookingSerializer."""
+    flight = ArchivedFlightSerializer(read_only=True)
+    history = serializers.JSONField(read_only=True)
+
+    class Meta:
+        model = ArchivedBooking
+        exclude = ('archived_at',)
+
 class CreateBookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
@@ -26,14 +40,50 @@ class CreateBookingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("At least one passenger is required")
         return value
     
+    def validate(self, attrs):
+        # Early, friendly check; the hold in create() is what actually guards the seats
+        if attrs['flight'].available_seats < len(attrs['passengers']):
+            raise serializers.ValidationError(
+                {'flight': f"Only {attrs['flight'].available_seats} seats available"}
+            )
+        return attrs
+    
     def create(self, validated_data):
         flight = validated_data['flight']
         passengers = validated_data['passengers']
         total_amount = flight.price * len(passengers)
+        booking_reference = next_booking_reference()
         
-        booking = Booking.objects.create(
-            **validated_data,
-            user=self.context['request'].user,
-            total_amount=total_amount
+        # The booking and its seat hold commit together or not at all
+        with transaction.atomic():
+            booking = Booking.objects.create(
+                **validated_data,
+                user=self.context['request'].user,
+                booking_reference=booking_reference,
+                total_amount=total_amount
+            )
+            place_hold(booking)
+        return booking
+
+
+class BulkBookingItemSerializer(serializers.Serializer):
+    """One item of a bulk booking request. Flights are looked up for the whole batch at once."""
+    flight = serializers.IntegerField(min_value=1)
+    passengers = serializers.JSONField()
+
+    validate_passengers = CreateBookingSerializer.validate_passengers
+
+
+class PassengerRecordSerializer(serializers.ModelSerializer):
+    """A passenger with the booking and flight it belongs to, for support searches and manifests."""
+    booking_reference = serializers.CharField(source='booking.booking_reference', read_only=True)
+    booking_status = serializers.CharField(source='booking.status', read_only=True)
+    flight_number = serializers.CharField(source='flight.flight_number', read_only=True)
+    departure_time = serializers.DateTimeField(source='flight.departure_time', read_only=True)
+
+    class Meta:
+        model = BookingPassenger
+        fields = (
+            'id', 'booking', 'booking_reference', 'booking_status', 'flight', 'flight_number',
+            'departure_time', 'position', 'name', 'passport_number',
         )
-        return booking
\ No newline at end of file
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Booking
+from .passengers import sync_passengers
+
+
+@receiver(post_save, sender=Booking)
+def sync_passenger_records(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Saves that leave passengers and flight alone, e.g. a status change, keep their rows
+    if update_fields is not None and not {'passengers', 'flight'} & set(update_fields):
+        return
+    sync_passengers([instance], replace=not created)
@@ -0,0 +1,17 @@
+from celery import shared_task
+from django.core.cache import cache
+
+from .expiry import expire_unpaid_bookings as expire
+
+SWEEP_LOCK = 'bookings:expiry-sweep'
+
+
+@shared_task(name='bookings.tasks.expire_unpaid_bookings', ignore_result=True)
+def expire_unpaid_bookings():
+    """Beat task; a sweep still running from the previous tick makes this one a no-op."""
+    if not cache.add(SWEEP_LOCK, 1, timeout=300):
+        return None
+    try:
+        return expire()
+    finally:
+        cache.delete(SWEEP_LOCK)
@@ -1,3 +1,794 @@
-from django.test import TestCase
+import csv
+import io
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import orjson
+import zstandard
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.db_router import ReplicaRouter, is_sticky, mark_sticky, replica_reads
+from core.idempotency import delete_expired_keys, idempotency_settings
+from core.loading import loading_plan
+from core.renderers import ORJSONRenderer
+from flights.models import Airport, ArchivedFlight, Flight, RouteDailyFare
+from payments.models import ArchivedPayment, Payment
+from users.models import IdempotencyKey, User
+from . import references
+from .archive import archive_departed_flights, archive_flights
+from .bulk import create_bookings
+from .export import HEADER, ExportFilters, export_chunks
+from .expiry import expire_unpaid_bookings
+from .fast_path import archived_booking_rows, live_booking_rows, serialize_booking_rows
+from .lifecycle import InvalidTransition, transition, transition_many
+from .inventory import SeatsUnavailable, mark_sold, place_hold, release_expired_holds
+from .models import ArchivedBooking, Booking, BookingHistory, BookingPassenger, BookingReferenceBlock, SeatHold
+from .passengers import search_passengers
+from .serializers import ArchivedBookingSerializer, BookingSerializer, CreateBookingSerializer
+
+
+def make_flight(seats):
+    origin = Airport.objects.create(code='NBO', name='Jomo Kenyatta', city='Nairobi', country='Kenya')
+    destination = Airport.objects.create(code='MBA', name='Moi', city='Mombasa', country='Kenya')
+    departure = timezone.now() + timedelta(days=7)
+    return Flight.objects.create(
+        flight_number='KQ600',
+        departure_airport=origin,
+        arrival_airport=destination,
+        departure_time=departure,
+        arrival_time=departure + timedelta(hours=1),
+        price=100,
+        available_seats=seats,
+        airline='Kenya Airways',
+    )
+
+
+def book(user, flight, passengers=1):
+    booking_reference = references.next_booking_reference()
+    with transaction.atomic():
+        booking = Booking.objects.create(
+            user=user,
+            flight=flight,
+            booking_reference=booking_reference,
+            passengers=[{'name': f'Passenger {i}'} for i in range(passengers)],
+            total_amount=flight.price * passengers,
+        )
+        place_hold(booking)
+    return booking
+
+
+class SeatHoldConcurrencyTest(TransactionTestCase):
+    capacity = 25
+    workers = 20
+    attempts_per_worker = 3
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(self.capacity)
+
+    def run_workers(self, target):
+        errors = []
+        start = threading.Barrier(self.workers)
+
+        def worker():
+            try:
+                start.wait()
+                target()
+            except Exception as e:  # surfaced through the assertion below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_holds_never_oversell(self):
+        booked = []
+
+        def attempt_bookings():
+            for _ in range(self.attempts_per_worker):
+                while True:
+                    try:
+                        booked.append(book(self.user, self.flight))
+                        break
+                    except SeatsUnavailable:
+                        break
+                    except OperationalError:
+                        # SQLite reports write contention as "database is locked"; retry like a client would
+                        time.sleep(0.001)
+
+        self.run_workers(attempt_bookings)
+
+        self.flight.refresh_from_db()
+        held = sum(SeatHold.objects.filter(status='held').values_list('seats', flat=True))
+        self.assertEqual(held, self.capacity)
+        self.assertEqual(self.flight.available_seats, 0)
+        self.assertEqual(Booking.objects.count(), SeatHold.objects.count())
+        self.assertEqual(len(booked), self.capacity)
+
+    def test_concurrent_expiry_sweeps_return_seats_once(self):
+        for _ in range(10):
+            book(self.user, self.flight, passengers=2)
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        def sweep():
+            while True:
+                try:
+                    release_expired_holds(batch_size=3)
+                    return
+                except OperationalError:
+                    time.sleep(0.001)
+
+        self.run_workers(sweep)
+
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, self.capacity)
+        self.assertFalse(SeatHold.objects.filter(status='held').exists())
+
+
+class SeatHoldLifecycleTest(TransactionTestCase):
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(4)
+
+    def test_hold_larger_than_remaining_seats_rolls_back_booking(self):
+        book(self.user, self.flight, passengers=3)
+        with self.assertRaises(SeatsUnavailable):
+            book(self.user, self.flight, passengers=2)
+
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 1)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_paid_hold_is_sold_and_not_released(self):
+        booking = book(self.user, self.flight, passengers=2)
+        self.assertTrue(mark_sold(booking))
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_holds(), 0)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 2)
+
+    def test_late_payment_re_reserves_released_seats(self):
+        booking = book(self.user, self.flight, passengers=2)
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_expired_holds(), 1)
+
+        self.assertTrue(mark_sold(booking))
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 2)
+        self.assertEqual(SeatHold.objects.get().status, 'sold')
+
+
+class BookingReferenceTest(SimpleTestCase):
+
+    def test_permutation_is_a_bijection(self):
+        keys = references._round_keys('test-key')
+        numbers = list(range(5000)) + [(1 << references.REFERENCE_BITS) - 1 - n for n in range(5000)]
+        values = {references.permute(number, keys) for number in numbers}
+        self.assertEqual(len(values), len(numbers))
+        self.assertTrue(all(0 <= value < 1 << references.REFERENCE_BITS for value in values))
+
+    def test_references_carry_a_check_character(self):
+        keys = references._round_keys('test-key')
+        reference = references.encode(references.permute(12345, keys))
+        self.assertEqual(len(reference), 9)
+        self.assertTrue(references.is_valid_reference(reference))
+        for index in range(8):
+            typo = reference[:index] + ('0' if reference[index] != '0' else '1') + reference[index + 1:]
+            self.assertFalse(references.is_valid_reference(typo))
+        self.assertFalse(references.is_valid_reference('ABCD1234'))
+
+
+class BookingReferenceLoadTest(TransactionTestCase):
+    workers = 16
+    bookings_per_worker = 25
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(self.workers * self.bookings_per_worker)
+
+    def test_concurrent_creation_never_collides(self):
+        integrity_errors, other_errors = [], []
+        start = threading.Barrier(self.workers)
+        request = SimpleNamespace(user=self.user)
+
+        def worker():
+            try:
+                start.wait()
+                for _ in range(self.bookings_per_worker):
+                    while True:
+                        try:
+                            serializer = CreateBookingSerializer(
+                                data={'flight': self.flight.pk, 'passengers': [{'name': 'Passenger'}]},
+                                context={'request': request},
+                            )
+                            serializer.is_valid(raise_exception=True)
+                            serializer.save()
+                            break
+                        except IntegrityError as e:
+                            integrity_errors.append(e)
+                            break
+                        except OperationalError:
+                            # SQLite write contention, not a reference collision
+                            time.sleep(0.001)
+            except Exception as e:  # surfaced through the assertion below
+                other_errors.append(e)
+            finally:
+                connection.close()
+
+        # Small blocks make the workers reserve new blocks while others are booking
+        with mock.patch.object(references, 'BLOCK_SIZE', 7):
+            threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(other_errors, [])
+        self.assertEqual(integrity_errors, [])
+        total = self.workers * self.bookings_per_worker
+        refs = list(Booking.objects.values_list('booking_reference', flat=True))
+        self.assertEqual(len(refs), total)
+        self.assertEqual(len(set(refs)), total)
+        self.assertTrue(all(references.is_valid_reference(ref) for ref in refs))
+        # Blocks of 7, so far fewer reservations than bookings, even counting retried attempts
+        self.assertLess(BookingReferenceBlock.objects.count(), total)
+
+
+class BulkBookingTest(TransactionTestCase):
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='agent', password='secret')
+        self.flight = make_flight(5)
+
+    def test_partial_failures_are_reported_per_item(self):
+        passengers = lambda count: [{'name': f'Passenger {i}'} for i in range(count)]
+        results = create_bookings(self.user, [
+            {'flight': self.flight.pk, 'passengers': passengers(3)},
+            {'flight': self.flight.pk, 'passengers': []},
+            {'flight': self.flight.pk, 'passengers': passengers(3)},
+            {'flight': self.flight.pk + 1000, 'passengers': passengers(1)},
+            {'flight': self.flight.pk, 'passengers': passengers(2)},
+        ])
+
+        self.assertEqual([result['status'] for result in results], [201, 400, 409, 404, 201])
+        self.assertEqual(results[2]['errors'], {'flight': ['Only 2 seats available on flight KQ600']})
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 0)
+        self.assertEqual(
+            sorted(SeatHold.objects.values_list('booking__booking_reference', 'seats')),
+            sorted((result['booking']['booking_reference'], len(result['booking']['passengers'])) for result in results if result['status'] == 201),
+        )
+
+
+class BookingLifecycleTest(TransactionTestCase):
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(10)
+
+    def test_transitions_are_enforced_and_recorded(self):
+        booking = book(self.user, self.flight)
+        transition(booking, 'confirmed', 'Payment received')
+        with self.assertRaises(InvalidTransition):
+            transition(booking, 'pending_payment')
+        transition(booking, 'completed')
+        with self.assertRaises(InvalidTransition):
+            transition(booking, 'cancelled')
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'completed')
+        self.assertEqual(
+            list(booking.history.order_by('pk').values_list('status', 'notes')),
+            [('confirmed', 'Payment received'), ('completed', '')],
+        )
+
+    def test_batch_only_moves_bookings_whose_status_allows_it(self):
+        bookings = [book(self.user, self.flight) for _ in range(4)]
+        transition(bookings[0], 'cancelled')
+
+        changed = transition_many([booking.pk for booking in bookings], 'confirmed')
+
+        self.assertEqual(sorted(changed), [booking.pk for booking in bookings[1:]])
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 3)
+        self.assertEqual(BookingHistory.objects.filter(status='confirmed').count(), 3)
+
+
+class BookingQueryCountTest(TestCase):
+    """Listing or showing bookings costs a fixed number of queries, however many there are."""
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_bookings(self, count):
+        for _ in range(count):
+            booking = book(self.user, self.flight, passengers=2)
+            transition(booking, 'confirmed', 'Payment received')
+
+    def assert_list_queries(self, expected):
+        for fast in (False, True):
+            with self.subTest(fast_path=fast), override_settings(FAST_SERIALIZATION={'ENABLED': fast}):
+                with self.assertNumQueries(expected):
+                    response = self.client.get('/api/bookings/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        # Live count, archived count, the page with flights and airports, and its history
+        self.add_bookings(2)
+        self.assert_list_queries(4)
+        self.add_bookings(18)
+        self.assert_list_queries(4)
+
+    def test_detail_query_count(self):
+        self.add_bookings(1)
+        booking = Booking.objects.get()
+        # Validators, the booking with flight and airports, and its history
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/bookings/{booking.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['flight']['departure_airport']['code'], 'NBO')
+        self.assertEqual([entry['status'] for entry in response.data['history']], ['confirmed'])
+
+
+class IdempotentBookingTest(TestCase):
+    """A retried booking request with the same Idempotency-Key books once and gets the first response back."""
+
+    def setUp(self):
+        cache.clear()
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, key, passengers=1):
+        return self.client.post(
+            '/api/bookings/create/',
+            {'flight': self.flight.pk, 'passengers': [{'name': f'Passenger {i}'} for i in range(passengers)]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_is_replayed(self):
+        first = self.create('key-1')
+        # Keys live in the database, so a retry served by another process finds them too
+        cache.clear()
+        with self.assertNumQueries(1):
+            retry = self.create('key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+        self.assertEqual(self.create('key-1', passengers=2).status_code, 422)
+        self.assertEqual(self.create('key-2').status_code, 201)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_unstored_response_releases_its_key(self):
+        with mock.patch.object(CreateBookingSerializer, 'save', side_effect=SeatsUnavailable('Sold out')):
+            self.assertEqual(self.create('key-1').status_code, 409)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.create('key-1').status_code, 201)
+
+    def test_expired_keys_are_deleted(self):
+        self.create('key-1')
+        ttl = timedelta(seconds=idempotency_settings()['TTL_SECONDS'])
+        self.assertEqual(delete_expired_keys(now=timezone.now() + ttl - timedelta(minutes=1)), 0)
+        self.assertEqual(delete_expired_keys(now=timezone.now() + ttl + timedelta(minutes=1)), 1)
+
+
+@override_settings(IDEMPOTENCY={'WAIT_SECONDS': 0.1, 'LOCK_SECONDS': 60})
+class IdempotentBookingConcurrencyTest(TransactionTestCase):
+    """The key is held in the database while its first request runs, whichever process serves the duplicate."""
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(10)
+
+    def create(self, key):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post(
+            '/api/bookings/create/', {'flight': self.flight.pk, 'passengers': [{'name': 'Passenger'}]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def start_blocked_request(self, key):
+        """Start a request that stops inside the view until the returned event is set."""
+        inside, release, responses = threading.Event(), threading.Event(), []
+        save = CreateBookingSerializer.save
+
+        def blocked_save(serializer, **kwargs):
+            if threading.current_thread() is thread:
+                inside.set()
+                release.wait(5)
+            return save(serializer, **kwargs)
+
+        def run():
+            try:
+                responses.append(self.create(key))
+            finally:
+                connection.close()
+
+        patcher = mock.patch.object(CreateBookingSerializer, 'save', blocked_save)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.assertTrue(inside.wait(5))
+
+        def finish():
+            release.set()
+            thread.join()
+            return responses[0]
+        return finish
+
+    def test_duplicate_of_in_flight_request_is_told_to_retry(self):
+        finish = self.start_blocked_request('key-1')
+        # A process of its own: nothing of the first request is in this one's cache
+        cache.clear()
+        duplicate = self.create('key-1')
+        self.assertEqual(duplicate.status_code, 409)
+        self.assertEqual(duplicate['Retry-After'], '1')
+
+        self.assertEqual(finish().status_code, 201)
+        retry = self.create('key-1')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_lapsed_lock_is_taken_over_once(self):
+        finish = self.start_blocked_request('key-1')
+        IdempotencyKey.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        takeover = self.create('key-1')
+        self.assertEqual(takeover.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', takeover)
+
+        # The original holder finishes late; the key keeps the response of the request that holds it
+        self.assertEqual(finish().status_code, 201)
+        replay = self.create('key-1')
+        self.assertEqual(replay.data, takeover.data)
+
+
+@override_settings(READ_REPLICAS={'ALIASES': ['replica_1', 'replica_2'], 'STICKY_SECONDS': 10})
+class ReplicaRoutingTest(TestCase):
+    """Opted-in reads go to a replica, except for users who just wrote and inside transactions."""
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def read_alias(self, user_id=None):
+        # Each test runs inside a transaction, which would pin every read to the primary
+        with replica_reads(user_id), mock.patch.object(connections['default'], 'in_atomic_block', False):
+            return self.router.db_for_read(Booking)
+
+    def test_only_opted_in_reads_use_a_replica(self):
+        self.assertIsNone(self.router.db_for_read(Booking))
+        self.assertIn(self.read_alias(), ['replica_1', 'replica_2'])
+        self.assertEqual(self.router.db_for_write(Booking), 'default')
+
+    def test_reads_fall_back_to_the_primary(self):
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(Booking))
+        with override_settings(READ_REPLICAS={'ALIASES': []}):
+            self.assertIsNone(self.read_alias())
+
+    def test_writer_is_sticky_until_the_window_passes(self):
+        other = User.objects.create_user(username='other', password='secret')
+        self.client.get('/api/bookings/')
+        self.assertFalse(is_sticky(self.user.pk))
+
+        response = self.client.post('/api/bookings/create/', {'flight': 0, 'passengers': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(is_sticky(self.user.pk))
+        self.assertIsNone(self.read_alias(self.user.pk))
+        self.assertIsNotNone(self.read_alias(other.pk))
+
+        with mock.patch('time.time', return_value=time.time() + 11):
+            self.assertFalse(is_sticky(self.user.pk))
+
+    def test_views_check_the_requesting_user(self):
+        mark_sticky(self.user.pk)
+        with mock.patch('core.db_router.is_sticky', wraps=is_sticky) as sticky:
+            self.assertEqual(self.client.get('/api/bookings/').status_code, 200)
+        sticky.assert_called_once_with(self.user.pk)
+
+
+class PassengerSearchTest(TestCase):
+    """Passenger rows follow the booking's JSON and answer passport, name and manifest lookups."""
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(100)
+        self.booking = Booking.objects.create(
+            user=self.user,
+            flight=self.flight,
+            booking_reference=references.next_booking_reference(),
+            passengers=[{'name': 'Wanjiru  Kamau', 'passport': 'ak 123-456'}, {'first_name': 'Otieno', 'last_name': 'Odhiambo'}],
+            total_amount=200,
+        )
+
+    def search(self, **lookups):
+        return list(search_passengers(BookingPassenger.objects.all(), **lookups).values_list('name', flat=True))
+
+    def test_rows_follow_saves(self):
+        self.assertEqual(self.search(passport='AK123456'), ['Wanjiru Kamau'])
+        self.assertEqual(self.search(name='OTIENO o'), ['Otieno Odhiambo'])
+
+        self.booking.passengers = [{'name': 'Achieng Otieno', 'passport': 'B999'}]
+        self.booking.save()
+        self.assertEqual(self.search(name='otieno'), [])
+        self.assertEqual(self.search(passport='b-999'), ['Achieng Otieno'])
+
+        # Saves that do not touch passengers leave the rows alone
+        self.booking.status = 'confirmed'
+        self.booking.save(update_fields=['status'])
+        self.assertEqual(BookingPassenger.objects.count(), 1)
+
+    def test_bulk_bookings_get_rows(self):
+        results = create_bookings(self.user, [
+            {'flight': self.flight.pk, 'passengers': [{'name': 'Njeri Mwangi', 'passport': 'C1'}]},
+        ])
+        self.assertEqual(results[0]['status'], 201)
+        self.assertEqual(self.search(passport='C1'), ['Njeri Mwangi'])
+
+    def test_staff_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/bookings/passengers/?name=wanjiru').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username='agent', password='secret', is_staff=True))
+        self.assertEqual(client.get('/api/bookings/passengers/').status_code, 400)
+        response = client.get('/api/bookings/passengers/?name=wanjiru')
+        self.assertEqual([row['booking_reference'] for row in response.data['results']], [self.booking.booking_reference])
+
+        manifest = f'/api/bookings/manifest/{self.flight.pk}/'
+        self.assertEqual(client.get(manifest).data['count'], 0)
+        transition(self.booking, 'confirmed')
+        self.assertEqual(
+            [row['name'] for row in client.get(manifest).data['results']],
+            ['Otieno Odhiambo', 'Wanjiru Kamau'],
+        )
+
+
+
+class BookingExportTest(TestCase):
+    """Exports stream every matching booking with its flight and payment in one query."""
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(100)
+        self.paid = book(self.user, self.flight, passengers=2)
+        Payment.objects.create(booking=self.paid, amount=200, paypal_order_id='PAYID-1', status='completed')
+        transition(self.paid, 'confirmed')
+        self.unpaid = book(self.user, self.flight)
+
+    def export(self, fmt='csv', **filters):
+        return b''.join(export_chunks(ExportFilters(**filters), fmt, chunk_size=1))
+
+    def test_csv(self):
+        with self.assertNumQueries(1):
+            rows = list(csv.DictReader(io.StringIO(self.export().decode())))
+        self.assertEqual([row['booking_reference'] for row in rows], [self.paid.booking_reference, self.unpaid.booking_reference])
+        self.assertEqual(rows[0]['flight_number'], 'KQ600')
+        self.assertEqual(rows[0]['departure_airport'], 'NBO')
+        self.assertEqual((rows[0]['payment_status'], rows[0]['payment_amount']), ('completed', '200.00'))
+        self.assertEqual(rows[1]['payment_status'], '')
+
+    def test_filters_and_ndjson(self):
+        lines = self.export('ndjson', statuses=['confirmed']).splitlines()
+        self.assertEqual([orjson.loads(line)['booking_id'] for line in lines], [self.paid.pk])
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.assertEqual(self.export(date_from=tomorrow).decode().splitlines(), [','.join(HEADER)])
+
+    def test_endpoint_streams_zstd(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='finance', password='secret', is_staff=True))
+        self.assertEqual(client.get('/api/bookings/export/?status=lost').status_code, 400)
+
+        response = client.get('/api/bookings/export/?output=ndjson&compress=zstd')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(body.splitlines()), 2)
+
+
+class UnpaidBookingExpiryTest(TransactionTestCase):
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.flight = make_flight(10)
+
+    def test_sweep_cancels_expired_unpaid_bookings_and_returns_seats(self):
+        stale = [book(self.user, self.flight, passengers=2) for _ in range(3)]
+        fresh = book(self.user, self.flight, passengers=1)
+        paid = book(self.user, self.flight, passengers=1)
+        mark_sold(paid)
+        transition(paid, 'confirmed')
+        Payment.objects.create(booking=stale[0], amount=stale[0].total_amount, status='pending')
+        SeatHold.objects.exclude(booking=fresh).update(expires_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(expire_unpaid_bookings(batch_size=2), (3, 3, 1))
+
+        self.assertEqual(set(Booking.objects.filter(status='cancelled')), set(stale))
+        self.assertEqual(Booking.objects.get(pk=fresh.pk).status, 'pending_payment')
+        self.assertEqual(Booking.objects.get(pk=paid.pk).status, 'confirmed')
+        self.assertEqual(Payment.objects.get().status, 'cancelled')
+        self.assertEqual(BookingHistory.objects.filter(status='cancelled').count(), 3)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 8)
+        self.assertEqual(expire_unpaid_bookings(), (0, 0, 0))
+
+
+class BookingArchiveTest(TestCase):
+    """Departed flights with only settled bookings move to the archive; the booking list and detail still show them."""
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.origin = Airport.objects.create(code='NBO', name='Jomo Kenyatta', city='Nairobi', country='Kenya')
+        self.destination = Airport.objects.create(code='MBA', name='Moi', city='Mombasa', country='Kenya')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def flight(self, number, days):
+        departure = timezone.now() + timedelta(days=days)
+        return Flight.objects.create(
+            flight_number=number, departure_airport=self.origin, arrival_airport=self.destination,
+            departure_time=departure, arrival_time=departure + timedelta(hours=1),
+            price=100, available_seats=50, airline='Kenya Airways',
+        )
+
+    def paid_booking(self, flight):
+        booking = book(self.user, flight)
+        mark_sold(booking)
+        transition(booking, 'confirmed', 'Payment received')
+        Payment.objects.create(booking=booking, amount=booking.total_amount, paypal_order_id=f"PAY-{booking.pk}", status='completed')
+        return booking
+
+    def test_departed_flights_move_to_the_archive(self):
+        departed = self.flight('KQ1', days=-3)
+        paid = self.paid_booking(departed)
+        cancelled = book(self.user, departed)
+        transition(cancelled, 'cancelled', 'Changed plans')
+        # An unpaid booking keeps its flight live
+        still_open = self.flight('KQ2', days=-3)
+        book(self.user, still_open)
+        upcoming = self.flight('KQ3', days=5)
+        self.paid_booking(upcoming)
+
+        self.assertEqual(archive_departed_flights(), (1, 2, 1))
+
+        self.assertEqual(set(Flight.objects.values_list('flight_number', flat=True)), {'KQ2', 'KQ3'})
+        self.assertFalse(Booking.objects.filter(pk__in=[paid.pk, cancelled.pk]).exists())
+        self.assertFalse(SeatHold.objects.filter(booking_id__in=[paid.pk, cancelled.pk]).exists())
+        self.assertFalse(Payment.objects.filter(booking_id=paid.pk).exists())
+        self.assertFalse(BookingHistory.objects.filter(booking_id=paid.pk).exists())
+
+        self.assertEqual(ArchivedFlight.objects.get().pk, departed.pk)
+        archived = ArchivedBooking.objects.get(pk=paid.pk)
+        self.assertEqual(archived.status, 'completed')
+        self.assertEqual([entry['status'] for entry in archived.history], ['confirmed', 'completed'])
+        self.assertEqual(ArchivedPayment.objects.get().booking_id, paid.pk)
+        # KQ2 flies the same route that day
+        self.assertEqual(RouteDailyFare.objects.get(date=timezone.localdate(departed.departure_time)).flight_count, 1)
+
+    def test_flight_that_reopened_is_left_alone(self):
+        departed = self.flight('KQ1', days=-3)
+        cutoff = timezone.now()
+        book(self.user, departed)
+        self.assertEqual(archive_flights([departed.pk], cutoff), (0, 0, 0))
+        self.assertTrue(Flight.objects.filter(pk=departed.pk).exists())
+
+    @mock.patch('rest_framework.pagination.PageNumberPagination.page_size', 2)
+    def test_timeline_pages_across_live_and_archived(self):
+        departed = self.flight('KQ1', days=-3)
+        archived = [self.paid_booking(departed) for _ in range(3)]
+        archive_departed_flights()
+        upcoming = self.flight('KQ2', days=5)
+        live = [self.paid_booking(upcoming) for _ in range(3)]
+        expected = [booking.booking_reference for booking in live[::-1] + archived[::-1]]
+
+        for fast in (False, True):
+            with self.subTest(fast_path=fast), override_settings(FAST_SERIALIZATION={'ENABLED': fast}):
+                pages = [self.client.get('/api/bookings/', {'page': page}).json() for page in (1, 2, 3)]
+                self.assertEqual(pages[0]['count'], 6)
+                self.assertEqual([booking['booking_reference'] for page in pages for booking in page['results']], expected)
+                self.assertEqual([booking['status'] for booking in pages[1]['results']], ['confirmed', 'completed'])
+                # Live and archived flights have the same keys, in the same order
+                self.assertEqual(len({tuple(booking['flight']) for page in pages for booking in page['results']}), 1)
+
+    def test_detail_falls_back_to_the_archive(self):
+        booking = self.paid_booking(self.flight('KQ1', days=-3))
+        archive_departed_flights()
+        response = self.client.get(f'/api/bookings/{booking.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['booking_reference'], response.data['status']), (booking.booking_reference, 'completed'))
+        self.assertEqual(self.client.get(f'/api/bookings/{booking.pk + 100}/').status_code, 404)
+
+
+class BookingFastPathTest(TestCase):
+    """The .values()/orjson booking list renders the very bytes of the DRF serializers and JSONRenderer."""
+
+    def setUp(self):
+        references.allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        origin = Airport.objects.create(code='NBO', name='Jomo Kenyatta', city='Nairobi', country='Kenya')
+        destination = Airport.objects.create(code='GRU', name='Guarulhos', city='São Paulo', country='Brazil')
+        for number, days, price in (('KQ1', -3, '1234.5'), ('KQ2', 5, '99.99')):
+            departure = timezone.now() + timedelta(days=days, microseconds=1)
+            flight = Flight.objects.create(
+                flight_number=number, departure_airport=origin, arrival_airport=destination,
+                departure_time=departure, arrival_time=departure + timedelta(hours=14, minutes=5),
+                price=Decimal(price), available_seats=50, airline='Kenya Airways',
+            )
+            paid = book(self.user, flight, passengers=2)
+            Booking.objects.filter(pk=paid.pk).update(passengers=[{'name': 'Zoë', 'passport': None, 'bags': 1.5}])
+            mark_sold(paid)
+            transition(paid, 'confirmed', 'Paid\u2028in full')
+            Payment.objects.create(booking=paid, amount=paid.total_amount, paypal_order_id=f"PAY-{paid.pk}", status='completed')
+            # No payment at all
+            unpaid = book(self.user, flight)
+            transition(unpaid, 'cancelled')
+        archive_departed_flights()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_same_bytes(self, serializer_class, queryset, rows):
+        for zone in ('UTC', 'Asia/Kolkata'):
+            with self.subTest(serializer=serializer_class.__name__, zone=zone), timezone.override(zone):
+                self.assertEqual(
+                    ORJSONRenderer().render(serialize_booking_rows(list(rows(queryset)))),
+                    JSONRenderer().render(serializer_class(loading_plan(serializer_class).apply(queryset), many=True).data),
+                )
+
+    def test_live_rows_render_like_the_serializer(self):
+        bookings = Booking.objects.order_by('pk')
+        self.assertEqual(bookings.count(), 2)
+        self.assert_same_bytes(BookingSerializer, bookings, live_booking_rows)
+
+    def test_archived_rows_render_like_the_serializer(self):
+        bookings = ArchivedBooking.objects.order_by('pk')
+        self.assertEqual(bookings.count(), 2)
+        self.assert_same_bytes(ArchivedBookingSerializer, bookings, archived_booking_rows)
+
+    def test_list_responses_are_identical(self):
+        bodies = []
+        for fast in (False, True):
+            with override_settings(FAST_SERIALIZATION={'ENABLED': fast}):
+                response = self.client.get('/api/bookings/')
+            self.assertEqual(response.status_code, 200)
+            bodies.append(response.content)
+        self.assertEqual(bodies[0], bodies[1])
+        self.assertIn(b'"total_amount":"2469.00"', bodies[1])
@@ -1,8 +1,15 @@
 from django.urls import path
-from .views import BookingListAPI, BookingDetailAPI, create_booking
+from .views import (
+    BookingListAPI, BookingDetailAPI, FlightManifestAPI, PassengerSearchAPI, create_booking, create_bulk_bookings,
+    export_bookings,
+)
 
 urlpatterns = [
     path('', BookingListAPI.as_view(), name='booking-list'),
     path('create/', create_booking, name='create-booking'),
+    path('bulk/', create_bulk_bookings, name='create-bulk-bookings'),
+    path('export/', export_bookings, name='export-bookings'),
+    path('passengers/', PassengerSearchAPI.as_view(), name='passenger-search'),
+    path('manifest/<int:flight_id>/', FlightManifestAPI.as_view(), name='flight-manifest'),
     path('<int:pk>/', BookingDetailAPI.as_view(), name='booking-detail'),
 ]
\ No newline at end of file
@@ -1,31 +1,134 @@
+from datetime import datetime
+
+from django.db import router
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import generics, permissions, status
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-import random
-import string
-from .models import Booking
-from .serializers import BookingSerializer, CreateBookingSerializer
+from .models import ArchivedBooking, Booking, BookingPassenger
+from .serializers import ArchivedBookingSerializer, BookingSerializer, CreateBookingSerializer, PassengerRecordSerializer
+from .inventory import SeatsUnavailable
+from .bulk import bulk_booking_settings, create_bookings
+from .passengers import normalize_name, search_passengers
+from .export import FORMATS, ExportError, ExportFilters, export_chunks, export_filename
+from core.conditional import ConditionalGetMixin
+from core.idempotency import idempotent
+from core.loading import LoadingPlanMixin, loading_plan
+from core.db_router import ReadReplicaMixin, replica_reads
+from core.renderers import FastSerializationMixin
+from .fast_path import archived_booking_rows, live_booking_rows, serialize_booking_rows
+
+class BookingTimeline:
+    """
+    A user's live bookings, newest first, followed by their archived ones.
+    Supports count() and slicing, which is all the paginator needs, so each
+    page only queries the table(s) it actually overlaps.
+    """
+
+    def __init__(self, live, archived):
+        self.live = live
+        self.archived = archived
+        self._live_count = None
+
+    def live_count(self):
+        if self._live_count is None:
+            self._live_count = self.live.count()
+        return self._live_count
+
+    def count(self):
+        return self.live_count() + self.archived.count()
 
-def generate_booking_reference():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    def __len__(self):
+        return self.count()
 
-class BookingListAPI(generics.ListAPIView):
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        live_count = self.live_count()
+        items = list(self.live[start:min(stop, live_count)]) if start < live_count else []
+        if stop > live_count:
+            items += list(self.archived[max(start - live_count, 0):stop - live_count])
+        return items
+
+
+class BookingListAPI(FastSerializationMixin, LoadingPlanMixin, ReadReplicaMixin, generics.ListAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user).select_related('flight')
+        return Booking.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def get_archived_queryset(self):
+        return ArchivedBooking.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        if self.use_fast_path(request):
+            return self.fast_list(request)
+
+        timeline = BookingTimeline(
+            self.filter_queryset(self.get_queryset()),
+            loading_plan(ArchivedBookingSerializer).apply(self.get_archived_queryset()),
+        )
+        page = self.paginate_queryset(timeline)
+        bookings = page if page is not None else timeline[0:timeline.count()]
+        data = [
+            ArchivedBookingSerializer(booking).data if isinstance(booking, ArchivedBooking)
+            else self.get_serializer(booking).data
+            for booking in bookings
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
 
-class BookingDetailAPI(generics.RetrieveAPIView):
+    def fast_list(self, request):
+        timeline = BookingTimeline(
+            live_booking_rows(self.get_queryset()),
+            archived_booking_rows(self.get_archived_queryset()),
+        )
+        page = self.paginate_queryset(timeline)
+        if page is not None:
+            return self.get_paginated_response(serialize_booking_rows(page))
+        return Response(serialize_booking_rows(timeline[0:timeline.count()]))
+
+class BookingDetailAPI(ConditionalGetMixin, LoadingPlanMixin, ReadReplicaMixin, generics.RetrieveAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_control = {'private': True, 'no_cache': True}
     
     def get_queryset(self):
         return Booking.objects.filter(user=self.request.user)
 
+    def get_validators(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        row = self.get_queryset().filter(pk=pk).values_list(
+            'updated_at', 'flight__updated_at', 'flight__departure_airport__updated_at', 'flight__arrival_airport__updated_at',
+        ).first()
+        if row is None:
+            archived_at = ArchivedBooking.objects.filter(user=request.user, pk=pk).values_list('archived_at', flat=True).first()
+            if archived_at is None:
+                return None, None
+            return f"booking-{pk}-archived-{archived_at.timestamp()}", archived_at
+        # The nested flight and its airports change independently of the booking
+        return f"booking-{pk}-{'-'.join(str(stamp.timestamp()) for stamp in row)}", max(row)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Bookings keep their id when archived, so ids from the list resolve either way
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            archived = loading_plan(ArchivedBookingSerializer).apply(
+                ArchivedBooking.objects.filter(user=request.user, pk=kwargs['pk'])
+            ).first()
+            if archived is None:
+                raise
+            return Response(ArchivedBookingSerializer(archived).data)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent('bookings.create')
 def create_booking(request):
     serializer = CreateBookingSerializer(
         data=request.data,
@@ -34,23 +137,144 @@ def create_booking(request):
     
     if serializer.is_valid():
         try:
-            # Create the booking using serializer
+            # Create the booking, reference included, in a single insert
             booking = serializer.save()
             
-            # Generate and set booking reference
-            booking.booking_reference = generate_booking_reference()
-            booking.save()
-            
             # Return the created booking data
             return Response(
                 BookingSerializer(booking).data, 
                 status=status.HTTP_201_CREATED
             )
             
+        except SeatsUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response(
                 {'error': f'Failed to create booking: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent('bookings.bulk')
+def create_bulk_bookings(request):
+    """
+    Book many flights in one request: ``{"bookings": [{"flight": id, "passengers": [...]}, ...]}``.
+    Each item gets its own result; 201 when all succeed, 207 when some do.
+    """
+    items = request.data.get('bookings') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'bookings must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    max_items = bulk_booking_settings()['MAX_ITEMS']
+    if len(items) > max_items:
+        return Response({'error': f'At most {max_items} bookings per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = create_bookings(request.user, items)
+    created = sum(1 for result in results if result['status'] == status.HTTP_201_CREATED)
+    if created == len(results):
+        response_status = status.HTTP_201_CREATED
+    elif created:
+        response_status = status.HTTP_207_MULTI_STATUS
+    elif any(result['status'] == status.HTTP_409_CONFLICT for result in results):
+        response_status = status.HTTP_409_CONFLICT
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response(
+        {'created': created, 'failed': len(results) - created, 'results': results},
+        status=response_status,
+    )
+
+
+# ------------------------------
+# Streaming export (staff)
+# ------------------------------
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_bookings(request):
+    """
+    All bookings with their flight and payment as one streamed file:
+    ``?output=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD&status=a,b&archived=1&compress=zstd``.
+    """
+    fmt = request.GET.get('output', 'csv')
+    try:
+        dates = {
+            key: datetime.strptime(request.GET[key], '%Y-%m-%d').date()
+            for key in ('from', 'to') if request.GET.get(key)
+        }
+    except ValueError:
+        return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    compress = request.GET.get('compress', '')
+    if compress not in ('', 'zstd'):
+        return Response({'error': 'compress must be zstd'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        filters = ExportFilters(
+            date_from=dates.get('from'),
+            date_to=dates.get('to'),
+            statuses=[value for value in request.GET.get('status', '').split(',') if value],
+            archived=request.GET.get('archived') in ('1', 'true'),
+        )
+        with replica_reads(request.user.pk):
+            using = router.db_for_read(Booking)
+        chunks = export_chunks(filters, fmt, compress=bool(compress), using=using)
+    except ExportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        chunks, content_type='application/zstd' if compress else FORMATS[fmt][0],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, bool(compress))}"'
+    return response
+
+
+# ------------------------------
+# Passenger search and flight manifests (staff)
+# ------------------------------
+class PassengerSearchAPI(ReadReplicaMixin, generics.ListAPIView):
+    """Bookings by passport number (exact) and/or passenger name (prefix), case and spacing insensitive."""
+    serializer_class = PassengerRecordSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        return BookingPassenger.objects.select_related('booking', 'flight').order_by('name_search', 'pk')
+
+    def list(self, request, *args, **kwargs):
+        passport = request.GET.get('passport', '').strip()
+        name = request.GET.get('name', '').strip()
+        if not passport and not name:
+            return Response({'error': 'passport or name is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if name and len(normalize_name(name)) < 2:
+            return Response({'error': 'name must be at least 2 characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = search_passengers(self.get_queryset(), passport=passport, name=name)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+
+class ManifestPagination(PageNumberPagination):
+    page_size = 200
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class FlightManifestAPI(ReadReplicaMixin, generics.ListAPIView):
+    """Passengers of a flight's confirmed and completed bookings, alphabetically."""
+    serializer_class = PassengerRecordSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = ManifestPagination
+    manifest_statuses = ('confirmed', 'completed')
+
+    def get_queryset(self):
+        return (
+            BookingPassenger.objects.filter(
+                flight_id=self.kwargs['flight_id'],
+                booking__status__in=self.manifest_statuses,
+            )
+            .select_related('booking', 'flight')
+            .order_by('name_search', 'pk')
+        )
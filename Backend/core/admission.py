@@ -0,0 +1,295 @@
+"""
+Admission control for slow endpoints, so they cannot take every worker.
+
+A view under ``@admission_controlled(scope)`` passes two gates before it runs:
+
+- A per-user token bucket: ``BURST`` requests at once, refilled at
+  ``RATE_PER_MINUTE``. An empty bucket is answered at once with 429 and a
+  Retry-After. The buckets live in Redis (``BACKEND = 'redis'``), shared by
+  all processes, or in process memory (``'local'``), where each process
+  enforces the quota on its own. If Redis is unreachable, requests are let
+  through.
+- A concurrency limit for the scope in this process. Up to ``MAX_QUEUE``
+  requests wait for a slot, each for at most ``QUEUE_TIMEOUT_SECONDS``;
+  the rest, and those that time out, get 503 and a Retry-After. A waiting
+  request holds a worker thread as well, so ``MAX_LIMIT + MAX_QUEUE``
+  should stay below the threads of a process.
+
+The limit adapts to the latency the scope observes. It grows by one slot
+per round of requests that finish within ``LATENCY_TOLERANCE`` times the
+baseline, a slowly moving average of past latencies. A slower request, or a
+5xx, cuts it to ``BACKOFF`` of itself, at most once per round trip, down to
+``MIN_LIMIT``. While the limit is below ``INITIAL_LIMIT`` the quota refill
+rate shrinks in proportion, to no less than ``MIN_RATE_FACTOR`` of it. When
+the LLM behind the chat slows down, fewer chat requests hold workers, and
+searches and payments served by the same processes keep their latency.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+SCOPE_DEFAULTS = {
+    'INITIAL_LIMIT': 2,
+    'MIN_LIMIT': 1,
+    'MAX_LIMIT': 4,
+    'MAX_QUEUE': 2,
+    'QUEUE_TIMEOUT_SECONDS': 1.0,
+    'LATENCY_TOLERANCE': 2.0,
+    'BACKOFF': 0.75,
+    # Weight of each request's latency in the baseline
+    'BASELINE_ALPHA': 0.05,
+    # 0 disables the per-user quota
+    'RATE_PER_MINUTE': 10,
+    'BURST': 5,
+    'MIN_RATE_FACTOR': 0.25,
+}
+
+
+def admission_settings():
+    defaults = {
+        'BACKEND': 'local',
+        'REDIS_URL': 'redis://localhost:6379/0',
+        'LOCAL_MAX_BUCKETS': 10000,
+        'SCOPES': {},
+    }
+    defaults.update(getattr(settings, 'ADMISSION_CONTROL', {}))
+    return defaults
+
+
+def scope_settings(scope):
+    config = dict(SCOPE_DEFAULTS)
+    config.update(admission_settings()['SCOPES'].get(scope, {}))
+    return config
+
+
+class AdaptiveLimiter:
+    """A concurrency limit with a bounded wait queue, adjusted by additive increase and multiplicative decrease."""
+
+    def __init__(self, initial, minimum, maximum, max_queue, tolerance, backoff, alpha, clock=time.monotonic):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_queue = max_queue
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.alpha = alpha
+        self.clock = clock
+        self.baseline = None
+        self.in_flight = 0
+        self.waiting = 0
+        self._decreased_at = -math.inf
+        self._condition = threading.Condition()
+
+    @property
+    def capacity(self):
+        return max(self.minimum, int(self.limit))
+
+    def acquire(self, timeout):
+        """Take a slot, waiting up to ``timeout`` seconds; returns its start time, or None if shed."""
+        with self._condition:
+            if self.in_flight < self.capacity:
+                self.in_flight += 1
+                return self.clock()
+            if self.waiting >= self.max_queue or timeout <= 0:
+                return None
+            deadline = self.clock() + timeout
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.capacity:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+                return self.clock()
+            finally:
+                self.waiting -= 1
+
+    def release(self, started, failed=False):
+        """Give back the slot taken at ``started`` and adjust the limit to how the request went."""
+        now = self.clock()
+        seconds = now - started
+        with self._condition:
+            saturated = self.in_flight >= self.capacity
+            self.in_flight -= 1
+            if self.baseline is None and not failed:
+                self.baseline = seconds
+            if failed or seconds > self.baseline * self.tolerance:
+                # Requests already running when the limit was cut say nothing about the new limit
+                if started >= self._decreased_at:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._decreased_at = now
+            elif saturated:
+                # Only a limit that was reached has shown it is too low
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            if not failed:
+                self.baseline += self.alpha * (seconds - self.baseline)
+            self._condition.notify_all()
+
+    def retry_after(self):
+        """Seconds a shed client should wait: about one request's latency."""
+        return max(1, math.ceil(self.baseline or 1))
+
+
+class LocalTokenBuckets:
+    """Token buckets in process memory, least recently used dropped beyond ``max_entries``."""
+
+    def __init__(self, max_entries, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take a token; returns (allowed, seconds until one is available)."""
+        now = self.clock()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+class RedisTokenBuckets:
+    """Token buckets shared by all processes; Redis's clock is used, so app servers need not agree on the time."""
+
+    # Returns {allowed, seconds to wait}; the wait is a string since Redis truncates numbers to integers
+    TAKE_SCRIPT = """
+        local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+        local tokens, stamp = tonumber(bucket[1]), tonumber(bucket[2])
+        if not tokens then tokens, stamp = burst, now end
+        tokens = math.min(burst, tokens + math.max(0, now - stamp) * rate)
+        local allowed, wait = 0, 0
+        if tokens >= 1 then
+            tokens, allowed = tokens - 1, 1
+        else
+            wait = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+        return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.take_script = self.client.register_script(self.TAKE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        try:
+            allowed, wait = self.take_script(keys=[key], args=[rate, burst])
+        except redis.RedisError:
+            # A quota outage must not take the endpoint down with it
+            logger.warning('Token bucket unavailable; admitting %s', key, exc_info=True)
+            return True, 0.0
+        return allowed == 1, float(wait)
+
+
+_limiters = {}
+_buckets = None
+_lock = threading.Lock()
+
+
+def get_limiter(scope):
+    limiter = _limiters.get(scope)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(scope)
+            if limiter is None:
+                config = scope_settings(scope)
+                limiter = _limiters[scope] = AdaptiveLimiter(
+                    config['INITIAL_LIMIT'], config['MIN_LIMIT'], config['MAX_LIMIT'], config['MAX_QUEUE'],
+                    config['LATENCY_TOLERANCE'], config['BACKOFF'], config['BASELINE_ALPHA'],
+                )
+    return limiter
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        config = admission_settings()
+        if config['BACKEND'] == 'redis':
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("ADMISSION_CONTROL['BACKEND'] is 'redis' but the redis package is not installed")
+            _buckets = RedisTokenBuckets(config['REDIS_URL'])
+        else:
+            _buckets = LocalTokenBuckets(config['LOCAL_MAX_BUCKETS'])
+    return _buckets
+
+
+def reset_admission():
+    """Drop limiters and buckets, e.g. after settings change or in a forked child."""
+    global _buckets
+    with _lock:
+        _limiters.clear()
+        _buckets = None
+
+
+os.register_at_fork(after_in_child=reset_admission)
+
+
+def _reject(message, status_code, retry_after):
+    response = Response({'error': message}, status=status_code)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admission_controlled(scope):
+    """
+    Decorator for a view under ``@api_view``. ``scope`` names the endpoint:
+    it keys the limiter, the users' buckets and the settings in
+    ``ADMISSION_CONTROL['SCOPES']``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = scope_settings(scope)
+            limiter = get_limiter(scope)
+
+            if config['RATE_PER_MINUTE'] and request.user.is_authenticated:
+                factor = max(config['MIN_RATE_FACTOR'], min(1.0, limiter.limit / config['INITIAL_LIMIT']))
+                allowed, wait = get_buckets().take(
+                    f"admission:{scope}:{request.user.pk}", config['RATE_PER_MINUTE'] * factor / 60, config['BURST'],
+                )
+                if not allowed:
+                    return _reject('Too many requests; please slow down', status.HTTP_429_TOO_MANY_REQUESTS, wait)
+
+            started = limiter.acquire(config['QUEUE_TIMEOUT_SECONDS'])
+            if started is None:
+                return _reject(
+                    'The service is busy; please retry shortly', status.HTTP_503_SERVICE_UNAVAILABLE,
+                    limiter.retry_after(),
+                )
+            failed = True
+            try:
+                response = view(request, *args, **kwargs)
+                failed = response.status_code >= 500
+                return response
+            finally:
+                limiter.release(started, failed)
+        return wrapper
+    return decorator
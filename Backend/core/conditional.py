@@ -0,0 +1,64 @@
+"""
+Conditional GET for DRF views.
+
+A view supplies its validators from a cheap query (a version or an
+``updated_at`` column), and ``ConditionalGetMixin`` answers
+``If-None-Match`` / ``If-Modified-Since`` with 304 before the object is
+loaded or serialized.
+
+A whole table is versioned by its row count and latest ``updated_at``,
+read from the database so every process, and every command that writes
+the table, agrees on it. See ``table_version()``.
+"""
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def table_version(queryset, field='updated_at'):
+    """
+    Version of the rows in ``queryset``: changes when a row is added,
+    deleted or saved. Updates that bypass ``save()``, like
+    ``QuerySet.update()``, must set ``field`` themselves.
+    """
+    state = queryset.aggregate(rows=Count('pk'), latest=Max(field))
+    if state['latest'] is None:
+        return '0'
+    return f"{state['rows']}.{int(state['latest'].timestamp() * 1_000_000)}"
+
+
+class ConditionalGetMixin:
+    """
+    For DRF views that handle GET. Subclasses implement ``get_validators()``
+    and may set ``cache_control`` (keyword arguments for
+    ``patch_cache_control``) or override ``get_cache_control()``.
+    """
+    cache_control = None
+
+    def get_validators(self, request, *args, **kwargs):
+        """Return (etag, last_modified datetime); either may be None. Must not load the full object."""
+        return None, None
+
+    def get_cache_control(self, request):
+        return self.cache_control
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        etag = quote_etag(str(etag)) if etag is not None else None
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+
+        response = None
+        if etag is not None or timestamp is not None:
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            cache_control = self.get_cache_control(request)
+            if cache_control:
+                patch_cache_control(response, **cache_control)
+        return response
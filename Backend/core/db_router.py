@@ -0,0 +1,167 @@
+"""
+Read-replica routing.
+
+Writes always go to ``default``. Reads go to one of the aliases listed in
+``settings.READ_REPLICAS['ALIASES']``, but only where a view or tool has opted
+in: see ``ReadReplicaMixin`` and ``replica_reads()``. A user who has just
+written is pinned to ``default`` for ``STICKY_SECONDS``, so they always read
+their own writes, e.g. a new booking always shows up in their booking list.
+Stickiness lives in the default cache so it holds across worker processes;
+settings refuse replicas unless that cache is the shared Redis one.
+
+``ReadReplicaMiddleware`` also counts queries per alias, both per request
+(optionally returned in the ``X-DB-Queries`` header) and per process
+(``query_counts()``).
+"""
+import random
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+def replica_settings():
+    defaults = {
+        'ALIASES': [],
+        'STICKY_SECONDS': 10,
+        'QUERY_COUNT_HEADER': False,
+    }
+    defaults.update(getattr(settings, 'READ_REPLICAS', {}))
+    return defaults
+
+
+class _RequestState:
+    __slots__ = ('use_replica', 'queries')
+
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.queries = Counter()
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+_totals = Counter()
+_totals_lock = threading.Lock()
+
+
+def query_counts():
+    """Queries run per alias by this process since it started (or since reset_query_counts())."""
+    with _totals_lock:
+        return dict(_totals)
+
+
+def reset_query_counts():
+    with _totals_lock:
+        _totals.clear()
+
+
+def _sticky_key(user_id):
+    return f"db:sticky:{user_id}"
+
+
+def mark_sticky(user_id):
+    """Pin ``user_id``'s reads to the primary for the next STICKY_SECONDS."""
+    cache.set(_sticky_key(user_id), 1, replica_settings()['STICKY_SECONDS'])
+
+
+def is_sticky(user_id):
+    return user_id is not None and cache.get(_sticky_key(user_id)) is not None
+
+
+def replicas_enabled():
+    return bool(replica_settings()['ALIASES'])
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    """
+    Send reads inside the block to a replica, unless ``user_id`` wrote
+    recently. For code that runs outside a replica-enabled view, such as the
+    agent's read tools.
+    """
+    token = _state.set(_RequestState(use_replica=replicas_enabled() and not is_sticky(user_id)))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """Routes opted-in reads to a random replica; everything else uses the default database."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica:
+            return None
+        aliases = replica_settings()['ALIASES']
+        # Reads inside a transaction must see that transaction's writes
+        if not aliases or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReadReplicaMixin:
+    """
+    For read-only DRF views: safe requests read from a replica once the user
+    is authenticated, unless that user wrote within the stickiness window.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _state.get()
+        if state is not None and request.method in SAFE_METHODS and replicas_enabled():
+            state.use_replica = not is_sticky(request.user.pk)
+
+
+class ReadReplicaMiddleware:
+    """
+    Tracks routing state and per-alias query counts for each request, and
+    makes a user sticky to the primary after any unsafe request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _RequestState()
+        token = _state.set(state)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(self._counter(state, alias)))
+                response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if request.method not in SAFE_METHODS:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated and replicas_enabled():
+                mark_sticky(user.pk)
+
+        with _totals_lock:
+            _totals.update(state.queries)
+        if replica_settings()['QUERY_COUNT_HEADER']:
+            response['X-DB-Queries'] = ', '.join(f"{alias}={count}" for alias, count in sorted(state.queries.items()))
+        return response
+
+    @staticmethod
+    def _counter(state, alias):
+        def count(execute, sql, params, many, context):
+            state.queries[alias] += 1
+            return execute(sql, params, many, context)
+        return count
@@ -0,0 +1,84 @@
+"""
+Model fields shared across apps.
+"""
+import threading
+
+import orjson
+from django.db import models
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Every zstd frame starts with these bytes; JSON never does
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+_codecs = threading.local()
+
+
+def _compressor(level):
+    # zstd (de)compressors are not thread-safe; keep one per thread and level
+    compressors = _codecs.__dict__.setdefault('compressors', {})
+    if level not in compressors:
+        compressors[level] = zstandard.ZstdCompressor(level=level)
+    return compressors[level]
+
+
+def _decompressor():
+    if not hasattr(_codecs, 'decompressor'):
+        _codecs.decompressor = zstandard.ZstdDecompressor()
+    return _codecs.decompressor
+
+
+def decode_json(data):
+    """A value stored by CompressedJSONField, compressed or not."""
+    data = bytes(data)
+    if data.startswith(ZSTD_MAGIC):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError('zstandard is required to read compressed JSON')
+        data = _decompressor().decompress(data)
+    return orjson.loads(data)
+
+
+class CompressedJSONField(models.BinaryField):
+    """
+    JSON in a binary column. A value whose encoding is ``min_bytes`` or
+    more is stored zstd-compressed at ``level``, and smaller ones as plain
+    JSON bytes. Reads return the decoded value either way. Without
+    zstandard installed everything is written uncompressed. No JSON lookups
+    are possible on the column.
+    """
+
+    def __init__(self, *args, min_bytes=512, level=3, **kwargs):
+        self.min_bytes = min_bytes
+        self.level = level
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.min_bytes != 512:
+            kwargs['min_bytes'] = self.min_bytes
+        if self.level != 3:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        data = orjson.dumps(value)
+        if ZSTD_AVAILABLE and len(data) >= self.min_bytes:
+            data = _compressor(self.level).compress(data)
+        return data
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else decode_json(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return decode_json(value)
+        return value
+
+    def value_to_string(self, obj):
+        return orjson.dumps(self.value_from_object(obj)).decode()
@@ -0,0 +1,166 @@
+"""
+``Idempotency-Key`` support for DRF function views that create things.
+
+A client sends a unique key with a POST. The first response to that key is
+kept for ``TTL_SECONDS``, and a retry with the same key gets it back, marked
+``Idempotent-Replayed: true``, without the view running again. A booking is
+not created twice, and PayPal is not asked for a second order. Keys are
+scoped per view and per user. Reusing a key with a different body is
+answered with 422.
+
+Each key is a row of ``users.IdempotencyKey``, in the database every
+process shares. The first request claims the key by inserting the row,
+whose primary key makes a concurrent insert fail, and holds it for
+``LOCK_SECONDS``. A duplicate that arrives meanwhile polls the row for the
+first one's response for up to ``WAIT_SECONDS``, then gets 409 and should
+retry. Responses worth repeating are stored in the row: 2xx and 4xx,
+except 409 and 429, whose outcome can change. For other responses, 5xx and
+exceptions included, the row is deleted, so a retry runs the view again.
+A lock that outlives ``LOCK_SECONDS``, or a row past ``TTL_SECONDS``, is
+taken over by the next request with the key. ``delete_expired_keys()``
+removes old rows.
+
+Requests without the header behave exactly as before.
+"""
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from users.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+UNSTORED_STATUSES = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+def idempotency_settings():
+    defaults = {
+        'TTL_SECONDS': 24 * 60 * 60,
+        # Longer than the slowest request, PayPal timeouts and retries included
+        'LOCK_SECONDS': 60,
+        'WAIT_SECONDS': 10,
+        'POLL_SECONDS': 0.05,
+        'MAX_KEY_LENGTH': 255,
+    }
+    defaults.update(getattr(settings, 'IDEMPOTENCY', {}))
+    return defaults
+
+
+def _fingerprint(request):
+    return hashlib.sha256(b'%s %s\n%s' % (request.method.encode(), request.path.encode(), request.body)).hexdigest()
+
+
+def _replay(fingerprint, stored):
+    stored_fingerprint, status_code, data = stored
+    if stored_fingerprint != fingerprint:
+        return Response(
+            {'error': f'{HEADER} was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(data, status=status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _claim(key, fingerprint, config):
+    """
+    Try to take ``key``. Returns (locked_until, None) when taken, (None,
+    stored response) when the key has a response, and (None, None) while
+    another request holds it.
+    """
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=config['LOCK_SECONDS'])
+    # Read first: a retry of a finished request, the usual case, costs one query
+    row = IdempotencyKey.objects.filter(key=key).values_list(
+        'fingerprint', 'status_code', 'response', 'locked_until', 'created_at'
+    ).first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=key, fingerprint=fingerprint, locked_until=locked_until, created_at=now)
+        except IntegrityError:
+            # Another request inserted it first
+            return None, None
+        return locked_until, None
+
+    stored_fingerprint, status_code, data, held_until, created_at = row
+    expired = created_at < now - timedelta(seconds=config['TTL_SECONDS'])
+    if status_code is not None and not expired:
+        return None, (stored_fingerprint, status_code, data)
+    if status_code is None and held_until > now:
+        return None, None
+    # Conditional on the row being as read, so only one request takes it over
+    taken = IdempotencyKey.objects.filter(key=key, created_at=created_at, locked_until=held_until).update(
+        fingerprint=fingerprint, status_code=None, response=None, locked_until=locked_until, created_at=now,
+    )
+    return (locked_until, None) if taken else (None, None)
+
+
+def delete_expired_keys(now=None):
+    """Delete keys claimed more than TTL_SECONDS ago; returns how many."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=idempotency_settings()['TTL_SECONDS'])
+    return IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def idempotent(scope):
+    """
+    Decorator for a view under ``@api_view``. ``scope`` names the operation
+    in stored keys. The view can read the scoped key as
+    ``request.idempotency_key``, e.g. to derive a PayPal-Request-Id from it;
+    it is None when the client sent no key.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            request.idempotency_key = None
+            if key is None:
+                return view(request, *args, **kwargs)
+            config = idempotency_settings()
+            if not key or len(key) > config['MAX_KEY_LENGTH']:
+                return Response(
+                    {'error': f"{HEADER} must be 1 to {config['MAX_KEY_LENGTH']} characters"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            owner = request.user.pk if request.user.is_authenticated else 'anonymous'
+            scoped = hashlib.sha256(f"{scope}:{owner}:{key}".encode()).hexdigest()
+            fingerprint = _fingerprint(request)
+            request.idempotency_key = scoped
+
+            deadline = time.monotonic() + config['WAIT_SECONDS']
+            while True:
+                locked_until, stored = _claim(scoped, fingerprint, config)
+                if stored is not None:
+                    return _replay(fingerprint, stored)
+                if locked_until is not None:
+                    break
+                if time.monotonic() >= deadline:
+                    response = Response(
+                        {'error': f'A request with this {HEADER} is still in progress; retry shortly'},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+                time.sleep(config['POLL_SECONDS'])
+
+            # Only while we still hold the key: a lapsed lock may have been taken over
+            held = IdempotencyKey.objects.filter(key=scoped, locked_until=locked_until)
+            kept = False
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code < 500 and response.status_code not in UNSTORED_STATUSES:
+                    kept = bool(held.update(status_code=response.status_code, response=response.data, locked_until=None))
+                return response
+            finally:
+                if not kept:
+                    held.delete()
+        return wrapper
+    return decorator
@@ -0,0 +1,72 @@
+"""
+Loading plans: the ``select_related`` / ``prefetch_related`` a serializer
+needs, derived from its nested serializer fields.
+
+A nested serializer on a forward relation becomes a ``select_related``
+path. A ``many=True`` nested serializer on a reverse or many-to-many
+relation becomes a ``Prefetch`` whose queryset carries the child's own
+plan. If the child's ``Meta`` declares ``ordering``, the prefetched rows are
+sorted by it. Serializing a page then costs one query for the rows plus one
+per prefetched relation, whatever the page size.
+
+``LoadingPlanMixin`` applies the plan of a view's serializer in
+``filter_queryset()``. That is the queryset DRF's list and retrieve
+serialize, so ``get_queryset()`` stays plain for ``.values()`` and
+``.exists()`` callers.
+"""
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class LoadingPlan:
+
+    def __init__(self, select_related=(), prefetches=()):
+        self.select_related = tuple(select_related)
+        # (lookup, model, ordering, plan) for each prefetched relation
+        self.prefetches = tuple(prefetches)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetches:
+            queryset = queryset.prefetch_related(*(
+                Prefetch(lookup, queryset=plan.apply(
+                    model._default_manager.order_by(*ordering) if ordering else model._default_manager.all()
+                ))
+                for lookup, model, ordering, plan in self.prefetches
+            ))
+        return queryset
+
+
+def _walk(serializer, prefix, select_related, prefetches):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        lookup = prefix + field.source.replace('.', '__')
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.ModelSerializer):
+            child = field.child
+            prefetches.append((lookup, child.Meta.model, tuple(getattr(child.Meta, 'ordering', ())), _plan(child)))
+        elif isinstance(field, serializers.ModelSerializer):
+            select_related.append(lookup)
+            _walk(field, lookup + '__', select_related, prefetches)
+
+
+def _plan(serializer):
+    select_related, prefetches = [], []
+    _walk(serializer, '', select_related, prefetches)
+    return LoadingPlan(select_related, prefetches)
+
+
+@lru_cache(maxsize=None)
+def loading_plan(serializer_class):
+    """The loading plan of ``serializer_class``, computed once per class."""
+    return _plan(serializer_class())
+
+
+class LoadingPlanMixin:
+    """For DRF generic views: loads whatever the view's serializer will read through relations."""
+
+    def filter_queryset(self, queryset):
+        return loading_plan(self.get_serializer_class()).apply(super().filter_queryset(queryset))
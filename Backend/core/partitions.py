@@ -0,0 +1,146 @@
+"""
+Helpers for PostgreSQL declarative range partitioning.
+
+Django has no notion of partitioned tables, so models stay ordinary and these
+helpers reshape the underlying table on PostgreSQL only. On other databases
+every function is a no-op, which keeps SQLite development setups working.
+"""
+from datetime import date
+
+from django.db import connection
+from django.utils import timezone
+
+
+def supports_partitioning(using=connection):
+    return using.vendor == 'postgresql'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(table, using=connection):
+    if not supports_partitioning(using):
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def convert_to_range_partitioned(schema_editor, table, column, monthly=False):
+    """
+    Rebuild ``table`` as a table range-partitioned on ``column``, with a
+    composite primary key (id, column) and a default partition. Existing rows
+    are copied across; with ``monthly``, into monthly partitions created for
+    them and for this month and the next. Meant to run from a migration.
+    """
+    if not supports_partitioning(schema_editor.connection) or is_partitioned(table, schema_editor.connection):
+        return
+    quote = schema_editor.quote_name
+    old = f"{table}_unpartitioned"
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY) "
+        f"PARTITION BY RANGE ({quote(column)})"
+    )
+    schema_editor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, {quote(column)})")
+    schema_editor.execute(f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT")
+    if monthly:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"SELECT DISTINCT date_trunc('month', {quote(column)})::date FROM {quote(old)}")
+            months = [row[0] for row in cursor.fetchall()]
+        this_month = month_start(timezone.now())
+        ensure_monthly_partitions(table, [*months, this_month, next_month(this_month)], schema_editor.connection)
+    _copy_rows(schema_editor, old, table)
+
+
+def revert_range_partitioning(schema_editor, table):
+    """Inverse of convert_to_range_partitioned: fold all partitions back into a plain table."""
+    if not is_partitioned(table, schema_editor.connection):
+        return
+    quote = schema_editor.quote_name
+    old = f"{table}_partitioned"
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY)"
+    )
+    schema_editor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id)")
+    _copy_rows(schema_editor, old, table)
+
+
+def _copy_rows(schema_editor, source, table):
+    quote = schema_editor.quote_name
+    schema_editor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(source)}")
+    # An identity column starts a new sequence; carry on after the copied ids
+    schema_editor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), max(id)) FROM {quote(table)} HAVING max(id) IS NOT NULL",
+        [table],
+    )
+    schema_editor.execute(f"DROP TABLE {quote(source)} CASCADE")
+
+
+def ensure_monthly_partitions(table, months, using=connection):
+    """Create the monthly partitions of ``table`` covering ``months`` if they do not exist yet."""
+    if not is_partitioned(table, using):
+        return
+    quote = using.ops.quote_name
+    with using.cursor() as cursor:
+        for month in sorted({month_start(value) for value in months}):
+            # DDL takes no bind parameters; the bounds are dates we formatted ourselves
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {quote(partition_name(table, month))} "
+                f"PARTITION OF {quote(table)} FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            )
+
+
+def monthly_partitions(table, using=connection):
+    """Return (month, partition_name) for every monthly partition of ``table``, oldest first."""
+    if not is_partitioned(table, using):
+        return []
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{table}_p"
+    partitions = []
+    for name in names:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            partitions.append((date(int(suffix[:4]), int(suffix[4:]), 1), name))
+    return sorted(partitions)
+
+
+def retire_monthly_partitions(table, before, detach=False, using=connection):
+    """
+    Drop every monthly partition of ``table`` that ends on or before the date
+    ``before``, or with ``detach`` detach it and keep it as a standalone table
+    for archiving. Either is one catalog change per month, however many rows
+    it holds. Returns the partitions' names.
+    """
+    quote = using.ops.quote_name
+    retired = []
+    with using.cursor() as cursor:
+        for month, name in monthly_partitions(table, using):
+            if next_month(month) > before:
+                break
+            if detach:
+                cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+            else:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            retired.append(name)
+    return retired
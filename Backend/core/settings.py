@@ -12,8 +12,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from decouple import config
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -59,6 +61,7 @@ INSTALLED_APPS = [
     'bookings',
     'payments',
     'ai_agent',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
@@ -70,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db_router.ReadReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -115,6 +119,48 @@ else:
         }
     }
 
+# Read replicas: comma-separated connection URLs, exposed as replica_1, replica_2, ...
+REPLICA_URLS = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+for index, replica_url in enumerate(REPLICA_URLS, start=1):
+    DATABASES[f"replica_{index}"] = {
+        **dj_database_url.parse(replica_url, conn_max_age=600, ssl_require=False),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+READ_REPLICAS = {
+    'ALIASES': [f"replica_{index}" for index in range(1, len(REPLICA_URLS) + 1)],
+    # How long a user's reads stay on the primary after they write
+    'STICKY_SECONDS': config('REPLICA_STICKY_SECONDS', default=10, cast=int),
+    'QUERY_COUNT_HEADER': config('DB_QUERY_COUNT_HEADER', default=DEBUG, cast=bool),
+}
+
+# Cache: shared Redis when configured, otherwise per-process memory
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Read-your-writes stickiness is kept in the cache; each process would have its own under locmem
+if REPLICA_URLS and not CACHE_REDIS_URL:
+    raise ImproperlyConfigured('DATABASE_REPLICA_URLS requires CACHE_REDIS_URL, which keeps users sticky to the primary')
+
+# Token logout is broadcast through the cache (users.authentication); under locmem
+# other workers would keep accepting a logged-out token. Only a single dev process may do without.
+if not DEBUG and not CACHE_REDIS_URL:
+    raise ImproperlyConfigured('CACHE_REDIS_URL is required unless DEBUG, so a logged-out token is refused by every worker')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -161,7 +207,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('knox.auth.TokenAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('users.authentication.CachedTokenAuthentication',),
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
@@ -173,12 +219,27 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
 
 # PayPal Configuration
 PAYPAL_MODE = config('PAYPAL_MODE', default='sandbox')
 PAYPAL_CLIENT_ID = config('PAYPAL_CLIENT_ID', default='')
 PAYPAL_CLIENT_SECRET = config('PAYPAL_CLIENT_SECRET', default='')
 
+# PayPal REST client (payments.gateway)
+PAYPAL_GATEWAY = {
+    # Empty: the PAYPAL_MODE endpoint
+    'BASE_URL': config('PAYPAL_BASE_URL', default=''),
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': config('PAYPAL_READ_TIMEOUT', default=10, cast=float),
+    'MAX_ATTEMPTS': 3,
+    'POOL_SIZE': 20,
+    # Fail fast for this long after this many consecutive PayPal failures
+    'BREAKER_FAILURES': 5,
+    'BREAKER_RESET_SECONDS': 30,
+}
+
 # AI Configuration
 GOOGLE_API_KEY = config('GOOGLE_API_KEY', default='')
 GEMINI_MODEL = config('GEMINI_MODEL', default='gemini-2.0-flash-exp')
@@ -188,6 +249,96 @@ DATA_DIR = BASE_DIR / 'data'
 COMPANY_POLICIES_CSV = DATA_DIR / 'company_policies.csv'
 FLIGHT_DATA_CSV = DATA_DIR / 'flight_data.csv'
 
+# Connecting-flight itinerary search
+ITINERARY_SEARCH = {
+    'MIN_CONNECTION_MINUTES': 45,
+    'MAX_CONNECTION_MINUTES': 360,
+    'MAX_STOPS': 2,
+    'GRAPH_TTL_SECONDS': 60,
+    'MAX_EXPANSIONS': 20000,
+    'TIME_BUDGET_MS': 250,
+}
+
+# Flight search facets
+FLIGHT_SEARCH = {
+    'PRICE_BUCKET_WIDTH': 100,
+}
+
+# Seat inventory: 'db' or 'redis' (Redis counters gate hot flights before the row update)
+SEAT_INVENTORY = {
+    'BACKEND': config('SEAT_INVENTORY_BACKEND', default='db'),
+    'REDIS_URL': config('REDIS_URL', default='redis://localhost:6379/0'),
+    'HOLD_MINUTES': 15,
+    'COUNTER_TTL_SECONDS': 300,
+    # Unpaid bookings are cancelled this long after their hold expires (bookings.expiry)
+    'EXPIRY_GRACE_MINUTES': 5,
+    'EXPIRY_BATCH_SIZE': 500,
+}
+
+# Booking references are a keyed permutation of a sequence (bookings.references).
+# The key must stay fixed once bookings exist: set it explicitly before rotating SECRET_KEY.
+BOOKING_REFERENCES = {
+    'KEY': config('BOOKING_REFERENCE_KEY', default=SECRET_KEY),
+}
+
+# Bulk booking endpoint (POST /api/bookings/bulk/)
+BULK_BOOKINGS = {
+    'MAX_ITEMS': 100,
+}
+
+# Streaming CSV/NDJSON exports (GET /api/bookings/export/, manage.py export_bookings)
+BOOKING_EXPORTS = {
+    'CHUNK_SIZE': 2000,
+    'ZSTD_LEVEL': 3,
+}
+
+# PayPal webhooks (payments.webhooks): logged on receipt, processed in the background
+PAYMENT_WEBHOOKS = {
+    # Deliveries whose PayPal signature does not verify are rejected; without an id all are, unless DEBUG
+    'WEBHOOK_ID': config('PAYPAL_WEBHOOK_ID', default=''),
+    'BATCH_SIZE': 500,
+    # Intake enqueues the processor at most once per this many seconds
+    'SCHEDULE_SECONDS': 1,
+    # Deliveries are kept this long; older monthly partitions are dropped, or with 'detach' kept aside for archiving
+    'RETENTION_DAYS': config('PAYMENT_WEBHOOK_RETENTION_DAYS', default=90, cast=int),
+    'RETENTION_ACTION': 'drop',
+}
+
+# orjson-rendered, .values()-built responses for the flight search and booking lists
+FAST_SERIALIZATION = {
+    'ENABLED': config('FAST_SERIALIZATION', default=True, cast=bool),
+    # Responses at least this large are gzipped for clients that accept it
+    'COMPRESS_MIN_BYTES': 4096,
+}
+
+# Idempotency-Key on booking and payment creation (core.idempotency)
+IDEMPOTENCY = {
+    # How long a response is replayed for its key
+    'TTL_SECONDS': 24 * 60 * 60,
+    # How long a duplicate waits for the in-flight original before a 409
+    'WAIT_SECONDS': 10,
+}
+
+# Admission control for slow endpoints (core.admission): a per-user quota,
+# and a per-process concurrency limit that shrinks when the LLM slows down
+ADMISSION_CONTROL = {
+    # 'local' keeps quotas per process; 'redis' shares them
+    'BACKEND': config('ADMISSION_BACKEND', default='local'),
+    'REDIS_URL': config('REDIS_URL', default='redis://localhost:6379/0'),
+    'SCOPES': {
+        'ai.chat': {
+            # Queued requests hold a worker too: keep MAX_LIMIT + MAX_QUEUE below
+            # the worker threads per process, so other endpoints always find one
+            'INITIAL_LIMIT': 2,
+            'MAX_LIMIT': 4,
+            'MAX_QUEUE': 2,
+            'QUEUE_TIMEOUT_SECONDS': 1.0,
+            'RATE_PER_MINUTE': 10,
+            'BURST': 5,
+        },
+    },
+}
+
 # Frontend URL
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 
@@ -198,11 +349,44 @@ AUTH_USER_MODEL = 'users.User'
 REST_KNOX = {
     'TOKEN_TTL': timedelta(hours=48),
     'AUTO_REFRESH': True,
+    # Seconds; a token's expiry is written back at most this often
+    'MIN_REFRESH_INTERVAL': 15 * 60,
+}
+
+# Cached knox authentication (users.authentication): a revoked token or
+# deactivated user can go unnoticed for up to the sum of these TTLs
+TOKEN_AUTH_CACHE = {
+    'LOCAL_TTL_SECONDS': 5,
+    'LOCAL_MAX_ENTRIES': 10000,
+    'SHARED_TTL_SECONDS': 60,
 }
 
 # Celery Configuration
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
+CELERY_BEAT_SCHEDULE = {
+    'expire-unpaid-bookings': {
+        'task': 'bookings.tasks.expire_unpaid_bookings',
+        'schedule': 60.0,
+    },
+    # Safety net: webhook intake enqueues the processor itself
+    'process-payment-webhooks': {
+        'task': 'payments.tasks.process_payment_webhooks',
+        'schedule': 30.0,
+    },
+    'delete-expired-tokens': {
+        'task': 'users.tasks.delete_expired_tokens',
+        'schedule': 60 * 60.0,
+    },
+    'delete-expired-idempotency-keys': {
+        'task': 'users.tasks.delete_expired_idempotency_keys',
+        'schedule': 60 * 60.0,
+    },
+    'prune-payment-webhooks': {
+        'task': 'payments.tasks.prune_payment_webhooks',
+        'schedule': 6 * 60 * 60.0,
+    },
+}
 
 # Security settings for production
 if not DEBUG:
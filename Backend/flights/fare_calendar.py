@@ -0,0 +1,149 @@
+"""
+Maintenance of the per-route daily fare aggregate (``RouteDailyFare``).
+
+Every refresh is one grouped aggregate over ``flights`` followed by a bulk
+upsert, so callers can pass a single route-day (a repriced flight) or
+thousands of them (a schedule import) at the same cost per round-trip.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Flight, RouteDailyFare
+
+AGGREGATE_COLUMNS = [
+    'departure_airport_id', 'arrival_airport_id', 'date', 'min_price',
+    'max_available_seats', 'total_available_seats', 'flight_count',
+]
+UPDATE_FIELDS = ['min_price', 'max_available_seats', 'total_available_seats', 'flight_count', 'updated_at']
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def defer_route_day_refresh():
+    """Within this block, deleting a flight does not refresh its route-day; the caller refreshes in bulk."""
+    previous = getattr(_deferred, 'active', False)
+    _deferred.active = True
+    try:
+        yield
+    finally:
+        _deferred.active = previous
+
+
+def route_day_refresh_deferred():
+    return getattr(_deferred, 'active', False)
+
+
+def route_day(departure_airport_id, arrival_airport_id, departure_time):
+    return (departure_airport_id, arrival_airport_id, timezone.localdate(departure_time))
+
+
+def daily_fare_rows(flights):
+    """Group ``flights`` by route and departure day in one aggregate query."""
+    return (
+        flights
+        .annotate(date=TruncDate('departure_time'))
+        .values('departure_airport_id', 'arrival_airport_id', 'date')
+        .annotate(
+            min_price=Min('price', filter=Q(available_seats__gt=0)),
+            max_available_seats=Max('available_seats'),
+            total_available_seats=Sum('available_seats'),
+            flight_count=Count('id'),
+        )
+        .order_by()
+    )
+
+
+def _day_bounds(first, last):
+    start = timezone.make_aware(datetime.combine(first, time.min))
+    end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min))
+    return start, end
+
+
+def _upsert(rows):
+    now = timezone.now()
+    RouteDailyFare.objects.bulk_create(
+        [RouteDailyFare(**row, updated_at=now) for row in rows],
+        update_conflicts=True,
+        unique_fields=['departure_airport', 'arrival_airport', 'date'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def refresh_route_days(keys, routes_per_query=100):
+    """
+    Recompute the aggregate for each (departure_id, arrival_id, date) in
+    ``keys``. Routes are handled ``routes_per_query`` at a time to keep the
+    OR-ed filter within database expression limits.
+    """
+    by_route = defaultdict(set)
+    for departure_id, arrival_id, day in set(keys):
+        by_route[(departure_id, arrival_id)].add(day)
+
+    routes = list(by_route.items())
+    for offset in range(0, len(routes), routes_per_query):
+        _refresh_routes(routes[offset:offset + routes_per_query])
+
+
+def _refresh_routes(routes):
+    keys = set()
+    route_filter = Q()
+    for (departure_id, arrival_id), days in routes:
+        keys.update((departure_id, arrival_id, day) for day in days)
+        start, end = _day_bounds(min(days), max(days))
+        route_filter |= Q(
+            departure_airport_id=departure_id,
+            arrival_airport_id=arrival_id,
+            departure_time__gte=start,
+            departure_time__lt=end,
+        )
+
+    rows = [
+        row for row in daily_fare_rows(Flight.objects.filter(route_filter))
+        if (row['departure_airport_id'], row['arrival_airport_id'], row['date']) in keys
+    ]
+    _upsert(rows)
+
+    # Route-days whose last flight went away no longer have a row to upsert
+    empty = keys - {(row['departure_airport_id'], row['arrival_airport_id'], row['date']) for row in rows}
+    if empty:
+        empty_filter = Q()
+        for departure_id, arrival_id, day in empty:
+            empty_filter |= Q(departure_airport_id=departure_id, arrival_airport_id=arrival_id, date=day)
+        RouteDailyFare.objects.filter(empty_filter).delete()
+
+
+def rebuild_fare_calendar(first=None, last=None):
+    """
+    Rebuild the aggregate from scratch, optionally limited to a date range.
+    The grouped aggregate is compiled by the ORM and inserted server-side with
+    INSERT ... SELECT, so no rows travel through Python.
+    """
+    flights = Flight.objects.all()
+    existing = RouteDailyFare.objects.all()
+    if first:
+        flights = flights.filter(departure_time__gte=_day_bounds(first, first)[0])
+        existing = existing.filter(date__gte=first)
+    if last:
+        flights = flights.filter(departure_time__lt=_day_bounds(last, last)[1])
+        existing = existing.filter(date__lte=last)
+
+    existing.delete()
+    sql, params = daily_fare_rows(flights).query.sql_with_params()
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(column) for column in AGGREGATE_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(RouteDailyFare._meta.db_table)} ({columns}, {quote('updated_at')}) "
+            f"SELECT {columns}, %s FROM ({sql}) daily",
+            [timezone.now(), *params],
+        )
+        return cursor.rowcount
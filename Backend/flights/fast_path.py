@@ -0,0 +1,76 @@
+"""
+``.values()``-based builders for flight representations.
+
+They produce the same dicts as ``FlightSerializer`` without instantiating
+models or running DRF's per-field machinery: one tuple per flight, with
+airport dicts built once per airport. Field order follows the serializer.
+"""
+from core.renderers import datetime_formatter, format_decimal
+
+AIRPORT_FIELDS = ('id', 'code', 'name', 'city', 'country')
+
+# Tuple layout of a flight row: flight columns, then both airports
+FLIGHT_COLUMNS = (
+    'id', 'flight_number', 'departure_time', 'arrival_time', 'price',
+    'available_seats', 'airline', 'aircraft_type', 'created_at',
+)
+
+
+def flight_values(prefix=''):
+    """Column names for values_list(), optionally through a relation such as ``flight__``."""
+    return [
+        *(prefix + column for column in FLIGHT_COLUMNS),
+        *(f'{prefix}departure_airport__{field}' for field in AIRPORT_FIELDS),
+        *(f'{prefix}arrival_airport__{field}' for field in AIRPORT_FIELDS),
+    ]
+
+
+def format_duration(departure_time, arrival_time):
+    duration = arrival_time - departure_time
+    hours = duration.seconds // 3600
+    minutes = (duration.seconds % 3600) // 60
+    return f"{hours}h {minutes}m"
+
+
+class FlightRowBuilder:
+    """Builds flight dicts from rows laid out as ``flight_values()``, reusing airport dicts."""
+
+    def __init__(self):
+        self.airports = {}
+        self.format_datetime = datetime_formatter()
+
+    def airport(self, values):
+        airport = self.airports.get(values[0])
+        if airport is None:
+            airport = self.airports[values[0]] = dict(zip(AIRPORT_FIELDS, values))
+        return airport
+
+    def build(self, row):
+        n, width = len(FLIGHT_COLUMNS), len(AIRPORT_FIELDS)
+        (flight_id, flight_number, departure_time, arrival_time, price,
+         available_seats, airline, aircraft_type, created_at) = row[:n]
+        flight = {
+            'id': flight_id,
+            'departure_airport': self.airport(row[n:n + width]),
+            'arrival_airport': self.airport(row[n + width:n + 2 * width]),
+            'duration': format_duration(departure_time, arrival_time),
+            'flight_number': flight_number,
+            'departure_time': self.format_datetime(departure_time),
+            'arrival_time': self.format_datetime(arrival_time),
+            'price': format_decimal(price),
+            'available_seats': available_seats,
+            'airline': airline,
+            'aircraft_type': aircraft_type,
+            'created_at': self.format_datetime(created_at),
+        }
+        return flight
+
+
+def flight_rows(queryset):
+    """``queryset`` as row tuples for serialize_flight_rows(); airports come from the same query."""
+    return queryset.values_list(*flight_values())
+
+
+def serialize_flight_rows(rows):
+    builder = FlightRowBuilder()
+    return [builder.build(row) for row in rows]
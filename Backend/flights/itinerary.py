@@ -0,0 +1,253 @@
+"""
+Connecting-flight itinerary search.
+
+Flights for a date window are loaded once into a time-expanded route graph:
+for every airport we keep its outgoing legs sorted by departure time, so the
+connections reachable from an arrival are a single bisect away. Itineraries
+are then found with a bounded best-first search over that graph instead of
+issuing nested ORM queries per hop.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, time as dt_time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Flight
+
+# Leg tuple layout: (departure_ts, arrival_ts, origin_id, destination_id, price, seats, flight_id)
+DEP, ARR, ORIGIN, DEST, PRICE, SEATS, FLIGHT_ID = range(7)
+
+SORT_DURATION = 'duration'
+SORT_PRICE = 'price'
+
+# The deadline is checked once per this many heap pops
+DEADLINE_CHECK_EVERY = 8
+
+
+def search_settings():
+    defaults = {
+        'MIN_CONNECTION_MINUTES': 45,
+        'MAX_CONNECTION_MINUTES': 360,
+        'MAX_STOPS': 2,
+        'GRAPH_TTL_SECONDS': 60,
+        'MAX_EXPANSIONS': 20000,
+        'TIME_BUDGET_MS': 250,
+    }
+    defaults.update(getattr(settings, 'ITINERARY_SEARCH', {}))
+    return defaults
+
+
+class RouteGraph:
+    """Outgoing legs per airport and per route, sorted by departure time."""
+
+    def __init__(self, legs):
+        adjacency = {}
+        for leg in legs:
+            adjacency.setdefault(leg[ORIGIN], []).append(leg)
+
+        self.adjacency = {}
+        self.routes = {}
+        self.inbound = {}
+        self.size = 0
+        for origin, origin_legs in adjacency.items():
+            origin_legs.sort()
+            self.adjacency[origin] = ([leg[DEP] for leg in origin_legs], origin_legs)
+            self.size += len(origin_legs)
+            routes = {}
+            for leg in origin_legs:
+                routes.setdefault(leg[DEST], []).append(leg)
+            for destination, route_legs in routes.items():
+                self.routes[(origin, destination)] = ([leg[DEP] for leg in route_legs], route_legs)
+                self.inbound.setdefault(destination, set()).add(origin)
+
+    @classmethod
+    def from_database(cls, start, end):
+        rows = (
+            Flight.objects
+            .filter(departure_time__gte=start, departure_time__lt=end, available_seats__gt=0)
+            .values_list(
+                'departure_time', 'arrival_time', 'departure_airport_id',
+                'arrival_airport_id', 'price', 'available_seats', 'id',
+            )
+            .iterator(chunk_size=5000)
+        )
+        return cls(
+            (dep.timestamp(), arr.timestamp(), origin, dest, float(price), seats, flight_id)
+            for dep, arr, origin, dest, price, seats, flight_id in rows
+        )
+
+    def departures(self, airport_id, earliest, latest, destinations=None):
+        """
+        Legs leaving ``airport_id`` with earliest <= departure <= latest,
+        optionally only those landing at one of ``destinations``.
+        """
+        if destinations is None:
+            entries = [self.adjacency.get(airport_id)]
+        else:
+            entries = [self.routes.get((airport_id, destination)) for destination in destinations]
+
+        legs = []
+        for entry in entries:
+            if entry is not None:
+                times, entry_legs = entry
+                legs.extend(entry_legs[bisect_left(times, earliest):bisect_right(times, latest)])
+        return legs
+
+    def search(self, origins, destinations, earliest, latest, passengers=1, max_stops=2,
+               min_connection=2700, max_connection=21600, sort=SORT_DURATION, limit=20,
+               max_expansions=20000, deadline=None):
+        """
+        Best-first search for itineraries whose first leg departs within
+        [earliest, latest]. Connection windows are in seconds, ``deadline`` is
+        a ``time.perf_counter()`` value after which the search stops early.
+        Returns a list of (cost, legs) ordered by ``sort``.
+
+        The search is bounded three ways: legs that can no longer reach a
+        destination in the hops left are never pushed, a path is not expanded
+        when one ending in the same leg after as many legs already was, and
+        the expansion count and deadline cap the total work. Two such paths
+        have the same onward connections and every continuation adds the same
+        to both costs, so the one popped later can never overtake the other,
+        whichever the sort order.
+        """
+        by_price = sort == SORT_PRICE
+        destinations = set(destinations)
+        # Airports that can still reach a destination, keyed by hops remaining after the leg
+        one_hop = set()
+        for destination in destinations:
+            one_hop |= self.inbound.get(destination, set())
+        reachable = {0: destinations, 1: destinations | one_hop}
+
+        heap = []
+        counter = 0
+        for origin in origins:
+            final = destinations if max_stops == 0 else None
+            for leg in self.departures(origin, earliest, latest, final):
+                if leg[SEATS] < passengers or leg[DEST] in origins:
+                    continue
+                if max_stops in reachable and leg[DEST] not in reachable[max_stops]:
+                    continue
+                duration = leg[ARR] - leg[DEP]
+                cost = (leg[PRICE], duration) if by_price else (duration, leg[PRICE])
+                heap.append((cost, counter, (leg,)))
+                counter += 1
+        heapq.heapify(heap)
+
+        results = []
+        expanded = set()
+        expansions = 0
+        pops = 0
+        while heap and len(results) < limit and expansions < max_expansions:
+            pops += 1
+            if deadline is not None and pops % DEADLINE_CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                break
+            cost, _, path = heapq.heappop(heap)
+            last = path[-1]
+
+            if last[DEST] in destinations:
+                results.append((cost, path))
+                continue
+            remaining = max_stops - len(path)
+            label = (last[FLIGHT_ID], len(path))
+            if remaining < 0 or label in expanded:
+                continue
+            expanded.add(label)
+            expansions += 1
+
+            allowed = reachable.get(remaining)
+            final = destinations if remaining == 0 else None
+            visited = {leg[ORIGIN] for leg in path}
+            first_departure = path[0][DEP]
+            connections = self.departures(
+                last[DEST], last[ARR] + min_connection, last[ARR] + max_connection, final
+            )
+            for leg in connections:
+                if leg[SEATS] < passengers or leg[DEST] in visited:
+                    continue
+                if allowed is not None and leg[DEST] not in allowed:
+                    continue
+                duration = leg[ARR] - first_departure
+                price = cost[0] + leg[PRICE] if by_price else cost[1] + leg[PRICE]
+                next_cost = (price, duration) if by_price else (duration, price)
+                heapq.heappush(heap, (next_cost, counter, path + (leg,)))
+                counter += 1
+
+        return results
+
+
+_graph_cache = {}
+_graph_lock = threading.Lock()
+
+
+def day_window(day, max_stops, max_connection):
+    """First legs depart on ``day``; later legs may spill past midnight."""
+    start = timezone.make_aware(datetime.combine(day, dt_time.min))
+    end = start + timedelta(days=1) + max_stops * (max_connection + timedelta(days=1))
+    return start, end
+
+
+def get_route_graph(day):
+    """Return the cached route graph for ``day``, rebuilding it once its TTL lapses."""
+    config = search_settings()
+    max_connection = timedelta(minutes=config['MAX_CONNECTION_MINUTES'])
+    start, end = day_window(day, config['MAX_STOPS'], max_connection)
+
+    now = time.monotonic()
+    with _graph_lock:
+        cached = _graph_cache.get(day)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    graph = RouteGraph.from_database(start, end)
+    with _graph_lock:
+        _graph_cache[day] = (now + config['GRAPH_TTL_SECONDS'], graph)
+        for key in [key for key, (expires, _) in _graph_cache.items() if expires <= now]:
+            del _graph_cache[key]
+    return graph
+
+
+def find_itineraries(origins, destinations, day, passengers=1, max_stops=2, sort=SORT_DURATION,
+                     min_connection=None, max_connection=None, limit=20):
+    """Search the route graph for ``day`` and return itineraries as dicts of flight ids and totals."""
+    config = search_settings()
+    longest = timedelta(minutes=config['MAX_CONNECTION_MINUTES'])
+    if min_connection is None:
+        min_connection = timedelta(minutes=config['MIN_CONNECTION_MINUTES'])
+    if max_connection is None:
+        max_connection = longest
+    elif max_connection > longest:
+        # The cached graph only holds flights departing within the configured window
+        raise ValueError(f"max_connection may be at most {config['MAX_CONNECTION_MINUTES']} minutes")
+    max_stops = min(max_stops, config['MAX_STOPS'])
+
+    graph = get_route_graph(day)
+    start = timezone.make_aware(datetime.combine(day, dt_time.min))
+    results = graph.search(
+        origins=set(origins),
+        destinations=destinations,
+        earliest=start.timestamp(),
+        latest=(start + timedelta(days=1)).timestamp() - 1,
+        passengers=passengers,
+        max_stops=max_stops,
+        min_connection=min_connection.total_seconds(),
+        max_connection=max_connection.total_seconds(),
+        sort=sort,
+        limit=limit,
+        max_expansions=config['MAX_EXPANSIONS'],
+        deadline=time.perf_counter() + config['TIME_BUDGET_MS'] / 1000,
+    )
+
+    itineraries = []
+    for _, legs in results:
+        minutes = int(legs[-1][ARR] - legs[0][DEP]) // 60
+        itineraries.append({
+            'flight_ids': [leg[FLIGHT_ID] for leg in legs],
+            'stops': len(legs) - 1,
+            'total_price': f"{sum(leg[PRICE] for leg in legs):.2f}",
+            'total_duration': f"{minutes // 60}h {minutes % 60}m",
+        })
+    return itineraries
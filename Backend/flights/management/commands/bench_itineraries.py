@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flights.itinerary import RouteGraph, search_settings, SORT_DURATION, SORT_PRICE
+
+
+class Command(BaseCommand):
+    help = 'Benchmark connecting-flight search on a synthetic route network'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--airports', type=int, default=300)
+        parser.add_argument('--flights', type=int, default=120000)
+        parser.add_argument('--searches', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        config = search_settings()
+        airports = list(range(1, options['airports'] + 1))
+        # A few hubs carry most of the traffic, like a real network
+        hubs = airports[:max(len(airports) // 20, 1)]
+        day = 86400
+
+        legs = []
+        for flight_id in range(1, options['flights'] + 1):
+            origin = rng.choice(hubs) if rng.random() < 0.5 else rng.choice(airports)
+            destination = rng.choice(hubs) if rng.random() < 0.5 else rng.choice(airports)
+            if origin == destination:
+                destination = airports[(destination % len(airports))]
+            departure = rng.randrange(0, 2 * day, 300)
+            arrival = departure + rng.randrange(3600, 8 * 3600, 300)
+            legs.append((departure, arrival, origin, destination, float(rng.randrange(80, 900)),
+                         rng.randrange(0, 180), flight_id))
+
+        started = time.perf_counter()
+        graph = RouteGraph(legs)
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Built graph of {graph.size} flights / {len(graph.adjacency)} airports in {build_ms:.0f} ms")
+
+        budget_ms = config['TIME_BUDGET_MS']
+        timings = []
+        found = 0
+        for _ in range(options['searches']):
+            origin, destination = rng.sample(airports, 2)
+            started = time.perf_counter()
+            results = graph.search(
+                origins={origin},
+                destinations={destination},
+                earliest=0,
+                latest=day - 1,
+                passengers=rng.randint(1, 4),
+                max_stops=config['MAX_STOPS'],
+                min_connection=config['MIN_CONNECTION_MINUTES'] * 60,
+                max_connection=config['MAX_CONNECTION_MINUTES'] * 60,
+                sort=rng.choice([SORT_DURATION, SORT_PRICE]),
+                max_expansions=config['MAX_EXPANSIONS'],
+                deadline=started + budget_ms / 1000,
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            found += bool(results)
+
+        timings.sort()
+        p50 = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{len(timings)} searches, {found} with results: "
+            f"p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {timings[-1]:.1f} ms (budget {budget_ms} ms)"
+        )
+        # The deadline is only checked every DEADLINE_CHECK_EVERY pops, so allow a little slack
+        if p95 > budget_ms * 1.2:
+            raise CommandError(f"p95 latency {p95:.1f} ms exceeds the {budget_ms} ms budget")
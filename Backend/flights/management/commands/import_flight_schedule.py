@@ -0,0 +1,212 @@
+import csv
+import gzip
+import io
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from flights.fare_calendar import rebuild_fare_calendar
+from flights.models import Airport, Flight
+
+REQUIRED_COLUMNS = {
+    'flight_number', 'airline', 'departure_airport', 'arrival_airport',
+    'departure_time', 'arrival_time', 'price', 'available_seats',
+}
+# available_seats is only taken from the schedule for new flights: once on sale,
+# the inventory owns it, and a re-import must not hand back seats already sold or held
+UPDATE_FIELDS = [
+    'departure_airport', 'arrival_airport', 'arrival_time', 'price',
+    'airline', 'aircraft_type', 'updated_at',
+]
+COPY_COLUMNS = [
+    'flight_number', 'departure_airport_id', 'arrival_airport_id', 'departure_time',
+    'arrival_time', 'price', 'available_seats', 'airline', 'aircraft_type',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream an airline schedule CSV (optionally gzipped, "-" for stdin) into Airport and Flight, '
+        'upserting on (flight_number, departure_time) in batches. Existing flights keep their available seats.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--progress-every', type=int, default=100000, help='Report progress every N rows')
+        parser.add_argument(
+            '--method', choices=['auto', 'orm', 'copy'], default='auto',
+            help='copy streams each batch into a Postgres staging table and merges it; auto picks copy on Postgres'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.use_copy = options['method'] == 'copy' or (
+            options['method'] == 'auto' and connection.vendor == 'postgresql'
+        )
+        if self.use_copy and connection.vendor != 'postgresql':
+            raise CommandError('--method copy requires PostgreSQL')
+        # Airports are few compared to flights, so the whole code -> id map stays in memory
+        self.airports = dict(Airport.objects.values_list('code', 'id'))
+        self.imported = 0
+        self.skipped = 0
+        # Only the span of departure dates is kept, not the rows themselves
+        self.first_day = None
+        self.last_day = None
+
+        started = time.perf_counter()
+        next_report = options['progress_every']
+        rows_read = 0
+
+        with self._open(options['path']) as handle:
+            reader = csv.DictReader(handle, delimiter=options['delimiter'])
+            missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"Missing columns: {', '.join(sorted(missing))}")
+
+            batch = []
+            for row in reader:
+                rows_read += 1
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+                if rows_read >= next_report:
+                    self._report(rows_read, started)
+                    next_report += options['progress_every']
+            self._flush(batch)
+
+        # bulk_create bypasses the save signals, so rebuild the fare calendar
+        # for the imported span with one grouped aggregate
+        if self.first_day:
+            with transaction.atomic():
+                route_days = rebuild_fare_calendar(self.first_day, self.last_day)
+            self.stdout.write(f"Refreshed {route_days} route-day fares from {self.first_day} to {self.last_day}")
+
+        self._report(rows_read, started, final=True)
+
+    def _open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8', newline='')
+        return open(path, encoding='utf-8', newline='')
+
+    def _report(self, rows_read, started, final=False):
+        elapsed = time.perf_counter() - started
+        rate = rows_read / elapsed if elapsed else 0
+        message = (
+            f"{rows_read} rows read, {self.imported} upserted, {self.skipped} skipped "
+            f"in {elapsed:.1f}s ({rate:,.0f} rows/sec)"
+        )
+        self.stdout.write(self.style.SUCCESS(message) if final else message)
+
+    def _parse_time(self, value):
+        parsed = parse_datetime(value.strip())
+        if parsed is None:
+            raise ValueError(f"invalid datetime {value!r}")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def _resolve_airports(self, rows):
+        """Create airports missing from the cache in one insert and add their ids to it."""
+        new = {}
+        for row in rows:
+            for side in ('departure', 'arrival'):
+                code = (row.get(f'{side}_airport') or '').strip().upper()
+                if code and code not in self.airports and code not in new:
+                    new[code] = Airport(
+                        code=code,
+                        name=(row.get(f'{side}_airport_name') or code)[:100],
+                        city=(row.get(f'{side}_city') or code)[:50],
+                        country=(row.get(f'{side}_country') or '')[:50],
+                    )
+        if new:
+            Airport.objects.bulk_create(new.values(), ignore_conflicts=True)
+            self.airports.update(Airport.objects.filter(code__in=new).values_list('code', 'id'))
+
+    def _flush(self, rows):
+        if not rows:
+            return
+        self._resolve_airports(rows)
+
+        # Keyed on the natural key so a batch never upserts the same row twice
+        flights = {}
+        for row in rows:
+            try:
+                departure_time = self._parse_time(row['departure_time'])
+                flight = Flight(
+                    flight_number=row['flight_number'].strip()[:10],
+                    departure_airport_id=self.airports[row['departure_airport'].strip().upper()],
+                    arrival_airport_id=self.airports[row['arrival_airport'].strip().upper()],
+                    departure_time=departure_time,
+                    arrival_time=self._parse_time(row['arrival_time']),
+                    price=Decimal(row['price']),
+                    available_seats=int(row['available_seats']),
+                    airline=row['airline'].strip()[:50],
+                    aircraft_type=(row.get('aircraft_type') or '').strip()[:50],
+                )
+            except (KeyError, ValueError, InvalidOperation, AttributeError) as e:
+                self.skipped += 1
+                if self.skipped <= 20:
+                    self.stderr.write(f"Skipping row {row.get('flight_number')!r}: {e}")
+                continue
+            flights[(flight.flight_number, departure_time)] = flight
+
+        with transaction.atomic():
+            if self.use_copy:
+                self._copy_merge(flights.values())
+            else:
+                Flight.objects.bulk_create(
+                    flights.values(),
+                    update_conflicts=True,
+                    unique_fields=['flight_number', 'departure_time'],
+                    update_fields=UPDATE_FIELDS,
+                )
+        self.imported += len(flights)
+
+        days = [timezone.localdate(departure_time) for _, departure_time in flights]
+        if days:
+            self.first_day = min(days + [self.first_day or days[0]])
+            self.last_day = max(days + [self.last_day or days[0]])
+
+    def _copy_merge(self, flights):
+        """COPY the batch into a temporary staging table, then merge it into flights in one statement."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for flight in flights:
+            writer.writerow([getattr(flight, column) for column in COPY_COLUMNS])
+        buffer.seek(0)
+
+        columns = ', '.join(COPY_COLUMNS)
+        updates = ', '.join(
+            f'{column} = EXCLUDED.{column}' for column in (Flight._meta.get_field(name).column for name in UPDATE_FIELDS)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS flights_import_staging ('
+                'flight_number varchar(10), departure_airport_id bigint, arrival_airport_id bigint, '
+                'departure_time timestamptz, arrival_time timestamptz, price numeric(10, 2), '
+                'available_seats integer, airline varchar(50), aircraft_type varchar(50)'
+                ') ON COMMIT DELETE ROWS'
+            )
+            # ON COMMIT only empties it when this batch's transaction is the outermost one
+            cursor.execute('TRUNCATE flights_import_staging')
+            # Unquoted empty CSV fields are NULL to COPY; blank text columns must stay ''
+            cursor.copy_expert(
+                f'COPY flights_import_staging ({columns}) FROM STDIN '
+                f'WITH (FORMAT csv, FORCE_NOT_NULL (flight_number, airline, aircraft_type))',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {Flight._meta.db_table} ({columns}, created_at, updated_at) '
+                f'SELECT {columns}, now(), now() FROM flights_import_staging '
+                f'ON CONFLICT (flight_number, departure_time) DO UPDATE SET {updates}'
+            )
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from flights.fare_calendar import rebuild_fare_calendar
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-route daily fare aggregate from the flights table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='first', help='First departure date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='last', help='Last departure date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            first = datetime.strptime(options['first'], '%Y-%m-%d').date() if options['first'] else None
+            last = datetime.strptime(options['last'], '%Y-%m-%d').date() if options['last'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format')
+
+        with transaction.atomic():
+            count = rebuild_fare_calendar(first, last)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} route-day fare rows"))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteDailyFare',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('max_available_seats', models.IntegerField(default=0)),
+                ('total_available_seats', models.IntegerField(default=0)),
+                ('flight_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('arrival_airport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+                ('departure_airport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+            ],
+            options={
+                'db_table': 'route_daily_fares',
+                'constraints': [models.UniqueConstraint(fields=('departure_airport', 'arrival_airport', 'date'), name='route_daily_fares_route_date_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0002_routedailyfare'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='flight',
+            constraint=models.UniqueConstraint(fields=('flight_number', 'departure_time'), name='flights_number_departure_uniq'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.partitions import convert_to_range_partitioned, revert_range_partitioning
+
+
+def partition_archive(apps, schema_editor):
+    convert_to_range_partitioned(schema_editor, 'flights_archive', 'departure_time')
+
+
+def unpartition_archive(apps, schema_editor):
+    revert_range_partitioning(schema_editor, 'flights_archive')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0003_flight_flights_number_departure_uniq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedFlight',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('flight_number', models.CharField(max_length=10)),
+                ('departure_time', models.DateTimeField()),
+                ('arrival_time', models.DateTimeField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('available_seats', models.IntegerField()),
+                ('airline', models.CharField(max_length=50)),
+                ('aircraft_type', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('arrival_airport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+                ('departure_airport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+            ],
+            options={
+                'db_table': 'flights_archive',
+            },
+        ),
+        migrations.RunPython(partition_archive, unpartition_archive),
+    ]
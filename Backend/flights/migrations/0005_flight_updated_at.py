@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0004_archivedflight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:45
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0005_flight_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='flight',
+            name='flights_departu_65e941_idx',
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_airport', 'arrival_airport', 'departure_time'], name='flights_departu_7fede3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_airport', 'arrival_airport', 'price'], name='flights_departu_0b4c96_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(models.F('departure_airport'), models.F('arrival_airport'), django.db.models.expressions.CombinedExpression(models.F('arrival_time'), '-', models.F('departure_time')), name='flights_route_duration_idx'),
+        ),
+    ]
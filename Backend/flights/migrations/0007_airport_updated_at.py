@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0006_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airport',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
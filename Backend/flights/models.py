@@ -1,10 +1,12 @@
 from django.db import models
+from django.db.models import F
 
 class Airport(models.Model):
     code = models.CharField(max_length=3, unique=True)
     name = models.CharField(max_length=100)
     city = models.CharField(max_length=50)
     country = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'airports'
@@ -23,13 +25,72 @@ class Flight(models.Model):
     airline = models.CharField(max_length=50)
     aircraft_type = models.CharField(max_length=50, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'flights'
         indexes = [
-            models.Index(fields=['departure_airport', 'arrival_airport']),
+            # Route searches, in each of the search sort orders
+            models.Index(fields=['departure_airport', 'arrival_airport', 'departure_time']),
+            models.Index(fields=['departure_airport', 'arrival_airport', 'price']),
+            models.Index(
+                'departure_airport', 'arrival_airport', F('arrival_time') - F('departure_time'),
+                name='flights_route_duration_idx',
+            ),
             models.Index(fields=['departure_time']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['flight_number', 'departure_time'], name='flights_number_departure_uniq'),
+        ]
     
     def __str__(self):
-        return f"{self.flight_number} - {self.departure_airport.code} to {self.arrival_airport.code}"
\ No newline at end of file
+        return f"{self.flight_number} - {self.departure_airport.code} to {self.arrival_airport.code}"
+
+
+class RouteDailyFare(models.Model):
+    """Per-route, per-day fare and seat aggregate that backs the fare calendar."""
+    departure_airport = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='+')
+    arrival_airport = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_available_seats = models.IntegerField(default=0)
+    total_available_seats = models.IntegerField(default=0)
+    flight_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'route_daily_fares'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['departure_airport', 'arrival_airport', 'date'],
+                name='route_daily_fares_route_date_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.departure_airport_id}-{self.arrival_airport_id} {self.date}: {self.min_price}"
+
+
+class ArchivedFlight(models.Model):
+    """
+    A departed flight moved out of ``flights`` once all of its bookings are
+    terminal. On PostgreSQL the table is range-partitioned by departure month.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    flight_number = models.CharField(max_length=10)
+    departure_airport = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='+')
+    arrival_airport = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='+')
+    departure_time = models.DateTimeField()
+    arrival_time = models.DateTimeField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    available_seats = models.IntegerField()
+    airline = models.CharField(max_length=50)
+    aircraft_type = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'flights_archive'
+
+    def __str__(self):
+        return f"{self.flight_number} (archived)"
@@ -0,0 +1,157 @@
+"""
+Filters, sort orders and facets for flight search.
+
+Facets are computed over the filtered result set in a single grouped query:
+rows are grouped by (airline, aircraft type, price bucket, time of day), so
+the number of groups stays small however many flights match. Each facet is
+then rolled up from those groups in Python.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Max, Min, Q, Value, When
+from django.db.models.functions import Floor
+
+# Departure hour ranges, in the active timezone
+TIME_OF_DAY_BUCKETS = {
+    'night': (0, 6),
+    'morning': (6, 12),
+    'afternoon': (12, 18),
+    'evening': (18, 24),
+}
+
+SORT_ORDERS = {
+    'departure_time': ('departure_time', 'id'),
+    '-departure_time': ('-departure_time', '-id'),
+    'price': ('price', 'departure_time', 'id'),
+    '-price': ('-price', 'departure_time', 'id'),
+    'duration': ('duration', 'departure_time', 'id'),
+    '-duration': ('-duration', 'departure_time', 'id'),
+}
+
+
+def facet_settings():
+    defaults = {
+        'PRICE_BUCKET_WIDTH': 100,
+    }
+    defaults.update(getattr(settings, 'FLIGHT_SEARCH', {}))
+    return defaults
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def _price(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    if not price.is_finite() or price < 0:
+        raise ValueError(f"{name} must be a non-negative number")
+    return price
+
+
+def parse_search_filters(params):
+    """Read the filter and sort parameters from a query dict; raises ValueError on bad input."""
+    time_of_day = _split(params.get('time_of_day'))
+    unknown = [bucket for bucket in time_of_day if bucket not in TIME_OF_DAY_BUCKETS]
+    if unknown:
+        raise ValueError(f"time_of_day must be one of {', '.join(TIME_OF_DAY_BUCKETS)}")
+
+    sort = params.get('sort') or 'departure_time'
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+
+    filters = {
+        'airlines': _split(params.get('airline')),
+        'aircraft_types': _split(params.get('aircraft_type')),
+        'min_price': _price(params, 'min_price'),
+        'max_price': _price(params, 'max_price'),
+        'time_of_day': time_of_day,
+        'sort': sort,
+    }
+    if filters['min_price'] is not None and filters['max_price'] is not None and filters['min_price'] > filters['max_price']:
+        raise ValueError("min_price must not exceed max_price")
+    return filters
+
+
+def apply_search_filters(queryset, filters):
+    if filters['airlines']:
+        queryset = queryset.filter(airline__in=filters['airlines'])
+    if filters['aircraft_types']:
+        queryset = queryset.filter(aircraft_type__in=filters['aircraft_types'])
+    if filters['min_price'] is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters['max_price'] is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters['time_of_day']:
+        hours = Q()
+        for bucket in filters['time_of_day']:
+            start, end = TIME_OF_DAY_BUCKETS[bucket]
+            hours |= Q(departure_time__hour__gte=start, departure_time__hour__lt=end)
+        queryset = queryset.filter(hours)
+    return queryset
+
+
+def apply_search_sort(queryset, sort):
+    if sort.lstrip('-') == 'duration':
+        queryset = queryset.annotate(duration=F('arrival_time') - F('departure_time'))
+    return queryset.order_by(*SORT_ORDERS[sort])
+
+
+def _time_of_day():
+    *earlier, last = TIME_OF_DAY_BUCKETS.items()
+    return Case(
+        *(When(departure_time__hour__lt=end, then=Value(bucket)) for bucket, (_, end) in earlier),
+        default=Value(last[0]),
+    )
+
+
+def search_facets(queryset):
+    """Airline, aircraft type, price histogram and time-of-day counts for ``queryset``, from one query."""
+    width = facet_settings()['PRICE_BUCKET_WIDTH']
+    groups = (
+        queryset.order_by()
+        .annotate(
+            price_bucket=Floor(ExpressionWrapper(F('price') / width, output_field=DecimalField())),
+            time_of_day=_time_of_day(),
+        )
+        .values('airline', 'aircraft_type', 'price_bucket', 'time_of_day')
+        .annotate(count=Count('id'), min_price=Min('price'), max_price=Max('price'))
+    )
+
+    airlines, aircraft_types, price_buckets, times = {}, {}, {}, dict.fromkeys(TIME_OF_DAY_BUCKETS, 0)
+    total, min_price, max_price = 0, None, None
+    for group in groups:
+        count = group['count']
+        total += count
+        airlines[group['airline']] = airlines.get(group['airline'], 0) + count
+        if group['aircraft_type']:
+            aircraft_types[group['aircraft_type']] = aircraft_types.get(group['aircraft_type'], 0) + count
+        bucket = int(group['price_bucket'])
+        price_buckets[bucket] = price_buckets.get(bucket, 0) + count
+        times[group['time_of_day']] += count
+        min_price = group['min_price'] if min_price is None else min(min_price, group['min_price'])
+        max_price = group['max_price'] if max_price is None else max(max_price, group['max_price'])
+
+    def counts(values):
+        return [{'value': value, 'count': count} for value, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))]
+
+    return {
+        'total': total,
+        'airlines': counts(airlines),
+        'aircraft_types': counts(aircraft_types),
+        'price': {
+            'min': f"{min_price:.2f}" if min_price is not None else None,
+            'max': f"{max_price:.2f}" if max_price is not None else None,
+            'buckets': [
+                {'from': f"{bucket * width:.2f}", 'to': f"{(bucket + 1) * width:.2f}", 'count': price_buckets[bucket]}
+                for bucket in sorted(price_buckets)
+            ],
+        },
+        'time_of_day': [{'value': bucket, 'count': count} for bucket, count in times.items()],
+    }
@@ -1,10 +1,11 @@
 from rest_framework import serializers
-from .models import Airport, Flight
+from .models import Airport, ArchivedFlight, Flight
 
 class AirportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Airport
-        fields = '__all__'
+        # updated_at only versions the airport list, see AirportListAPI
+        exclude = ('updated_at',)
 
 class FlightSerializer(serializers.ModelSerializer):
     departure_airport = AirportSerializer(read_only=True)
@@ -13,10 +14,16 @@ class FlightSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Flight
-        fields = '__all__'
+        # updated_at is bookkeeping only; archived flights have no such column and must serialize alike
+        exclude = ('updated_at',)
     
     def get_duration(self, obj):
         duration = obj.arrival_time - obj.departure_time
         hours = duration.seconds // 3600
         minutes = (duration.seconds % 3600) // 60
-        return f"{hours}h {minutes}m"
\ No newline at end of file
+        return f"{hours}h {minutes}m"
+
+class ArchivedFlightSerializer(FlightSerializer):
+    class Meta:
+        model = ArchivedFlight
+        exclude = ('archived_at',)
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .fare_calendar import refresh_route_days, route_day, route_day_refresh_deferred
+from .models import Flight
+
+
+@receiver(pre_save, sender=Flight)
+def remember_previous_route_day(sender, instance, raw=False, **kwargs):
+    # A reschedule or route change must also refresh the day the flight left
+    instance._previous_route_day = None
+    if instance.pk and not raw:
+        previous = Flight.objects.filter(pk=instance.pk).values_list(
+            'departure_airport_id', 'arrival_airport_id', 'departure_time'
+        ).first()
+        if previous:
+            instance._previous_route_day = route_day(*previous)
+
+
+@receiver(post_save, sender=Flight)
+def refresh_fare_calendar_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    keys = {route_day(instance.departure_airport_id, instance.arrival_airport_id, instance.departure_time)}
+    if getattr(instance, '_previous_route_day', None):
+        keys.add(instance._previous_route_day)
+    refresh_route_days(keys)
+
+
+@receiver(post_delete, sender=Flight)
+def refresh_fare_calendar_on_delete(sender, instance, **kwargs):
+    # The archiver deletes in bulk and refreshes the route-days once per batch
+    if route_day_refresh_deferred():
+        return
+    refresh_route_days({route_day(instance.departure_airport_id, instance.arrival_airport_id, instance.departure_time)})
@@ -1,3 +1,437 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.renderers import ORJSONRenderer
+from users.models import User
+from .fast_path import flight_rows, serialize_flight_rows
+from .itinerary import (
+    DEADLINE_CHECK_EVERY, SORT_DURATION, SORT_PRICE, RouteGraph, _graph_cache, find_itineraries,
+)
+from .models import Airport, Flight, RouteDailyFare
+from .serializers import FlightSerializer
+
+HOUR = 3600
+MINUTE = 60
+A, B, C, D = 1, 2, 3, 4
+
+
+def leg(flight_id, origin, destination, departure, arrival, price=100.0, seats=9):
+    return (departure, arrival, origin, destination, price, seats, flight_id)
+
+
+def create_airports(*codes):
+    return [Airport.objects.create(code=code, name=code, city=f"{code} City", country='Testland') for code in codes]
+
+
+def create_flight(number, origin, destination, departure, hours=2, price='120.00', seats=10, **fields):
+    return Flight.objects.create(
+        flight_number=number, departure_airport=origin, arrival_airport=destination,
+        departure_time=departure, arrival_time=departure + timedelta(hours=hours),
+        price=Decimal(price), available_seats=seats, airline=fields.pop('airline', 'Test Air'), **fields,
+    )
+
+
+def at(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=hour, minutes=minute)
+
+
+def flight_ids(results):
+    return [[leg[-1] for leg in legs] for _, legs in results]
+
+
+class RouteGraphSearchTest(SimpleTestCase):
+    """Connection search over hand-built graphs; times are seconds from midnight."""
+
+    def search(self, legs, sort=SORT_DURATION, **kwargs):
+        options = {
+            'origins': {A}, 'destinations': {C}, 'earliest': 0, 'latest': HOUR,
+            'min_connection': 45 * MINUTE, 'max_connection': 6 * HOUR, 'sort': sort,
+        }
+        options.update(kwargs)
+        return RouteGraph(legs).search(**options)
+
+    def test_layover_limits(self):
+        legs = [
+            leg(1, A, B, 0, HOUR),
+            leg(2, B, C, HOUR + 30 * MINUTE, 3 * HOUR),
+            leg(3, B, C, 2 * HOUR, 4 * HOUR),
+            leg(4, B, C, 8 * HOUR, 9 * HOUR),
+        ]
+        self.assertEqual(flight_ids(self.search(legs)), [[1, 3]])
+
+    def test_zero_minimum_connection(self):
+        legs = [leg(1, A, B, 0, HOUR), leg(2, B, C, HOUR, 2 * HOUR)]
+        self.assertEqual(flight_ids(self.search(legs)), [])
+        self.assertEqual(flight_ids(self.search(legs, min_connection=0)), [[1, 2]])
+
+    def test_no_airport_is_visited_twice(self):
+        legs = [
+            leg(1, A, B, 0, HOUR),
+            leg(2, B, A, 2 * HOUR, 3 * HOUR),
+            leg(3, A, C, 4 * HOUR, 5 * HOUR),
+            leg(4, B, D, 2 * HOUR, 3 * HOUR),
+            leg(5, D, B, 4 * HOUR, 5 * HOUR),
+        ]
+        self.assertEqual(flight_ids(self.search(legs, max_stops=2)), [])
+
+    def test_sort_orders(self):
+        legs = [
+            leg(1, A, C, 0, HOUR, price=500.0),
+            leg(2, A, B, 0, HOUR, price=100.0),
+            leg(3, B, C, 2 * HOUR, 5 * HOUR, price=100.0),
+        ]
+        self.assertEqual(flight_ids(self.search(legs, sort=SORT_DURATION)), [[1], [2, 3]])
+        self.assertEqual(flight_ids(self.search(legs, sort=SORT_PRICE)), [[2, 3], [1]])
+
+    def test_price_sort_keeps_connections_of_dearer_arrivals(self):
+        # The cheaper leg into B lands too late for the only onward flight
+        legs = [
+            leg(1, A, B, 0, HOUR, price=50.0),
+            leg(2, A, B, 0, 2 * HOUR, price=10.0),
+            leg(3, B, C, HOUR + 50 * MINUTE, 3 * HOUR),
+        ]
+        self.assertEqual(flight_ids(self.search(legs, sort=SORT_PRICE, limit=1)), [[1, 3]])
+
+    def test_stops_at_deadline(self):
+        legs = [leg(index, A, C, index, HOUR + index) for index in range(1, 31)]
+        self.assertEqual(len(self.search(legs, limit=50)), 30)
+        results = self.search(legs, limit=50, deadline=time.perf_counter() - 1)
+        self.assertEqual(len(results), DEADLINE_CHECK_EVERY - 1)
+
+
+class FindItinerariesTest(TestCase):
+
+    def setUp(self):
+        _graph_cache.clear()
+        self.addCleanup(_graph_cache.clear)
+        self.airports = create_airports('AAA', 'BBB', 'CCC')
+        self.day = timezone.localdate() + timedelta(days=10)
+        create_flight('T1', self.airports[0], self.airports[1], at(self.day, 8))
+        create_flight('T2', self.airports[1], self.airports[2], at(self.day, 10))
+
+    def find(self, **kwargs):
+        return find_itineraries({self.airports[0].pk}, {self.airports[2].pk}, self.day, **kwargs)
+
+    def test_explicit_zero_minimum_connection(self):
+        self.assertEqual(self.find(), [])
+        self.assertEqual(len(self.find(min_connection=timedelta(0))), 1)
+
+    def test_rejects_connection_window_beyond_graph(self):
+        with self.assertRaises(ValueError):
+            self.find(max_connection=timedelta(days=2))
+
+
+class FareCalendarTest(TestCase):
+
+    def setUp(self):
+        self.origin, self.destination = create_airports('AAA', 'BBB')
+        self.day = timezone.localdate() + timedelta(days=10)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='traveller', password='secret'))
+
+    def fare(self, day=None):
+        return RouteDailyFare.objects.filter(
+            departure_airport=self.origin, arrival_airport=self.destination, date=day or self.day,
+        ).first()
+
+    def test_aggregate_follows_flight_changes(self):
+        first = create_flight('T1', self.origin, self.destination, at(self.day, 8), price='300.00', seats=4)
+        self.assertEqual((self.fare().min_price, self.fare().flight_count), (Decimal('300.00'), 1))
+
+        second = create_flight('T2', self.origin, self.destination, at(self.day, 12), price='150.00', seats=6)
+        self.assertEqual(self.fare().min_price, Decimal('150.00'))
+        self.assertEqual(self.fare().total_available_seats, 10)
+
+        second.price = Decimal('350.00')
+        second.save()
+        self.assertEqual(self.fare().min_price, Decimal('300.00'))
+
+        # A reschedule moves the flight out of its old day
+        second.departure_time = at(self.day + timedelta(days=1), 12)
+        second.arrival_time = second.departure_time + timedelta(hours=2)
+        second.save()
+        self.assertEqual(self.fare().flight_count, 1)
+        self.assertEqual(self.fare(self.day + timedelta(days=1)).min_price, Decimal('350.00'))
+
+        first.delete()
+        self.assertIsNone(self.fare())
+
+    def test_deleting_a_departed_flight_refreshes_its_day(self):
+        past = timezone.localdate() - timedelta(days=3)
+        flight = create_flight('T1', self.origin, self.destination, at(past, 8))
+        self.assertIsNotNone(self.fare(past))
+        flight.delete()
+        self.assertIsNone(self.fare(past))
+
+    def test_calendar_returns_cheapest_fare_per_day(self):
+        create_flight('T1', self.origin, self.destination, at(self.day, 8), price='300.00')
+        create_flight('T2', self.origin, self.destination, at(self.day, 12), price='150.00')
+        # Sold out: not bookable, so not the cheapest fare
+        create_flight('T3', self.origin, self.destination, at(self.day, 16), price='50.00', seats=0)
+        create_flight('T4', self.origin, self.destination, at(self.day + timedelta(days=2), 9), price='210.50')
+
+        response = self.client.get('/api/flights/calendar/', {
+            'departure': 'AAA', 'arrival': 'BBB', 'from': self.day.isoformat(),
+            'to': (self.day + timedelta(days=2)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(day['min_price'], day['flights'], day['available_seats']) for day in response.data['days']],
+            [('150.00', 3, 20), (None, 0, 0), ('210.50', 1, 10)],
+        )
+
+
+class FlightSearchTest(TestCase):
+    """Search filters, sort orders with their tie-breakers, and facets over the filtered results."""
+
+    def setUp(self):
+        origin, destination = create_airports('AAA', 'BBB')
+        self.day = timezone.localdate() + timedelta(days=10)
+        for number, airline, aircraft, hour, hours, price in (
+            ('F1', 'Air A', 'A320', 8, 2, '150.00'),
+            ('F2', 'Air B', 'B737', 5, 3, '150.00'),
+            ('F3', 'Air A', '', 13, 1, '320.00'),
+            ('F4', 'Air C', 'A320', 19, 2, '90.00'),
+            ('F5', 'Air B', 'A320', 8, 2, '250.00'),
+        ):
+            create_flight(number, origin, destination, at(self.day, hour), hours=hours, price=price, airline=airline, aircraft_type=aircraft)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='traveller', password='secret'))
+
+    def search(self, **params):
+        return self.client.get('/api/flights/search/', {'departure': 'AAA', 'arrival': 'BBB', 'date': self.day.isoformat(), **params})
+
+    def numbers(self, **params):
+        response = self.search(**params)
+        self.assertEqual(response.status_code, 200)
+        return [flight['flight_number'] for flight in response.data['results']]
+
+    def test_filters(self):
+        cases = [
+            ({'airline': 'Air A'}, {'F1', 'F3'}),
+            ({'airline': 'Air A,Air C'}, {'F1', 'F3', 'F4'}),
+            ({'aircraft_type': 'A320'}, {'F1', 'F4', 'F5'}),
+            ({'aircraft_type': 'B737,A320'}, {'F1', 'F2', 'F4', 'F5'}),
+            ({'min_price': '150'}, {'F1', 'F2', 'F3', 'F5'}),
+            ({'max_price': '150'}, {'F1', 'F2', 'F4'}),
+            ({'min_price': '100', 'max_price': '260'}, {'F1', 'F2', 'F5'}),
+            ({'time_of_day': 'night'}, {'F2'}),
+            ({'time_of_day': 'morning'}, {'F1', 'F5'}),
+            ({'time_of_day': 'afternoon'}, {'F3'}),
+            ({'time_of_day': 'night,evening'}, {'F2', 'F4'}),
+            ({'airline': 'Air B', 'aircraft_type': 'A320', 'time_of_day': 'morning'}, {'F5'}),
+        ]
+        for params, expected in cases:
+            with self.subTest(**params):
+                self.assertEqual(set(self.numbers(**params)), expected)
+
+    def test_rejects_bad_parameters(self):
+        for params in (
+            {'sort': 'airline'}, {'time_of_day': 'noon'}, {'min_price': 'cheap'}, {'max_price': '-1'},
+            {'min_price': 'NaN'}, {'min_price': '300', 'max_price': '100'},
+        ):
+            with self.subTest(**params):
+                response = self.search(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+    def test_sort_orders_break_ties(self):
+        cases = {
+            # F1 and F5 leave at the same time: the lower id comes first either way round
+            'departure_time': ['F2', 'F1', 'F5', 'F3', 'F4'],
+            '-departure_time': ['F4', 'F3', 'F5', 'F1', 'F2'],
+            # Equal prices and durations go by departure time, then id
+            'price': ['F4', 'F2', 'F1', 'F5', 'F3'],
+            '-price': ['F3', 'F5', 'F2', 'F1', 'F4'],
+            'duration': ['F3', 'F1', 'F5', 'F4', 'F2'],
+            '-duration': ['F2', 'F1', 'F5', 'F4', 'F3'],
+        }
+        for sort, expected in cases.items():
+            for fast in (False, True):
+                with self.subTest(sort=sort, fast_path=fast), override_settings(FAST_SERIALIZATION={'ENABLED': fast}):
+                    self.assertEqual(self.numbers(sort=sort), expected)
+        self.assertEqual(self.numbers(), cases['departure_time'])
+
+    def test_facets_count_the_filtered_results(self):
+        response = self.search(airline='Air A,Air B', sort='price', facets='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets'], {
+            'total': 4,
+            'airlines': [{'value': 'Air A', 'count': 2}, {'value': 'Air B', 'count': 2}],
+            # Flights without an aircraft type are left out of that facet
+            'aircraft_types': [{'value': 'A320', 'count': 2}, {'value': 'B737', 'count': 1}],
+            'price': {
+                'min': '150.00',
+                'max': '320.00',
+                'buckets': [
+                    {'from': '100.00', 'to': '200.00', 'count': 2},
+                    {'from': '200.00', 'to': '300.00', 'count': 1},
+                    {'from': '300.00', 'to': '400.00', 'count': 1},
+                ],
+            },
+            'time_of_day': [
+                {'value': 'night', 'count': 1}, {'value': 'morning', 'count': 2},
+                {'value': 'afternoon', 'count': 1}, {'value': 'evening', 'count': 0},
+            ],
+        })
+
+        facets = self.search(time_of_day='evening', facets='true').data['facets']
+        self.assertEqual((facets['total'], facets['airlines']), (1, [{'value': 'Air C', 'count': 1}]))
+        self.assertEqual(facets['price'], {'min': '90.00', 'max': '90.00', 'buckets': [{'from': '0.00', 'to': '100.00', 'count': 1}]})
+        self.assertNotIn('facets', self.search(airline='Air C').data)
+
+
+class FlightFastPathTest(TestCase):
+    """The .values()/orjson search path renders the very bytes of FlightSerializer and JSONRenderer."""
+
+    def setUp(self):
+        self.origin, self.destination = create_airports('AAA', 'BBB')
+        self.destination.city = 'São Paulo\u2028Guarulhos'
+        self.destination.save()
+        self.day = timezone.localdate() + timedelta(days=10)
+        create_flight('T1', self.origin, self.destination, at(self.day, 8, 5) + timedelta(microseconds=123456), price='99.5')
+        create_flight('T2', self.origin, self.destination, at(self.day, 23, 30), hours=27, price='1234.56', aircraft_type='A320')
+        create_flight('T3', self.origin, self.destination, at(self.day, 12), price='0', seats=0)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='traveller', password='secret'))
+
+    def test_rows_render_like_the_serializer(self):
+        flights = Flight.objects.select_related('departure_airport', 'arrival_airport').order_by('pk')
+        for zone in ('UTC', 'Asia/Kolkata'):
+            with self.subTest(zone=zone), timezone.override(zone):
+                self.assertEqual(
+                    ORJSONRenderer().render(serialize_flight_rows(flight_rows(flights))),
+                    JSONRenderer().render(FlightSerializer(flights, many=True).data),
+                )
+
+    def test_search_responses_are_identical(self):
+        params = {'departure': 'AAA', 'arrival': 'BBB', 'date': self.day.isoformat(), 'sort': 'price'}
+        bodies = []
+        for fast in (False, True):
+            with override_settings(FAST_SERIALIZATION={'ENABLED': fast}):
+                response = self.client.get('/api/flights/search/', params)
+            self.assertEqual(response.status_code, 200)
+            bodies.append(response.content)
+        self.assertEqual(bodies[0], bodies[1])
+        self.assertIn(b'"price":"99.50"', bodies[1])
+
+
+class AirportVersionTest(TestCase):
+    """Airport lists and flight details are revalidated against versions read from the database."""
+
+    def setUp(self):
+        self.origin, self.destination = create_airports('AAA', 'BBB')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='traveller', password='secret'))
+
+    def airports(self, **headers):
+        return self.client.get('/api/flights/airports/', headers=headers)
+
+    def test_version_follows_the_table_not_the_cache(self):
+        first = self.airports()
+        self.assertEqual(first.status_code, 200)
+        cache.clear()
+        self.assertEqual(self.airports(**{'If-None-Match': first['ETag']}).status_code, 304)
+
+        versions = [first['X-Table-Version']]
+        create_airports('CCC')
+        versions.append(self.airports()['X-Table-Version'])
+        self.destination.name = 'Renamed'
+        self.destination.save()
+        versions.append(self.airports()['X-Table-Version'])
+        self.destination.delete()
+        versions.append(self.airports()['X-Table-Version'])
+        Airport.objects.bulk_create([Airport(code='DDD', name='DDD', city='DDD City', country='Testland')])
+        versions.append(self.airports()['X-Table-Version'])
+        self.assertEqual(len(set(versions)), len(versions))
+
+    def test_only_the_current_version_is_immutable(self):
+        version = self.airports()['X-Table-Version']
+        current = self.client.get('/api/flights/airports/', {'v': version})
+        self.assertIn('immutable', current['Cache-Control'])
+
+        create_airports('CCC')
+        stale = self.client.get('/api/flights/airports/', {'v': version})
+        self.assertNotIn('immutable', stale['Cache-Control'])
+        self.assertIn('no-cache', stale['Cache-Control'])
+
+    def test_flight_detail_changes_with_its_airports(self):
+        flight = create_flight('T1', self.origin, self.destination, timezone.now() + timedelta(days=3))
+        etag = self.client.get(f'/api/flights/{flight.pk}/')['ETag']
+        self.assertEqual(self.client.get(f'/api/flights/{flight.pk}/', headers={'If-None-Match': etag}).status_code, 304)
+        self.origin.name = 'Renamed'
+        self.origin.save()
+        response = self.client.get(f'/api/flights/{flight.pk}/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['departure_airport']['name'], 'Renamed')
+
+
+class ImportFlightScheduleTest(TestCase):
+    method = 'orm'
+    header = 'flight_number,airline,departure_airport,arrival_airport,departure_time,arrival_time,price,available_seats,aircraft_type\n'
+
+    def setUp(self):
+        self.day = timezone.localdate() + timedelta(days=10)
+
+    def row(self, number='TA100', origin='AAA', destination='BBB', hour=8, price='199.00', seats=120, aircraft=''):
+        return (
+            f"{number},Test Air,{origin},{destination},{at(self.day, hour).isoformat()},"
+            f"{at(self.day, hour + 2).isoformat()},{price},{seats},{aircraft}\n"
+        )
+
+    def run_import(self, *rows):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(self.header + ''.join(rows))
+        self.addCleanup(os.unlink, handle.name)
+        call_command('import_flight_schedule', handle.name, method=self.method, batch_size=2, stdout=StringIO(), stderr=StringIO())
+
+    def test_insert(self):
+        self.run_import(self.row(), self.row('TA200', 'BBB', 'CCC', hour=12, aircraft='A320'), 'BAD1,Test Air,AAA,BBB,not-a-date,,10.00,5,\n')
+        self.assertEqual(set(Airport.objects.values_list('code', flat=True)), {'AAA', 'BBB', 'CCC'})
+        flight = Flight.objects.get(flight_number='TA200')
+        self.assertEqual(
+            (flight.departure_airport.code, flight.price, flight.available_seats, flight.aircraft_type),
+            ('BBB', Decimal('199.00'), 120, 'A320'),
+        )
+        self.assertEqual(Flight.objects.get(flight_number='TA100').aircraft_type, '')
+        self.assertEqual(RouteDailyFare.objects.get(departure_airport__code='AAA', date=self.day).min_price, Decimal('199.00'))
+
+    def test_update_keeps_live_inventory(self):
+        self.run_import(self.row())
+        # Seats sold or held since the first import
+        Flight.objects.update(available_seats=F('available_seats') - 30)
+        self.run_import(self.row(destination='CCC', price='149.00', seats=150, aircraft='B737'))
+
+        flight = Flight.objects.get()
+        self.assertEqual(
+            (flight.arrival_airport.code, flight.price, flight.aircraft_type, flight.available_seats),
+            ('CCC', Decimal('149.00'), 'B737', 90),
+        )
+        self.assertFalse(RouteDailyFare.objects.filter(arrival_airport__code='BBB').exists())
+
+    def test_reimport_is_idempotent(self):
+        rows = [self.row(), self.row('TA200', hour=12)]
+        self.run_import(*rows)
+        before = list(Flight.objects.order_by('pk').values_list('pk', 'flight_number', 'price', 'available_seats'))
+        self.run_import(*rows)
+        self.assertEqual(list(Flight.objects.order_by('pk').values_list('pk', 'flight_number', 'price', 'available_seats')), before)
+        self.assertEqual(Airport.objects.count(), 2)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+class CopyImportFlightScheduleTest(ImportFlightScheduleTest):
+    method = 'copy'
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import AirportListAPI, FlightSearchAPI, FlightDetailAPI
+from .views import AirportListAPI, FlightSearchAPI, FlightDetailAPI, ItinerarySearchAPI, FareCalendarAPI
 
 urlpatterns = [
     path('airports/', AirportListAPI.as_view(), name='airports'),
     path('search/', FlightSearchAPI.as_view(), name='flight-search'),
+    path('itineraries/', ItinerarySearchAPI.as_view(), name='itinerary-search'),
+    path('calendar/', FareCalendarAPI.as_view(), name='fare-calendar'),
     path('<int:pk>/', FlightDetailAPI.as_view(), name='flight-detail'),
 ]
\ No newline at end of file
@@ -1,26 +1,71 @@
-from rest_framework import generics, permissions
-from django.db.models import Q
-from .models import Flight, Airport
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+from .models import Flight, Airport, RouteDailyFare
 from .serializers import FlightSerializer, AirportSerializer
-from datetime import datetime, timedelta
+from .itinerary import find_itineraries, SORT_DURATION, SORT_PRICE
+from datetime import datetime, timedelta, time as dt_time
+from core.conditional import ConditionalGetMixin, table_version
+from core.db_router import ReadReplicaMixin
+from core.renderers import FastSerializationMixin
+from .fast_path import flight_rows, serialize_flight_rows
+from .search import apply_search_filters, apply_search_sort, parse_search_filters, search_facets
 
 # ------------------------------
 # List all airports
 # ------------------------------
-class AirportListAPI(generics.ListAPIView):
-    queryset = Airport.objects.all()
+class AirportListAPI(ConditionalGetMixin, ReadReplicaMixin, generics.ListAPIView):
+    queryset = Airport.objects.order_by('code')
     serializer_class = AirportSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_validators(self, request, *args, **kwargs):
+        self.version = table_version(Airport.objects.all())
+        return f"airports-{self.version}-{request.GET.urlencode()}", None
+
+    def get_cache_control(self, request):
+        # ?v=<X-Table-Version> URLs never change, so clients may keep them for good
+        if request.GET.get('v') == self.version:
+            return {'private': True, 'max_age': 31536000, 'immutable': True}
+        return {'private': True, 'no_cache': True}
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        response['X-Table-Version'] = self.version
+        return response
+
 
 # ------------------------------
 # Search for flights
 # ------------------------------
-class FlightSearchAPI(generics.ListAPIView):
+class FlightSearchAPI(FastSerializationMixin, ReadReplicaMixin, generics.ListAPIView):
     serializer_class = FlightSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
+    def list(self, request, *args, **kwargs):
+        try:
+            self.search_filters = parse_search_filters(request.GET)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if self.use_fast_path(request):
+            rows = flight_rows(self.filter_queryset(self.get_queryset()))
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                response = self.get_paginated_response(serialize_flight_rows(page))
+            else:
+                response = Response(serialize_flight_rows(rows))
+        else:
+            response = super().list(request, *args, **kwargs)
+
+        # Facets are opt-in: one extra grouped query over the same filtered set
+        if request.GET.get('facets') in ('1', 'true') and isinstance(response.data, dict):
+            response.data['facets'] = search_facets(self.get_filtered_queryset())
+        return response
+
+    def get_filtered_queryset(self):
+        """The search results before sorting."""
         # Use self.request.GET to avoid query_params Pylance errors
         departure = self.request.GET.get('departure')
         arrival = self.request.GET.get('arrival')
@@ -28,41 +73,179 @@ class FlightSearchAPI(generics.ListAPIView):
         passengers_param = self.request.GET.get('passengers')
         passengers = int(passengers_param) if passengers_param and passengers_param.isdigit() else 1
 
-        queryset = Flight.objects.select_related('departure_airport', 'arrival_airport')
+        # Only flights that can still be booked; departed ones are archived out of this table
+        queryset = Flight.objects.select_related('departure_airport', 'arrival_airport').filter(
+            departure_time__gte=timezone.now()
+        )
 
-        # Filter by departure airport
+        # Filter by departure airport; resolving airports first lets the route indexes apply
         if departure:
-            queryset = queryset.filter(
-                Q(departure_airport__city__icontains=departure) |
-                Q(departure_airport__code__icontains=departure)
-            )
+            queryset = queryset.filter(departure_airport__in=Airport.objects.filter(
+                Q(city__icontains=departure) | Q(code__icontains=departure)
+            ).values('id'))
 
         # Filter by arrival airport
         if arrival:
-            queryset = queryset.filter(
-                Q(arrival_airport__city__icontains=arrival) |
-                Q(arrival_airport__code__icontains=arrival)
-            )
+            queryset = queryset.filter(arrival_airport__in=Airport.objects.filter(
+                Q(city__icontains=arrival) | Q(code__icontains=arrival)
+            ).values('id'))
 
-        # Filter by date
+        # Filter by date: the search day and the one after, as a plain range on departure_time
         if date:
             try:
                 search_date = datetime.strptime(date, '%Y-%m-%d').date()
-                next_day = search_date + timedelta(days=1)
-                queryset = queryset.filter(departure_time__date__range=[search_date, next_day])
+                start = timezone.make_aware(datetime.combine(search_date, dt_time.min))
+                queryset = queryset.filter(departure_time__gte=start, departure_time__lt=start + timedelta(days=2))
             except ValueError:
                 pass
 
         # Filter by available seats
         queryset = queryset.filter(available_seats__gte=passengers)
 
-        return queryset.order_by('departure_time')
+        return apply_search_filters(queryset, self.get_search_filters())
+
+    def get_search_filters(self):
+        if not hasattr(self, 'search_filters'):
+            self.search_filters = parse_search_filters(self.request.GET)
+        return self.search_filters
+
+    def get_queryset(self):
+        return apply_search_sort(self.get_filtered_queryset(), self.get_search_filters()['sort'])
 
 
 # ------------------------------
 # Flight detail view
 # ------------------------------
-class FlightDetailAPI(generics.RetrieveAPIView):
+class FlightDetailAPI(ConditionalGetMixin, ReadReplicaMixin, generics.RetrieveAPIView):
     queryset = Flight.objects.select_related('departure_airport', 'arrival_airport')
     serializer_class = FlightSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_control = {'private': True, 'no_cache': True}
+
+    def get_validators(self, request, *args, **kwargs):
+        # The nested airports are part of the representation too
+        stamps = Flight.objects.filter(pk=kwargs['pk']).values_list(
+            'updated_at', 'departure_airport__updated_at', 'arrival_airport__updated_at'
+        ).first()
+        if stamps is None:
+            return None, None
+        return f"flight-{kwargs['pk']}-{'-'.join(str(stamp.timestamp()) for stamp in stamps)}", max(stamps)
+
+
+# ------------------------------
+# Search for connecting itineraries
+# ------------------------------
+class ItinerarySearchAPI(ReadReplicaMixin, generics.GenericAPIView):
+    serializer_class = FlightSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        departure = request.GET.get('departure')
+        arrival = request.GET.get('arrival')
+        date = request.GET.get('date')
+        if not departure or not arrival or not date:
+            return Response(
+                {'error': 'departure, arrival and date are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            search_date = datetime.strptime(date, '%Y-%m-%d').date()
+            passengers = int(request.GET.get('passengers', 1))
+            max_stops = int(request.GET.get('max_stops', 2))
+            limit = min(int(request.GET.get('limit', 20)), 50)
+            min_connection = request.GET.get('min_connection')
+            max_connection = request.GET.get('max_connection')
+            min_connection = timedelta(minutes=int(min_connection)) if min_connection else None
+            max_connection = timedelta(minutes=int(max_connection)) if max_connection else None
+        except ValueError:
+            return Response({'error': 'Invalid search parameters'}, status=status.HTTP_400_BAD_REQUEST)
+
+        sort = request.GET.get('sort', SORT_DURATION)
+        if sort not in (SORT_DURATION, SORT_PRICE):
+            return Response({'error': 'sort must be duration or price'}, status=status.HTTP_400_BAD_REQUEST)
+
+        origins = set(Airport.objects.filter(
+            Q(city__icontains=departure) | Q(code__icontains=departure)
+        ).values_list('id', flat=True))
+        destinations = set(Airport.objects.filter(
+            Q(city__icontains=arrival) | Q(code__icontains=arrival)
+        ).values_list('id', flat=True))
+
+        try:
+            itineraries = find_itineraries(
+                origins, destinations, search_date,
+                passengers=max(passengers, 1),
+                max_stops=max(max_stops, 0),
+                sort=sort,
+                min_connection=min_connection,
+                max_connection=max_connection,
+                limit=max(limit, 1),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Load every flight used by the results in a single query
+        flight_ids = {flight_id for itinerary in itineraries for flight_id in itinerary['flight_ids']}
+        flights = Flight.objects.select_related('departure_airport', 'arrival_airport').in_bulk(flight_ids)
+
+        results = []
+        for itinerary in itineraries:
+            legs = [flights[flight_id] for flight_id in itinerary.pop('flight_ids') if flight_id in flights]
+            itinerary['flights'] = self.get_serializer(legs, many=True).data
+            results.append(itinerary)
+
+        return Response({'count': len(results), 'results': results})
+
+
+# ------------------------------
+# Flexible-date fare calendar
+# ------------------------------
+class FareCalendarAPI(ReadReplicaMixin, generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    max_days = 90
+
+    def get(self, request, *args, **kwargs):
+        departure = request.GET.get('departure')
+        arrival = request.GET.get('arrival')
+        if not departure or not arrival:
+            return Response({'error': 'departure and arrival are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            first = datetime.strptime(request.GET.get('from', ''), '%Y-%m-%d').date()
+            last = request.GET.get('to')
+            last = datetime.strptime(last, '%Y-%m-%d').date() if last else first + timedelta(days=29)
+        except ValueError:
+            return Response({'error': 'from and to must be dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if last < first or (last - first).days >= self.max_days:
+            return Response(
+                {'error': f'The date window must span 1 to {self.max_days} days'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # One grouped range read over the daily aggregate; a city may map to several airports
+        days = {
+            row['date']: row for row in RouteDailyFare.objects.filter(
+                Q(departure_airport__city__icontains=departure) | Q(departure_airport__code__icontains=departure),
+                Q(arrival_airport__city__icontains=arrival) | Q(arrival_airport__code__icontains=arrival),
+                date__range=(first, last),
+            ).values('date').annotate(
+                min_price=Min('min_price'),
+                available_seats=Sum('total_available_seats'),
+                flights=Sum('flight_count'),
+            ).order_by()
+        }
+
+        calendar = []
+        for offset in range((last - first).days + 1):
+            day = first + timedelta(days=offset)
+            row = days.get(day)
+            calendar.append({
+                'date': day.isoformat(),
+                'min_price': f"{row['min_price']:.2f}" if row and row['min_price'] is not None else None,
+                'available_seats': row['available_seats'] if row else 0,
+                'flights': row['flights'] if row else 0,
+            })
+
+        return Response({'departure': departure, 'arrival': arrival, 'days': calendar})
@@ -0,0 +1,264 @@
+"""
+The PayPal REST client every payment call goes through.
+
+- One pooled ``requests.Session`` per process; connections stay open across
+  requests.
+- The OAuth token is cached in-process and in the shared cache until
+  shortly before it expires, so workers do not each fetch their own.
+- Every request has strict connect and read timeouts.
+- Failed requests are retried with jittered exponential backoff when that
+  is safe. GETs are safe. POSTs carry a ``PayPal-Request-Id``, which makes
+  PayPal return the original result for a repeat instead of acting twice.
+- A circuit breaker opens after ``BREAKER_FAILURES`` consecutive failures
+  (timeouts, connection errors, 429 and 5xx). While it is open, calls fail
+  at once with ``GatewayUnavailable`` instead of tying up a worker for the
+  whole timeout. After ``BREAKER_RESET_SECONDS`` a single trial call is let
+  through.
+
+Views answer ``GatewayUnavailable`` with 503 and other ``PaymentGatewayError``s
+with 400.
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+BASE_URLS = {
+    'sandbox': 'https://api-m.sandbox.paypal.com',
+    'live': 'https://api-m.paypal.com',
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+TOKEN_CACHE_KEY = 'payments:paypal:token'
+
+
+def gateway_settings():
+    defaults = {
+        # Overrides the PAYPAL_MODE endpoint, e.g. for the local emulator
+        'BASE_URL': '',
+        'CONNECT_TIMEOUT': 3.05,
+        'READ_TIMEOUT': 10,
+        'MAX_ATTEMPTS': 3,
+        'BACKOFF_SECONDS': 0.2,
+        'BACKOFF_MAX_SECONDS': 2,
+        'POOL_SIZE': 20,
+        'BREAKER_FAILURES': 5,
+        'BREAKER_RESET_SECONDS': 30,
+    }
+    defaults.update(getattr(settings, 'PAYPAL_GATEWAY', {}))
+    return defaults
+
+
+class PaymentGatewayError(Exception):
+    """PayPal refused the request or answered with an error."""
+
+    def __init__(self, message, status=None, details=None):
+        super().__init__(message)
+        self.status = status
+        self.details = details or {}
+
+
+class GatewayUnavailable(PaymentGatewayError):
+    """PayPal could not be reached in time, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed, then open for ``reset_seconds``, then one half-open trial."""
+
+    def __init__(self, failures, reset_seconds, clock=time.monotonic):
+        self.max_failures = failures
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half-open' if self.clock() - self._opened_at >= self.reset_seconds else 'open'
+
+    def allow(self):
+        """Whether a call may go out now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or self.clock() - self._opened_at < self.reset_seconds:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._opened_at is not None or self._failures >= self.max_failures:
+                self._opened_at = self.clock()
+
+
+class PayPalGateway:
+
+    def __init__(self, client_id, client_secret, base_url, config):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url.rstrip('/')
+        self.config = config
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.breaker = CircuitBreaker(config['BREAKER_FAILURES'], config['BREAKER_RESET_SECONDS'])
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['POOL_SIZE'])
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._token_lock = threading.Lock()
+        self._token = None
+        self._token_expires = 0
+
+    # ------------------------------
+    # Payments (v1)
+    # ------------------------------
+    def create_payment(self, payment, request_id=None):
+        """Create a payment from ``payment`` (the v1 request body); returns PayPal's payment."""
+        return self._request('POST', '/v1/payments/payment', body=payment, request_id=request_id or uuid.uuid4().hex)
+
+    def find_payment(self, payment_id):
+        return self._request('GET', f"/v1/payments/payment/{payment_id}")
+
+    def execute_payment(self, payment_id, payer_id, request_id=None):
+        """Execute an approved payment; the request id defaults to one per payment and payer, so repeats are safe."""
+        return self._request(
+            'POST', f"/v1/payments/payment/{payment_id}/execute", body={'payer_id': payer_id},
+            request_id=request_id or f"execute-{payment_id}-{payer_id}",
+        )
+
+    # ------------------------------
+    # Transport
+    # ------------------------------
+    def _access_token(self, refresh=False):
+        with self._token_lock:
+            if not refresh and self._token and time.time() < self._token_expires:
+                return self._token
+            cached = None if refresh else cache.get(TOKEN_CACHE_KEY)
+            if cached:
+                self._token, self._token_expires = cached
+                return self._token
+            data = self._send(
+                'POST', '/v1/oauth2/token', data={'grant_type': 'client_credentials'},
+                auth=(self.client_id, self.client_secret), headers={'Accept': 'application/json'},
+            )
+            # Renew a minute early so a token never expires mid-request
+            lifetime = max(int(data.get('expires_in', 0)) - 60, 0)
+            self._token, self._token_expires = data['access_token'], time.time() + lifetime
+            if lifetime:
+                cache.set(TOKEN_CACHE_KEY, (self._token, self._token_expires), lifetime)
+            return self._token
+
+    def _request(self, method, path, body=None, request_id=None):
+        headers = {'Content-Type': 'application/json'}
+        if request_id:
+            headers['PayPal-Request-Id'] = request_id
+        for refresh in (False, True):
+            headers['Authorization'] = f"Bearer {self._access_token(refresh=refresh)}"
+            try:
+                return self._send(method, path, json=body, headers=headers)
+            except PaymentGatewayError as e:
+                # The cached token was revoked or expired early: fetch a new one once
+                if e.status != 401 or refresh:
+                    raise
+
+    def _send(self, method, path, **kwargs):
+        """One call with retries, bounded by the breaker; returns the decoded JSON body."""
+        attempts = self.config['MAX_ATTEMPTS']
+        for attempt in range(1, attempts + 1):
+            if not self.breaker.allow():
+                raise GatewayUnavailable('PayPal is unavailable; try again shortly')
+            try:
+                response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                self.breaker.record_failure()
+                error = GatewayUnavailable(f"PayPal request failed: {e}")
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return self._decode(response)
+                self.breaker.record_failure()
+                error = GatewayUnavailable(f"PayPal answered {response.status_code}", status=response.status_code)
+            if attempt == attempts:
+                raise error
+            delay = min(self.config['BACKOFF_SECONDS'] * 2 ** (attempt - 1), self.config['BACKOFF_MAX_SECONDS'])
+            time.sleep(random.uniform(0, delay))
+
+    @staticmethod
+    def _decode(response):
+        try:
+            data = response.json() if response.content else {}
+        except ValueError:
+            data = {}
+        if response.status_code >= 400:
+            message = data.get('message') or data.get('error_description') or f"PayPal answered {response.status_code}"
+            raise PaymentGatewayError(message, status=response.status_code, details=data)
+        return data
+
+
+def booking_sale(booking, custom):
+    """The v1 request body for a PayPal sale of ``booking``; ``custom`` is echoed back on the sale."""
+    return {
+        "intent": "sale",
+        "payer": {"payment_method": "paypal"},
+        "redirect_urls": {
+            "return_url": f"{settings.FRONTEND_URL}/payment/success/",
+            "cancel_url": f"{settings.FRONTEND_URL}/payment/cancel/",
+        },
+        "transactions": [{
+            "amount": {"total": f"{booking.total_amount:.2f}", "currency": "USD"},
+            "description": f"Flight booking {booking.booking_reference}",
+            "custom": json.dumps(custom),
+        }],
+    }
+
+
+def approval_url(payment):
+    return next((link['href'] for link in payment.get('links', []) if link.get('rel') == 'approval_url'), None)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway, built on first use from the PAYPAL_* settings."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                config = gateway_settings()
+                _gateway = PayPalGateway(
+                    settings.PAYPAL_CLIENT_ID,
+                    settings.PAYPAL_CLIENT_SECRET,
+                    config['BASE_URL'] or BASE_URLS.get(settings.PAYPAL_MODE, BASE_URLS['sandbox']),
+                    config,
+                )
+    return _gateway
+
+
+def reset_gateway():
+    """Drop the gateway, e.g. after settings change or in a forked child, which must not share sockets."""
+    global _gateway
+    _gateway = None
+
+
+os.register_at_fork(after_in_child=reset_gateway)
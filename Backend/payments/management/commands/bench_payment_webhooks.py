@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import orjson
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.utils import timezone
+
+from bookings.models import Booking, SeatHold
+from bookings.references import booking_references
+from flights.models import Airport, Flight
+from payments.models import Payment, PaymentWebhookLog
+from payments.webhooks import process_webhook_events
+from users.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _QueryCounter:
+    # CaptureQueriesContext stops counting at the query log's 9,000 entries
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def generate_events(order_ids, duplicates=0.2, noise=0.1, seed=42):
+    """
+    PayPal-shaped webhook events: one PAYMENT.SALE.COMPLETED per order id,
+    ``duplicates`` of them delivered again (as PayPal retries do), and
+    ``noise`` extra events of types the processor ignores. Shuffled.
+    """
+    rng = random.Random(seed)
+    events = [
+        {
+            'id': f"WH-{uuid.uuid4().hex[:20].upper()}",
+            'event_type': 'PAYMENT.SALE.COMPLETED',
+            'resource_type': 'sale',
+            'resource': {'id': uuid.uuid4().hex[:17].upper(), 'parent_payment': order_id, 'state': 'completed'},
+            'create_time': timezone.now().isoformat(),
+        }
+        for order_id in order_ids
+    ]
+    events += rng.sample(events, int(len(events) * duplicates))
+    events += [
+        {'id': f"WH-{uuid.uuid4().hex[:20].upper()}", 'event_type': 'CHECKOUT.ORDER.APPROVED', 'resource': {}}
+        for _ in range(int(len(order_ids) * noise))
+    ]
+    rng.shuffle(events)
+    return events
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure webhook intake (POST /api/payments/webhook/paypal/) and background processing '
+        'throughput on generated events for synthetic pending payments, rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=2000)
+        parser.add_argument('--duplicates', type=float, default=0.2, help='Share of events delivered twice')
+        parser.add_argument('--batch-sizes', default='1,50,500')
+
+    def handle(self, *args, **options):
+        for batch_size in (int(size) for size in options['batch_sizes'].split(',')):
+            try:
+                with transaction.atomic():
+                    order_ids = self.populate(options['payments'])
+                    self.run(generate_events(order_ids, options['duplicates']), batch_size)
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+    def populate(self, count):
+        origin = Airport.objects.create(code='ZWA', name='Bench A', city='Bench', country='Benchland')
+        destination = Airport.objects.create(code='ZWB', name='Bench B', city='Bench', country='Benchland')
+        departure = timezone.now() + timedelta(days=30)
+        flight = Flight.objects.create(
+            flight_number='WB001',
+            departure_airport=origin,
+            arrival_airport=destination,
+            departure_time=departure,
+            arrival_time=departure + timedelta(hours=2),
+            price=Decimal('199.00'),
+            available_seats=1_000_000,
+            airline='Bench Air',
+        )
+        user = User.objects.create_user(username=f"bench-{uuid.uuid4().hex[:8]}")
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                user=user, flight=flight, booking_reference=reference,
+                passengers=[{'name': 'Ann Example'}], total_amount=flight.price,
+            )
+            for reference in booking_references(count)
+        ])
+        SeatHold.objects.bulk_create([
+            SeatHold(booking=booking, flight=flight, seats=1, expires_at=departure) for booking in bookings
+        ])
+        payments = Payment.objects.bulk_create([
+            Payment(booking=booking, amount=booking.total_amount, paypal_order_id=f"PAYID-{uuid.uuid4().hex[:20].upper()}")
+            for booking in bookings
+        ])
+        return [payment.paypal_order_id for payment in payments]
+
+    def run(self, events, batch_size):
+        client = Client()
+        bodies = [orjson.dumps(event) for event in events]
+        latencies = []
+        intake_queries, processing_queries = _QueryCounter(), _QueryCounter()
+        # Celery and PayPal's signature check are not part of this measurement
+        with mock.patch('payments.webhooks.schedule_processing'), mock.patch('payments.views.verify_signature'), \
+                connection.execute_wrapper(intake_queries):
+            started = time.perf_counter()
+            for body in bodies:
+                request_started = time.perf_counter()
+                response = client.post('/api/payments/webhook/paypal/', body, content_type='application/json', secure=True)
+                latencies.append((time.perf_counter() - request_started) * 1000)
+                assert response.status_code == 200, response.content
+            intake_seconds = time.perf_counter() - started
+
+        with connection.execute_wrapper(processing_queries):
+            started = time.perf_counter()
+            processed = process_webhook_events(batch_size=batch_size)
+            processing_seconds = time.perf_counter() - started
+
+        outcomes = dict(PaymentWebhookLog.objects.values_list('status').annotate(count=Count('pk')).order_by())
+        completed = Payment.objects.filter(paypal_order_id__startswith='PAYID-', status='completed').count()
+        self.stdout.write(
+            f"batch {batch_size:>4}: intake {len(bodies) / intake_seconds:7.0f} events/s "
+            f"(p50 {statistics.median(latencies):.2f} ms, {intake_queries.count / len(bodies):.1f} queries/event), "
+            f"processing {processed / processing_seconds:7.0f} events/s ({processing_queries.count} queries), "
+            f"{completed} payments completed; "
+            + ', '.join(f"{status} {count}" for status, count in sorted(outcomes.items()))
+        )
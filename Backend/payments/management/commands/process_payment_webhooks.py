@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import process_webhook_events
+
+
+class Command(BaseCommand):
+    help = 'Process received PayPal webhook deliveries. Celery runs this on intake and every 30 seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        processed = process_webhook_events(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} webhook deliveries"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from payments.retention import prune_webhook_logs
+
+
+class Command(BaseCommand):
+    help = (
+        'Drop PayPal webhook deliveries older than the retention period, a whole monthly partition at a time '
+        'on PostgreSQL, and create the coming months\' partitions. Celery beat runs this every six hours.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Keep this many days (default: RETENTION_DAYS)')
+        parser.add_argument('--detach', action='store_true', help='Detach old partitions and keep them instead of dropping')
+
+    def handle(self, *args, **options):
+        retired, deleted, claims = prune_webhook_logs(days=options['days'], detach=options['detach'] or None)
+        action = 'Detached' if options['detach'] else 'Retired'
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {len(retired)} partitions{' (' + ', '.join(retired) + ')' if retired else ''}, "
+            f"deleted {deleted} deliveries and {claims} event claims"
+        ))
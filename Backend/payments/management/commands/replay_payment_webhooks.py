@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.models import PaymentWebhookLog
+from payments.webhooks import process_webhook_events, replay_deliveries
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-apply logged PayPal webhook deliveries, e.g. after fixing what made them fail. '
+        'Applying an event twice is harmless: payment and booking updates only move forward.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', default=[], help='Deliveries with this status (default: failed)')
+        parser.add_argument('--event-id', action='append', default=[], help='Deliveries of this PayPal event; repeatable')
+        parser.add_argument('--since', help='Deliveries received on or after this date, YYYY-MM-DD')
+        parser.add_argument('--no-process', action='store_true', help='Only requeue; leave processing to Celery')
+
+    def handle(self, *args, **options):
+        deliveries = PaymentWebhookLog.objects.all()
+        if options['event_id']:
+            deliveries = deliveries.filter(event_id__in=options['event_id'])
+        else:
+            deliveries = deliveries.filter(status__in=options['status'] or ['failed'])
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--since must be YYYY-MM-DD')
+            deliveries = deliveries.filter(created_at__gte=timezone.make_aware(since))
+
+        requeued = replay_deliveries(deliveries)
+        self.stdout.write(f"Requeued {requeued} deliveries")
+        if not options['no_process']:
+            self.stdout.write(self.style.SUCCESS(f"Processed {process_webhook_events()} deliveries"))
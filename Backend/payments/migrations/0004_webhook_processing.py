@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_cancelled_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('resource_id', models.CharField(blank=True, max_length=100)),
+                ('log_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'payment_webhook_events',
+            },
+        ),
+        migrations.AddField(
+            model_name='paymentwebhooklog',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='paymentwebhooklog',
+            name='event_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='paymentwebhooklog',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Deliveries logged before there was a processor are not replayed on upgrade;
+        # replay_payment_webhooks --status ignored picks them up if wanted
+        migrations.AddField(
+            model_name='paymentwebhooklog',
+            name='status',
+            field=models.CharField(choices=[('received', 'Received'), ('processed', 'Processed'), ('duplicate', 'Duplicate'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='ignored', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='paymentwebhooklog',
+            name='status',
+            field=models.CharField(choices=[('received', 'Received'), ('processed', 'Processed'), ('duplicate', 'Duplicate'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='received', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='paymentwebhooklog',
+            index=models.Index(condition=models.Q(('status', 'received')), fields=['id'], name='webhook_log_received_idx'),
+        ),
+    ]
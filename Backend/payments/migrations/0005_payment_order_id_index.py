@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_created_index'),
+        ('payments', '0004_webhook_processing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['paypal_order_id'], name='payment_order_id_idx'),
+        ),
+    ]
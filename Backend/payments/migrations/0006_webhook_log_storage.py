@@ -0,0 +1,104 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:41
+
+import core.fields
+from django.db import migrations, models
+
+from core.partitions import convert_to_range_partitioned, revert_range_partitioning
+
+BATCH_SIZE = 1000
+
+
+def compress_payloads(apps, schema_editor):
+    PaymentWebhookLog = apps.get_model('payments', 'PaymentWebhookLog')
+    batch = []
+    for log in PaymentWebhookLog.objects.only('pk', 'payload_json').iterator(chunk_size=BATCH_SIZE):
+        log.payload = log.payload_json
+        resource = log.payload_json.get('resource') if isinstance(log.payload_json, dict) else None
+        log.resource_id = str(resource.get('id', '') if isinstance(resource, dict) else '')[:100]
+        batch.append(log)
+        if len(batch) == BATCH_SIZE:
+            PaymentWebhookLog.objects.bulk_update(batch, ['payload', 'resource_id'])
+            batch = []
+    PaymentWebhookLog.objects.bulk_update(batch, ['payload', 'resource_id'])
+
+
+def decompress_payloads(apps, schema_editor):
+    PaymentWebhookLog = apps.get_model('payments', 'PaymentWebhookLog')
+    batch = []
+    for log in PaymentWebhookLog.objects.only('pk', 'payload').iterator(chunk_size=BATCH_SIZE):
+        log.payload_json = log.payload
+        batch.append(log)
+        if len(batch) == BATCH_SIZE:
+            PaymentWebhookLog.objects.bulk_update(batch, ['payload_json'])
+            batch = []
+    PaymentWebhookLog.objects.bulk_update(batch, ['payload_json'])
+
+
+def partition_log(apps, schema_editor):
+    convert_to_range_partitioned(schema_editor, 'payments_paymentwebhooklog', 'created_at', monthly=True)
+
+
+def unpartition_log(apps, schema_editor):
+    revert_range_partitioning(schema_editor, 'payments_paymentwebhooklog')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_payment_order_id_index'),
+    ]
+
+    operations = [
+        # Indexes are rebuilt on the partitioned table at the end
+        migrations.RemoveIndex(
+            model_name='paymentwebhooklog',
+            name='webhook_log_received_idx',
+        ),
+        migrations.AddField(
+            model_name='paymentwebhooklog',
+            name='resource_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RenameField(
+            model_name='paymentwebhooklog',
+            old_name='payload',
+            new_name='payload_json',
+        ),
+        migrations.AlterField(
+            model_name='paymentwebhooklog',
+            name='payload_json',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='paymentwebhooklog',
+            name='payload',
+            field=core.fields.CompressedJSONField(null=True),
+        ),
+        migrations.RunPython(compress_payloads, decompress_payloads),
+        migrations.RemoveField(
+            model_name='paymentwebhooklog',
+            name='payload_json',
+        ),
+        migrations.AlterField(
+            model_name='paymentwebhooklog',
+            name='payload',
+            field=core.fields.CompressedJSONField(),
+        ),
+        migrations.RunPython(partition_log, unpartition_log),
+        migrations.AddIndex(
+            model_name='paymentwebhooklog',
+            index=models.Index(condition=models.Q(('status', 'received')), fields=['id'], name='webhook_log_received_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentwebhooklog',
+            index=models.Index(fields=['event_type', 'created_at'], name='webhook_log_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentwebhooklog',
+            index=models.Index(fields=['resource_id'], name='webhook_log_resource_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentwebhooklog',
+            index=models.Index(fields=['event_id'], name='webhook_log_event_idx'),
+        ),
+    ]
@@ -1,9 +1,10 @@
 from django.db import models
-from bookings.models import Booking
+from bookings.models import ArchivedBooking, Booking
+from core.fields import CompressedJSONField
 
 class Payment(models.Model):
     PAYMENT_METHODS = [('paypal', 'PayPal'), ('stripe', 'Stripe'), ('card', 'Credit Card')]
-    STATUS_CHOICES = [('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')]
+    STATUS_CHOICES = [('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded'), ('cancelled', 'Cancelled')]
 
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -14,13 +15,82 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Execution and webhooks find payments by PayPal's id
+            models.Index(fields=['paypal_order_id'], name='payment_order_id_idx'),
+        ]
+
     def __str__(self):
         return f"Payment {self.booking.booking_reference} - {self.status}"
 
+class ArchivedPayment(models.Model):
+    """Payment of an archived booking."""
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.OneToOneField(ArchivedBooking, on_delete=models.CASCADE, related_name='payment')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHODS)
+    paypal_order_id = models.CharField(max_length=100, blank=True, null=True)
+    paypal_payer_id = models.CharField(max_length=100, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'payments_archive'
+
+    def __str__(self):
+        return f"Archived payment {self.booking_id} - {self.status}"
+
 class PaymentWebhookLog(models.Model):
-    payload = models.JSONField()
+    """
+    Every webhook delivery as received, retries included; see
+    payments.webhooks. On PostgreSQL the table is range-partitioned by
+    month of ``created_at``, and payments.retention drops old months whole.
+    """
+    STATUS_CHOICES = [
+        ('received', 'Received'),
+        ('processed', 'Processed'),
+        ('duplicate', 'Duplicate'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    # zstd-compressed when large
+    payload = CompressedJSONField()
     event_type = models.CharField(max_length=100)
+    event_id = models.CharField(max_length=100, blank=True)
+    # The sale, capture or refund the event is about
+    resource_id = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The processor's queue: only unprocessed deliveries are indexed
+            models.Index(fields=['id'], name='webhook_log_received_idx', condition=models.Q(status='received')),
+            models.Index(fields=['event_type', 'created_at'], name='webhook_log_type_idx'),
+            models.Index(fields=['resource_id'], name='webhook_log_resource_idx'),
+            models.Index(fields=['event_id'], name='webhook_log_event_idx'),
+        ]
 
     def __str__(self):
         return f"{self.event_type} - {self.created_at}"
+
+
+class PaymentWebhookEvent(models.Model):
+    """One row per PayPal event id: the first delivery of an event to be processed claims it."""
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=100)
+    resource_id = models.CharField(max_length=100, blank=True)
+    log_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'payment_webhook_events'
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}"
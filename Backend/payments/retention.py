@@ -0,0 +1,62 @@
+"""
+Retention for the webhook log.
+
+Deliveries are kept for ``RETENTION_DAYS``. On PostgreSQL the log is
+range-partitioned by month, so whole months past the cutoff are dropped in
+one statement each. With ``RETENTION_ACTION = 'detach'`` they are detached
+instead and left as standalone tables, to be dumped and dropped by hand.
+Rows older than the cutoff outside the monthly partitions (in the default
+partition, or everywhere on other databases) and old event claims are
+deleted in batches of ``BATCH_SIZE``.
+
+The same job creates the monthly partitions ``PARTITIONS_AHEAD`` months
+ahead, so new deliveries never land in the default partition. Runs as
+``payments.tasks.prune_payment_webhooks`` or ``manage.py prune_payment_webhooks``.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.partitions import ensure_monthly_partitions, month_start, next_month, retire_monthly_partitions
+from .models import PaymentWebhookEvent, PaymentWebhookLog
+from .webhooks import webhook_settings
+
+BATCH_SIZE = 5000
+
+
+def ensure_webhook_log_partitions(now=None):
+    months = [month_start(now or timezone.now())]
+    for _ in range(webhook_settings()['PARTITIONS_AHEAD']):
+        months.append(next_month(months[-1]))
+    ensure_monthly_partitions(PaymentWebhookLog._meta.db_table, months)
+
+
+def _delete_before(model, cutoff, batch_size):
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(model.objects.filter(created_at__lt=cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += model.objects.filter(pk__in=ids).delete()[0]
+
+
+def prune_webhook_logs(days=None, detach=None, now=None, batch_size=BATCH_SIZE):
+    """
+    Remove deliveries and event claims older than ``days`` (default:
+    ``RETENTION_DAYS``). Returns (retired partitions, rows deleted, claims deleted).
+    """
+    config = webhook_settings()
+    days = config['RETENTION_DAYS'] if days is None else days
+    detach = config['RETENTION_ACTION'] == 'detach' if detach is None else detach
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=days)
+
+    ensure_webhook_log_partitions(now)
+    # A month is retired only once all of it is past the cutoff
+    retired = retire_monthly_partitions(PaymentWebhookLog._meta.db_table, cutoff.date(), detach=detach, using=connection)
+    deleted = _delete_before(PaymentWebhookLog, cutoff, batch_size)
+    # PayPal retries for days, not months, so older claims can no longer stop a duplicate
+    claims = _delete_before(PaymentWebhookEvent, cutoff, batch_size)
+    return retired, deleted, claims
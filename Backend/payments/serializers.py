@@ -7,6 +7,8 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = ['id', 'booking', 'amount', 'payment_method', 'paypal_order_id', 'paypal_payer_id', 'status', 'created_at', 'updated_at']
 
 class PaymentWebhookLogSerializer(serializers.ModelSerializer):
+    payload = serializers.JSONField(read_only=True)
+
     class Meta:
         model = PaymentWebhookLog
         fields = ['id', 'payload', 'event_type', 'created_at']
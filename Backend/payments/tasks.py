@@ -0,0 +1,31 @@
+from celery import shared_task
+from django.core.cache import cache
+
+from .retention import prune_webhook_logs
+from .webhooks import process_webhook_events
+
+PROCESS_LOCK = 'payments:webhooks:processing'
+PRUNE_LOCK = 'payments:webhooks:pruning'
+
+
+@shared_task(name='payments.tasks.process_payment_webhooks', ignore_result=True)
+def process_payment_webhooks():
+    """Enqueued by webhook intake and run by beat; only one drain runs at a time, it picks up everything queued."""
+    if not cache.add(PROCESS_LOCK, 1, timeout=300):
+        return None
+    try:
+        return process_webhook_events()
+    finally:
+        cache.delete(PROCESS_LOCK)
+
+
+@shared_task(name='payments.tasks.prune_payment_webhooks', ignore_result=True)
+def prune_payment_webhooks():
+    """Beat task: webhook log retention and upcoming partitions."""
+    if not cache.add(PRUNE_LOCK, 1, timeout=3600):
+        return None
+    try:
+        retired, deleted, claims = prune_webhook_logs()
+        return {'partitions': retired, 'deliveries': deleted, 'claims': claims}
+    finally:
+        cache.delete(PRUNE_LOCK)
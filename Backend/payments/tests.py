@@ -1,3 +1,360 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import orjson
+import requests
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bookings.expiry import expire_unpaid_bookings
+from bookings.lifecycle import transition
+from bookings.models import Booking, SeatHold
+from bookings.references import allocator, next_booking_reference
+from core.fields import ZSTD_MAGIC
+from core.partitions import ensure_monthly_partitions, month_start, supports_partitioning
+from flights.models import Airport, Flight
+from users.models import User
+from .gateway import GatewayUnavailable, PaymentGatewayError, PayPalGateway, gateway_settings
+from .models import Payment, PaymentWebhookEvent, PaymentWebhookLog
+from .retention import prune_webhook_logs
+from .webhooks import process_webhook_events, replay_deliveries
+
+
+def sale_event(event_id, order_id, event_type='PAYMENT.SALE.COMPLETED'):
+    return {'id': event_id, 'event_type': event_type, 'resource': {'id': f"SALE-{event_id}", 'parent_payment': order_id}}
+
+
+def paypal_response(status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = orjson.dumps(body)
+    return response
+
+
+@mock.patch('payments.gateway.time.sleep')
+class PayPalGatewayTest(SimpleTestCase):
+    """Token caching, retries and the circuit breaker, against a scripted transport."""
+
+    def setUp(self):
+        cache.clear()
+        self.gateway = PayPalGateway('client', 'secret', 'https://paypal.invalid', {**gateway_settings(), 'BREAKER_FAILURES': 3})
+        self.token = paypal_response(200, {'access_token': 'A1', 'expires_in': 3600})
+
+    def script(self, *responses):
+        """Make the session answer with ``responses`` in order (exceptions are raised)."""
+        return mock.patch.object(self.gateway.session, 'request', side_effect=list(responses))
+
+    def test_token_is_reused(self, sleep):
+        with self.script(self.token, paypal_response(201, {'id': 'PAY-1'}), paypal_response(200, {'id': 'PAY-1'})) as request:
+            self.assertEqual(self.gateway.create_payment({})['id'], 'PAY-1')
+            self.gateway.find_payment('PAY-1')
+        self.assertEqual([call.args[1] for call in request.call_args_list], [
+            'https://paypal.invalid/v1/oauth2/token',
+            'https://paypal.invalid/v1/payments/payment',
+            'https://paypal.invalid/v1/payments/payment/PAY-1',
+        ])
+        self.assertIn('PayPal-Request-Id', request.call_args_list[1].kwargs['headers'])
+
+    def test_retries_then_fails_fast_once_open(self, sleep):
+        with self.script(self.token, paypal_response(503, {}), requests.Timeout(), paypal_response(200, {'id': 'PAY-1'})):
+            self.assertEqual(self.gateway.find_payment('PAY-1')['id'], 'PAY-1')
+
+        with self.script(*[requests.ConnectionError()] * 3) as request:
+            with self.assertRaises(GatewayUnavailable):
+                self.gateway.find_payment('PAY-1')
+            self.assertEqual(self.gateway.breaker.state, 'open')
+            with self.assertRaises(GatewayUnavailable):
+                self.gateway.find_payment('PAY-1')
+        self.assertEqual(request.call_count, 3)
+
+    def test_refusals_are_not_retried(self, sleep):
+        refusal = paypal_response(400, {'name': 'PAYMENT_NOT_APPROVED_FOR_EXECUTION', 'message': 'Payer has not approved'})
+        with self.script(self.token, refusal) as request:
+            with self.assertRaisesMessage(PaymentGatewayError, 'Payer has not approved'):
+                self.gateway.execute_payment('PAY-1', 'PAYER')
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(self.gateway.breaker.state, 'closed')
+
+
+# Unsigned deliveries are only accepted in development
+@override_settings(DEBUG=True, PAYMENT_WEBHOOKS={'WEBHOOK_ID': ''})
+@mock.patch('payments.webhooks.schedule_processing')
+class PayPalWebhookTest(TestCase):
+    """Deliveries are only logged on receipt; processing applies each event once."""
+
+    def setUp(self):
+        allocator.reset()
+        origin = Airport.objects.create(code='NBO', name='Jomo Kenyatta', city='Nairobi', country='Kenya')
+        destination = Airport.objects.create(code='MBA', name='Moi', city='Mombasa', country='Kenya')
+        departure = timezone.now() + timedelta(days=7)
+        flight = Flight.objects.create(
+            flight_number='KQ600', departure_airport=origin, arrival_airport=destination,
+            departure_time=departure, arrival_time=departure + timedelta(hours=1),
+            price=100, available_seats=10, airline='Kenya Airways',
+        )
+        self.booking = Booking.objects.create(
+            user=User.objects.create_user(username='traveller', password='secret'),
+            flight=flight,
+            booking_reference=next_booking_reference(),
+            passengers=[{'name': 'Wanjiru Kamau'}],
+            total_amount=100,
+        )
+        SeatHold.objects.create(booking=self.booking, flight=flight, seats=1, expires_at=departure)
+        self.payment = Payment.objects.create(booking=self.booking, amount=100, paypal_order_id='PAY-1')
+        self.client = APIClient()
+
+    def deliver(self, event):
+        return self.client.post('/api/payments/webhook/paypal/', event, format='json')
+
+    def test_intake_only_logs(self, schedule):
+        with self.assertNumQueries(1):
+            response = self.deliver(sale_event('WH-1', 'PAY-1'))
+        self.assertEqual(response.status_code, 200)
+        schedule.assert_called_once()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+        self.assertEqual(self.client.post('/api/payments/webhook/paypal/', 'nope', content_type='application/json').status_code, 400)
+
+    def test_unsigned_events_never_apply(self, schedule):
+        with override_settings(DEBUG=False), self.assertLogs('payments.webhooks', 'ERROR'):
+            self.assertEqual(self.deliver(sale_event('WH-1', 'PAY-1')).status_code, 400)
+        # Configured, but the delivery carries no PayPal signature
+        with override_settings(DEBUG=False, PAYMENT_WEBHOOKS={'WEBHOOK_ID': 'WH-CONFIGURED'}):
+            self.assertEqual(self.deliver(sale_event('WH-1', 'PAY-1')).status_code, 400)
+        self.assertFalse(PaymentWebhookLog.objects.exists())
+        schedule.assert_not_called()
+        self.assertEqual(process_webhook_events(), 0)
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+        self.assertEqual(self.booking.status, 'pending_payment')
+
+    def test_events_apply_once(self, schedule):
+        for event_id in ('WH-1', 'WH-1', 'WH-2'):
+            self.deliver(sale_event(event_id, 'PAY-1'))
+        self.deliver({'id': 'WH-3', 'event_type': 'CHECKOUT.ORDER.APPROVED', 'resource': {}})
+        self.assertEqual(process_webhook_events(), 4)
+
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.booking.status, 'confirmed')
+        self.assertEqual(self.booking.seat_hold.status, 'sold')
+        self.assertEqual(self.booking.history.count(), 1)
+        self.assertEqual(
+            sorted(PaymentWebhookLog.objects.values_list('event_id', 'status')),
+            [('WH-1', 'duplicate'), ('WH-1', 'processed'), ('WH-2', 'processed'), ('WH-3', 'ignored')],
+        )
+
+        # A replay releases the event's claim; the payment has already moved on, so nothing changes
+        self.assertEqual(replay_deliveries(PaymentWebhookLog.objects.filter(event_id='WH-2')), 1)
+        self.assertEqual(process_webhook_events(), 1)
+        self.assertEqual(self.booking.history.count(), 1)
+        self.assertTrue(PaymentWebhookEvent.objects.filter(event_id='WH-2').exists())
+
+    def test_refund_in_same_batch_applies_after_sale(self, schedule):
+        self.deliver(sale_event('WH-R', 'PAY-1', 'PAYMENT.SALE.REFUNDED'))
+        self.deliver(sale_event('WH-S', 'PAY-1'))
+        process_webhook_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+
+    def test_refund_cancels_booking_and_releases_seats(self, schedule):
+        seats = self.booking.flight.available_seats
+        self.deliver(sale_event('WH-S', 'PAY-1'))
+        self.deliver(sale_event('WH-R', 'PAY-1', 'PAYMENT.SALE.REFUNDED'))
+        process_webhook_events()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'cancelled')
+        self.assertEqual(self.booking.seat_hold.status, 'released')
+        self.assertEqual(self.booking.history.latest('pk').notes, 'Payment refunded (webhook)')
+        self.booking.flight.refresh_from_db()
+        self.assertEqual(self.booking.flight.available_seats, seats + 1)
+
+    def test_failed_delivery_does_not_block_batch(self, schedule):
+        self.deliver(sale_event('WH-1', 'PAY-1'))
+        self.deliver(sale_event('WH-2', 'PAY-2'))
+        with mock.patch('payments.webhooks._order_id', side_effect=lambda payload: 1 / 0 if payload['id'] == 'WH-2' else 'PAY-1'), \
+                self.assertLogs('payments.webhooks', 'ERROR'):
+            process_webhook_events()
+        self.assertEqual(
+            dict(PaymentWebhookLog.objects.values_list('event_id', 'status')),
+            {'WH-1': 'processed', 'WH-2': 'failed'},
+        )
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+    def test_payloads_are_compressed_and_indexed_fields_recorded(self, schedule):
+        event = sale_event('WH-1', 'PAY-1')
+        event['resource']['links'] = [{'href': f"https://api.paypal.com/v1/payments/sale/{n}"} for n in range(40)]
+        self.deliver(event)
+        self.deliver(sale_event('WH-2', 'PAY-1'))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT event_id, payload FROM {PaymentWebhookLog._meta.db_table} ORDER BY id")
+            stored = {event_id: bytes(payload) for event_id, payload in cursor.fetchall()}
+        self.assertTrue(stored['WH-1'].startswith(ZSTD_MAGIC))
+        self.assertLess(len(stored['WH-1']), len(orjson.dumps(event)) / 2)
+        self.assertEqual(orjson.loads(stored['WH-2']), sale_event('WH-2', 'PAY-1'))
+        log = PaymentWebhookLog.objects.get(event_id='WH-1')
+        self.assertEqual(log.payload, event)
+        self.assertEqual(log.resource_id, 'SALE-WH-1')
+
+    def test_retention_drops_old_deliveries_and_claims(self, schedule):
+        now = timezone.now()
+        old = now - timedelta(days=200)
+        if supports_partitioning(connection):
+            ensure_monthly_partitions(PaymentWebhookLog._meta.db_table, [old])
+        for event_id in ('WH-OLD', 'WH-NEW'):
+            self.deliver(sale_event(event_id, 'PAY-1'))
+        process_webhook_events()
+        PaymentWebhookLog.objects.filter(event_id='WH-OLD').update(created_at=old)
+        PaymentWebhookEvent.objects.filter(event_id='WH-OLD').update(created_at=old)
+
+        retired, deleted, claims = prune_webhook_logs(days=90, now=now)
+        if supports_partitioning(connection):
+            self.assertEqual(retired, [f"{PaymentWebhookLog._meta.db_table}_p{month_start(old):%Y%m}"])
+            self.assertEqual(deleted, 0)
+        else:
+            self.assertEqual((retired, deleted), ([], 1))
+        self.assertEqual(claims, 1)
+        self.assertEqual(list(PaymentWebhookLog.objects.values_list('event_id', flat=True)), ['WH-NEW'])
+        self.assertEqual(list(PaymentWebhookEvent.objects.values_list('event_id', flat=True)), ['WH-NEW'])
+
+
+def pending_booking(user):
+    origin = Airport.objects.create(code='NBO', name='Jomo Kenyatta', city='Nairobi', country='Kenya')
+    destination = Airport.objects.create(code='MBA', name='Moi', city='Mombasa', country='Kenya')
+    departure = timezone.now() + timedelta(days=7)
+    flight = Flight.objects.create(
+        flight_number='KQ600', departure_airport=origin, arrival_airport=destination,
+        departure_time=departure, arrival_time=departure + timedelta(hours=1),
+        price=100, available_seats=10, airline='Kenya Airways',
+    )
+    booking = Booking.objects.create(
+        user=user, flight=flight, booking_reference=next_booking_reference(),
+        passengers=[{'name': 'Wanjiru Kamau'}], total_amount=100,
+    )
+    SeatHold.objects.create(booking=booking, flight=flight, seats=1, expires_at=departure)
+    return booking
+
+
+class IdempotentPaymentTest(TestCase):
+    """Retries of payment creation never reach PayPal twice."""
+
+    def setUp(self):
+        cache.clear()
+        allocator.reset()
+        user = User.objects.create_user(username='traveller', password='secret')
+        self.booking = pending_booking(user)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.gateway = mock.Mock()
+        self.gateway.create_payment.side_effect = lambda payment, request_id=None: {'id': f"PAY-{uuid.uuid4().hex}"}
+        patcher = mock.patch('payments.views.get_gateway', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, **headers):
+        return self.client.post(
+            f"/api/payments/create-paypal-payment/{self.booking.pk}/",
+            {'booking_reference': self.booking.booking_reference}, format='json', **headers,
+        )
+
+    def test_retry_with_key_is_replayed(self):
+        first = self.create(HTTP_IDEMPOTENCY_KEY='pay-1')
+        retry = self.create(HTTP_IDEMPOTENCY_KEY='pay-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.data, first.data)
+        self.gateway.create_payment.assert_called_once()
+        # The PayPal-Request-Id follows the key, so PayPal would dedupe too
+        self.assertTrue(self.gateway.create_payment.call_args.kwargs['request_id'])
+
+    def test_retry_without_key_stops_before_paypal(self):
+        self.assertEqual(self.create().status_code, 200)
+        response = self.create()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['payment']['paypal_order_id'], Payment.objects.get().paypal_order_id)
+        self.gateway.create_payment.assert_called_once()
+
+
+class ExecutePaymentTest(TestCase):
+    """Executing a payment completes it and confirms its booking together; retries skip PayPal."""
+
+    def setUp(self):
+        allocator.reset()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.booking = pending_booking(self.user)
+        self.payment = Payment.objects.create(booking=self.booking, amount=100, paypal_order_id='PAY-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.gateway = mock.Mock()
+        patcher = mock.patch('payments.views.get_gateway', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def execute(self, payment_id='PAY-1'):
+        return self.client.post('/api/payments/execute-payment/', {'payment_id': payment_id, 'payer_id': 'PAYER'}, format='json')
+
+    def test_execute_confirms_booking(self):
+        response = self.execute()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'completed')
+        self.gateway.execute_payment.assert_called_once_with('PAY-1', 'PAYER')
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+        self.assertEqual(self.booking.seat_hold.status, 'sold')
+        self.assertEqual(list(self.booking.history.values_list('status', flat=True)), ['confirmed'])
+
+        # Already completed: answered from the database alone
+        with self.assertNumQueries(1):
+            retry = self.execute()
+        self.assertEqual(retry.status_code, 200)
+        self.gateway.execute_payment.assert_called_once()
+
+    def test_only_the_owner_can_execute(self):
+        self.client.force_authenticate(User.objects.create_user(username='other', password='secret'))
+        self.assertEqual(self.execute().status_code, 404)
+        self.gateway.execute_payment.assert_not_called()
+
+    def test_cancelled_booking_is_not_revived(self):
+        transition(self.booking, 'cancelled', 'Expired')
+        response = self.execute()
+        self.assertEqual(response.status_code, 200)
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.booking.status, 'cancelled')
+        self.assertEqual(self.booking.seat_hold.status, 'held')
+
+    def test_payment_expired_while_paypal_executed_it(self):
+        def sweep_meanwhile(payment_id, payer_id):
+            SeatHold.objects.filter(booking=self.booking).update(expires_at=timezone.now() - timedelta(hours=1))
+            self.assertEqual(expire_unpaid_bookings(), (1, 1, 1))
+
+        self.gateway.execute_payment.side_effect = sweep_meanwhile
+        with self.assertLogs('payments.views', 'ERROR'):
+            response = self.execute()
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.data['refund_required'])
+        self.assertEqual(response.data['payment']['status'], 'cancelled')
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.paypal_payer_id), ('cancelled', 'PAYER'))
+        self.assertEqual(self.booking.status, 'cancelled')
+        self.assertEqual(self.booking.seat_hold.status, 'released')
+
+    def test_lapsed_hold_without_seats_keeps_booking_pending(self):
+        SeatHold.objects.filter(booking=self.booking).update(status='released')
+        Flight.objects.filter(pk=self.booking.flight_id).update(available_seats=0)
+        with self.assertLogs('payments.views', 'ERROR'):
+            response = self.execute()
+        self.assertEqual(response.status_code, 409)
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.booking.status, 'pending_payment')
+        self.assertFalse(self.booking.history.exists())
@@ -1,98 +1,182 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from bookings.models import Booking
+from bookings.inventory import SeatsUnavailable, mark_sold
+from bookings.lifecycle import transition_many
+from core.idempotency import idempotent
+from .gateway import GatewayUnavailable, PaymentGatewayError, booking_sale, get_gateway
 from .models import Payment, PaymentWebhookLog
-from .serializers import PaymentSerializer, PaymentWebhookLogSerializer
-import paypalrestsdk
-import json
-from django.conf import settings
+from .serializers import PaymentSerializer
+from .webhooks import WebhookSignatureError, record_delivery, verify_signature
+import logging
+import orjson
+from django.db import transaction
+from django.db.models.functions import Now
 from django.views.decorators.csrf import csrf_exempt
 
-# Configure PayPal
-paypalrestsdk.configure({
-    "mode": settings.PAYPAL_MODE,
-    "client_id": settings.PAYPAL_CLIENT_ID,
-    "client_secret": settings.PAYPAL_CLIENT_SECRET
-})
+logger = logging.getLogger(__name__)
+
+
+def gateway_error_response(error):
+    """503 while PayPal is unreachable, so clients retry; 400 for PayPal's own refusals."""
+    if isinstance(error, GatewayUnavailable):
+        return Response({'error': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({'error': str(error), 'details': error.details}, status=status.HTTP_400_BAD_REQUEST)
 
 # ------------------------------
 # Create PayPal Payment (booking_ref in request body)
 # ------------------------------
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-def create_paypal_payment(request):
+@idempotent('payments.create')
+def create_paypal_payment(request, booking_id):
     booking_ref = request.data.get('booking_reference')  # new variable
     if not booking_ref:
         return Response({'error': 'Booking reference is required'}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        booking = Booking.objects.get(booking_reference=booking_ref, user=request.user)
-
-        payment = paypalrestsdk.Payment({
-            "intent": "sale",
-            "payer": {"payment_method": "paypal"},
-            "redirect_urls": {
-                "return_url": f"{settings.FRONTEND_URL}/payment/success/",
-                "cancel_url": f"{settings.FRONTEND_URL}/payment/cancel/"
-            },
-            "transactions": [{
-                "amount": {"total": f"{float(booking.total_amount):.2f}", "currency": "USD"},
-                "description": f"Flight booking {booking.booking_reference}",
-                "custom": json.dumps({"booking_ref": booking.booking_reference, "user_id": request.user.id})
-            }]
-        })
-
-        if payment.create():
-            db_payment = Payment.objects.create(
-                booking=booking,
-                amount=booking.total_amount,
-                payment_method='paypal',
-                paypal_order_id=payment.id,
-                status='pending'
+        booking = Booking.objects.select_related('payment').get(pk=booking_id, booking_reference=booking_ref, user=request.user)
+        # Checked before PayPal is asked for an order the one-to-one could not store
+        if hasattr(booking, 'payment'):
+            return Response(
+                {'error': 'A payment already exists for this booking', 'payment': PaymentSerializer(booking.payment).data},
+                status=status.HTTP_409_CONFLICT,
             )
-            serializer = PaymentSerializer(db_payment)
-            return Response(serializer.data)
-        else:
-            return Response({'error': payment.error}, status=status.HTTP_400_BAD_REQUEST)
+
+        # With an Idempotency-Key, a retry that gets past our stored key still maps to the same PayPal order
+        payment = get_gateway().create_payment(
+            booking_sale(booking, {"booking_ref": booking.booking_reference, "user_id": request.user.id}),
+            request_id=request.idempotency_key,
+        )
+        db_payment = Payment.objects.create(
+            booking=booking,
+            amount=booking.total_amount,
+            payment_method='paypal',
+            paypal_order_id=payment['id'],
+            status='pending'
+        )
+        serializer = PaymentSerializer(db_payment)
+        return Response(serializer.data)
 
     except Booking.DoesNotExist:
         return Response({'error': 'Booking not found'}, status=status.HTTP_404_NOT_FOUND)
+    except PaymentGatewayError as e:
+        return gateway_error_response(e)
 
 
 # ------------------------------
 # Execute PayPal Payment
 # ------------------------------
+def complete_payment(payment_pk, booking, payer_id):
+    """
+    Mark a pending payment completed and confirm its booking, converting
+    the seat hold; returns whether this call completed the payment. Every
+    update is conditional, so a webhook that completed the payment
+    meanwhile is not applied twice, and a booking the expiry sweep has
+    cancelled stays cancelled without getting its seats back. Raises
+    SeatsUnavailable, with nothing changed, if the hold lapsed and the
+    seats are gone.
+    """
+    with transaction.atomic():
+        completed = Payment.objects.filter(pk=payment_pk, status='pending').update(
+            status='completed', paypal_payer_id=payer_id, updated_at=Now()
+        )
+        if completed and transition_many([booking.pk], 'confirmed', 'Payment received') and not mark_sold(booking):
+            raise SeatsUnavailable(f"No seats left for booking {booking.booking_reference}")
+        return bool(completed)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def execute_paypal_payment(request):
+    """
+    Execute the buyer-approved PayPal payment, then complete it and confirm
+    its booking in one short transaction. PayPal is called before the
+    transaction, so no row stays locked while we wait on it. A payment that
+    is already completed (a retry, or the webhook got there first) is
+    returned without calling PayPal. One that stopped being pending while
+    PayPal executed it is answered with 409 and ``refund_required``, and
+    logged for review: the buyer has paid for nothing.
+    """
     payment_id = request.data.get('payment_id')
     payer_id = request.data.get('payer_id')
+    if not payment_id or not payer_id:
+        return Response({'error': 'payment_id and payer_id are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    db_payment = Payment.objects.select_related('booking').filter(
+        paypal_order_id=payment_id, booking__user=request.user
+    ).first()
+    if db_payment is None:
+        return Response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
+    if db_payment.status == 'completed':
+        return Response(PaymentSerializer(db_payment).data)
+    if db_payment.status != 'pending':
+        return Response({'error': f'Payment is {db_payment.status}'}, status=status.HTTP_409_CONFLICT)
+
     try:
-        payment = paypalrestsdk.Payment.find(payment_id)
-        if payment.execute({"payer_id": payer_id}):
-            db_payment = Payment.objects.get(paypal_order_id=payment_id)
-            db_payment.status = 'completed'
-            db_payment.paypal_payer_id = payer_id
-            db_payment.save()
-            serializer = PaymentSerializer(db_payment)
-            return Response(serializer.data)
-        else:
-            return Response({'error': payment.error}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        get_gateway().execute_payment(payment_id, payer_id)
+    except PaymentGatewayError as e:
+        return gateway_error_response(e)
+
+    booking = db_payment.booking
+    seats_gone = False
+    try:
+        completed = complete_payment(db_payment.pk, booking, payer_id)
+    except SeatsUnavailable:
+        # Everything was rolled back; the money is taken, so the payment is still recorded
+        completed = Payment.objects.filter(pk=db_payment.pk, status='pending').update(
+            status='completed', paypal_payer_id=payer_id, updated_at=Now()
+        )
+        seats_gone = True
+    if completed:
+        db_payment.status, db_payment.paypal_payer_id = 'completed', payer_id
+    else:
+        db_payment.refresh_from_db()
+    if db_payment.status != 'completed':
+        # PayPal has charged the buyer, but e.g. the expiry sweep cancelled the payment meanwhile
+        Payment.objects.filter(pk=db_payment.pk).update(paypal_payer_id=payer_id, updated_at=Now())
+        db_payment.paypal_payer_id = payer_id
+        logger.error(
+            'Payment %s executed at PayPal but is %s; booking %s needs a refund or manual review',
+            payment_id, db_payment.status, booking.booking_reference,
+        )
+        return Response(
+            {
+                'error': f'Payment received, but it was {db_payment.status} meanwhile; it will be refunded',
+                'refund_required': True,
+                'payment': PaymentSerializer(db_payment).data,
+            },
+            status=status.HTTP_409_CONFLICT,
+        )
+    if seats_gone:
+        logger.error('Payment %s executed but booking %s has no seats left', payment_id, booking.booking_reference)
+        return Response(
+            {'error': 'Payment received, but the seats are no longer available', 'payment': PaymentSerializer(db_payment).data},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response(PaymentSerializer(db_payment).data)
 
 
 # ------------------------------
 # PayPal Webhook
 # ------------------------------
 @api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
 @csrf_exempt
 def paypal_webhook(request):
-    serializer = PaymentWebhookLogSerializer(data={
-        'payload': request.data,
-        'event_type': request.data.get('event_type', 'unknown')
-    })
-    if serializer.is_valid():
-        serializer.save()
+    """Verify, log and acknowledge; payments.webhooks processes the event in the background."""
+    # The signature covers the exact bytes PayPal sent
+    body = request.body
+    try:
+        verify_signature(request.headers, body)
+        event = orjson.loads(body)
+    except WebhookSignatureError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except orjson.JSONDecodeError:
+        return Response({'error': 'Invalid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(event, dict):
+        return Response({'error': 'Expected a JSON object'}, status=status.HTTP_400_BAD_REQUEST)
+    record_delivery(event)
     return Response(status=status.HTTP_200_OK)
@@ -0,0 +1,275 @@
+"""
+PayPal webhook intake and processing.
+
+Intake (``paypal_webhook``) verifies the delivery's signature, appends it to
+``PaymentWebhookLog`` with one INSERT and answers 200. It does nothing else,
+so PayPal's retries stay rare and cheap. It also asks Celery to run the
+processor, at most once per ``SCHEDULE_SECONDS``; beat runs it as well in
+case that message is lost.
+
+The processor takes received deliveries in batches of ``BATCH_SIZE``,
+claimed with ``SKIP LOCKED`` so several workers can drain the queue. Each
+event id is claimed by inserting into ``PaymentWebhookEvent``, whose unique
+index makes retried and replayed deliveries of an event no-ops. Claimed
+events are applied per target status with one conditional UPDATE each:
+e.g. only a pending payment becomes completed, so applying an event twice,
+or after ``execute_paypal_payment`` got there first, changes nothing. A
+batch that fails is retried one delivery at a time, and the deliveries that
+still fail are marked ``failed`` for ``replay_payment_webhooks``.
+"""
+import logging
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Now
+
+from bookings.inventory import mark_sold_many, release_holds
+from bookings.lifecycle import transition_many
+from bookings.models import Booking, SeatHold
+from .models import Payment, PaymentWebhookEvent, PaymentWebhookLog
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_KEY = 'payments:webhooks:scheduled'
+
+# Event type -> (payment status it sets, payment statuses it applies to)
+PAYMENT_TRANSITIONS = {
+    'PAYMENT.SALE.COMPLETED': ('completed', ('pending',)),
+    'PAYMENT.CAPTURE.COMPLETED': ('completed', ('pending',)),
+    'PAYMENT.SALE.DENIED': ('failed', ('pending',)),
+    'PAYMENT.CAPTURE.DENIED': ('failed', ('pending',)),
+    'PAYMENT.SALE.REFUNDED': ('refunded', ('completed',)),
+    'PAYMENT.CAPTURE.REFUNDED': ('refunded', ('completed',)),
+}
+APPLY_ORDER = ('completed', 'failed', 'refunded')
+
+
+def webhook_settings():
+    defaults = {
+        'WEBHOOK_ID': '',
+        'BATCH_SIZE': 500,
+        'SCHEDULE_SECONDS': 1,
+        # payments.retention
+        'RETENTION_DAYS': 90,
+        'RETENTION_ACTION': 'drop',
+        'PARTITIONS_AHEAD': 2,
+    }
+    defaults.update(getattr(settings, 'PAYMENT_WEBHOOKS', {}))
+    return defaults
+
+
+class WebhookSignatureError(Exception):
+    """The delivery is not signed by PayPal for our webhook."""
+
+
+# ------------------------------
+# Intake
+# ------------------------------
+@lru_cache(maxsize=16)
+def _certificate(cert_url):
+    """PayPal's signing certificate at ``cert_url``, fetched once per process and checked against the SDK's chain."""
+    from OpenSSL import crypto
+    from paypalrestsdk import WebhookEvent
+
+    parts = urlsplit(cert_url)
+    if parts.scheme != 'https' or not (parts.hostname or '').endswith('.paypal.com'):
+        raise WebhookSignatureError(f"Untrusted certificate URL: {cert_url}")
+    response = requests.get(cert_url, timeout=5)
+    response.raise_for_status()
+    cert = crypto.load_certificate(crypto.FILETYPE_PEM, response.text)
+    if not WebhookEvent._verify_certificate(cert):
+        raise WebhookSignatureError('Certificate is not a valid PayPal certificate')
+    return cert
+
+
+def verify_signature(headers, body):
+    """
+    Check the PAYPAL-TRANSMISSION-* headers against the raw ``body``.
+    Without a WEBHOOK_ID nothing can be verified: every delivery is
+    refused, except under DEBUG, where unsigned deliveries are accepted for
+    development.
+    """
+    webhook_id = webhook_settings()['WEBHOOK_ID']
+    if not webhook_id:
+        if settings.DEBUG:
+            return
+        logger.error('PAYMENT_WEBHOOKS has no WEBHOOK_ID; refusing an unverifiable PayPal webhook')
+        raise WebhookSignatureError('Webhook verification is not configured')
+    from paypalrestsdk import WebhookEvent
+
+    required = ('Paypal-Transmission-Id', 'Paypal-Transmission-Time', 'Paypal-Transmission-Sig', 'Paypal-Cert-Url')
+    if any(not headers.get(name) for name in required):
+        raise WebhookSignatureError('Missing PayPal transmission headers')
+    try:
+        cert = _certificate(headers['Paypal-Cert-Url'])
+    except (requests.RequestException, ValueError) as e:
+        raise WebhookSignatureError(f"Cannot load certificate: {e}")
+    algorithm = {'SHA256withRSA': 'sha256WithRSAEncryption', 'SHA1withRSA': 'sha1WithRSAEncryption'}.get(
+        headers.get('Paypal-Auth-Algo', ''), 'sha256'
+    )
+    if not WebhookEvent._verify_signature(
+        headers['Paypal-Transmission-Id'], headers['Paypal-Transmission-Time'], webhook_id,
+        body.decode('utf-8'), cert, headers['Paypal-Transmission-Sig'], algorithm,
+    ):
+        raise WebhookSignatureError('Signature does not match')
+
+
+def _resource_id(payload):
+    resource = payload.get('resource') if isinstance(payload, dict) else None
+    return str(resource.get('id', '') if isinstance(resource, dict) else '')[:100]
+
+
+def record_delivery(event):
+    """Append one delivery to the log and make sure the processor will run."""
+    log = PaymentWebhookLog.objects.create(
+        payload=event,
+        event_type=str(event.get('event_type', 'unknown'))[:100],
+        event_id=str(event.get('id', ''))[:100],
+        resource_id=_resource_id(event),
+    )
+    schedule_processing()
+    return log
+
+
+def schedule_processing():
+    if not cache.add(SCHEDULE_KEY, 1, timeout=webhook_settings()['SCHEDULE_SECONDS']):
+        return
+    from .tasks import process_payment_webhooks
+    try:
+        process_payment_webhooks.delay()
+    except Exception:
+        # The beat schedule picks the delivery up instead
+        logger.warning('Could not enqueue webhook processing', exc_info=True)
+
+
+# ------------------------------
+# Processing
+# ------------------------------
+def _order_id(payload):
+    """Our ``Payment.paypal_order_id`` for the event: the v1 parent payment or the v2 order id."""
+    resource = payload.get('resource') or {}
+    if not isinstance(resource, dict):
+        return ''
+    related = ((resource.get('supplementary_data') or {}).get('related_ids') or {})
+    return str(resource.get('parent_payment') or related.get('order_id') or '')
+
+
+def _apply(deliveries):
+    """
+    Claim and apply ``deliveries`` ((log id, event id, event type, payload)
+    tuples); returns {log id: status}. Runs inside the caller's transaction.
+    """
+    outcome = {}
+    claims = []
+    for log_id, event_id, event_type, payload in deliveries:
+        if not event_id:
+            outcome[log_id] = 'ignored'
+            continue
+        claims.append(PaymentWebhookEvent(
+            event_id=event_id, event_type=event_type, resource_id=_resource_id(payload), log_id=log_id,
+        ))
+    PaymentWebhookEvent.objects.bulk_create(claims, ignore_conflicts=True)
+    won = set(PaymentWebhookEvent.objects.filter(log_id__in=[claim.log_id for claim in claims]).values_list('log_id', flat=True))
+
+    # Target payment status -> order ids, for the events this call claimed
+    targets = {}
+    for log_id, event_id, event_type, payload in deliveries:
+        if log_id in outcome:
+            continue
+        if log_id not in won:
+            outcome[log_id] = 'duplicate'
+            continue
+        order_id = _order_id(payload) if event_type in PAYMENT_TRANSITIONS else ''
+        if not order_id:
+            outcome[log_id] = 'ignored'
+            continue
+        targets.setdefault(PAYMENT_TRANSITIONS[event_type], set()).add(order_id)
+        outcome[log_id] = 'processed'
+
+    # A refund delivered in the same batch as its sale applies after it
+    for (to_status, from_statuses), order_ids in sorted(targets.items(), key=lambda item: APPLY_ORDER.index(item[0][0])):
+        payments = Payment.objects.select_for_update().filter(paypal_order_id__in=order_ids, status__in=from_statuses)
+        changed = list(payments.values_list('pk', 'booking_id'))
+        if not changed:
+            continue
+        Payment.objects.filter(pk__in=[pk for pk, _ in changed], status__in=from_statuses).update(
+            status=to_status, updated_at=Now()
+        )
+        if to_status == 'completed':
+            pending = Booking.objects.filter(pk__in=[booking_id for _, booking_id in changed], status='pending_payment')
+            transition_many(
+                mark_sold_many(pending.values_list('pk', flat=True)), 'confirmed', 'Payment received (webhook)',
+            )
+        elif to_status == 'refunded':
+            cancelled = transition_many(
+                [booking_id for _, booking_id in changed], 'cancelled', 'Payment refunded (webhook)',
+            )
+            release_holds(SeatHold.objects.filter(booking_id__in=cancelled), status='sold')
+    return outcome
+
+
+def _finish(outcome, errors=None):
+    by_status = {}
+    for log_id, status in outcome.items():
+        by_status.setdefault(status, []).append(log_id)
+    for status, log_ids in by_status.items():
+        PaymentWebhookLog.objects.filter(pk__in=log_ids).update(status=status, processed_at=Now())
+    for log_id, error in (errors or {}).items():
+        PaymentWebhookLog.objects.filter(pk=log_id).update(status='failed', error=error[:2000], processed_at=Now())
+
+
+def process_batch(batch_size):
+    """Process up to ``batch_size`` received deliveries; returns how many were taken."""
+    with transaction.atomic():
+        deliveries = list(
+            PaymentWebhookLog.objects.filter(status='received')
+            .select_for_update(skip_locked=True)
+            .order_by('pk')
+            .values_list('pk', 'event_id', 'event_type', 'payload')[:batch_size]
+        )
+        if not deliveries:
+            return 0
+        try:
+            with transaction.atomic():
+                _finish(_apply(deliveries))
+            return len(deliveries)
+        except Exception:
+            logger.exception('Webhook batch failed; retrying its %d deliveries one by one', len(deliveries))
+
+        outcome, errors = {}, {}
+        for delivery in deliveries:
+            try:
+                with transaction.atomic():
+                    outcome.update(_apply([delivery]))
+            except Exception as e:
+                errors[delivery[0]] = f"{type(e).__name__}: {e}"
+        _finish(outcome, errors)
+        return len(deliveries)
+
+
+def process_webhook_events(batch_size=None):
+    """Drain the queue of received deliveries; returns how many were processed."""
+    batch_size = batch_size or webhook_settings()['BATCH_SIZE']
+    processed = 0
+    while True:
+        count = process_batch(batch_size)
+        processed += count
+        if count < batch_size:
+            return processed
+
+
+def replay_deliveries(deliveries):
+    """
+    Put ``deliveries`` (a PaymentWebhookLog queryset) back on the queue and
+    release their events' claims, so they are applied again as if new.
+    Returns how many were requeued.
+    """
+    with transaction.atomic():
+        log_ids = list(deliveries.values_list('pk', flat=True))
+        event_ids = set(PaymentWebhookLog.objects.filter(pk__in=log_ids).exclude(event_id='').values_list('event_id', flat=True))
+        PaymentWebhookEvent.objects.filter(event_id__in=event_ids).delete()
+        return PaymentWebhookLog.objects.filter(pk__in=log_ids).update(status='received', error='', processed_at=None)
@@ -0,0 +1,213 @@
+"""
+Knox token authentication without a database round-trip per request.
+
+Each request to ``knox.auth.TokenAuthentication`` costs at least three
+queries: the token lookup, its user, and the user's other tokens, which
+knox checks for expiry. ``CachedTokenAuthentication`` keeps the
+authenticated token, with its user, in two tiers keyed by the token's
+digest:
+
+- a per-process LRU of ``LOCAL_MAX_ENTRIES`` entries, each valid for
+  ``LOCAL_TTL_SECONDS``;
+- the shared cache, valid for ``SHARED_TTL_SECONDS``.
+
+On a miss, knox does its usual lookup, expiry cleanup included, and the
+result is cached. An expired token is never served from the cache.
+
+``LogoutAPI`` deletes the token through ``revoke_token()``, which drops
+it from both tiers and leaves a revocation marker in the shared cache. Every
+hit, local ones included, is checked against that marker in the same
+round-trip that would fetch the shared copy, so a logged-out token is
+refused by all processes at once. This relies on the shared cache really
+being shared: under ``LocMemCache`` each process has its own, which is why
+the settings require ``CACHE_REDIS_URL`` outside ``DEBUG``. A token
+deleted elsewhere (e.g. in the admin), or a deactivated user, is noticed
+within ``SHARED_TTL_SECONDS`` in other processes, plus ``LOCAL_TTL_SECONDS``
+if a process still holds a local copy.
+
+With ``AUTO_REFRESH``, the expiry is moved forward in the database at most
+once per knox ``MIN_REFRESH_INTERVAL`` for each token, across all
+processes. ``delete_expired_tokens()`` removes lapsed tokens in batches.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import get_token_model
+from knox.settings import knox_settings
+from rest_framework import exceptions
+
+
+def token_cache_settings():
+    defaults = {
+        'LOCAL_TTL_SECONDS': 5,
+        'LOCAL_MAX_ENTRIES': 10000,
+        'SHARED_TTL_SECONDS': 60,
+    }
+    defaults.update(getattr(settings, 'TOKEN_AUTH_CACHE', {}))
+    return defaults
+
+
+def _cache_key(digest):
+    return f"auth:knox:{digest}"
+
+
+def _refresh_key(digest):
+    return f"auth:knox:refresh:{digest}"
+
+
+def _revoked_key(digest):
+    return f"auth:knox:revoked:{digest}"
+
+
+class LocalTokenCache:
+    """Thread-safe LRU of pickled tokens with a per-entry TTL; entries are unpickled per hit, so requests never share objects."""
+
+    def __init__(self, max_entries, ttl, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            stored_at, blob = entry
+            if self.clock() - stored_at >= self.ttl:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+        return pickle.loads(blob)
+
+    def set(self, digest, blob):
+        with self._lock:
+            self._entries[digest] = (self.clock(), blob)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def local_cache():
+    global _local
+    if _local is None:
+        with _local_lock:
+            if _local is None:
+                config = token_cache_settings()
+                _local = LocalTokenCache(config['LOCAL_MAX_ENTRIES'], config['LOCAL_TTL_SECONDS'])
+    return _local
+
+
+def invalidate_token(digest):
+    """Forget a token in this process and the shared cache, e.g. after deleting it."""
+    local_cache().delete(digest)
+    cache.delete(_cache_key(digest))
+
+
+def revoke_token(digest):
+    """
+    Forget a deleted token everywhere: other processes may still hold it
+    locally, so a marker refuses it there until every cached copy has lapsed.
+    """
+    config = token_cache_settings()
+    cache.set(_revoked_key(digest), 1, config['SHARED_TTL_SECONDS'] + config['LOCAL_TTL_SECONDS'])
+    invalidate_token(digest)
+
+
+def _expired(auth_token):
+    return auth_token.expiry is not None and auth_token.expiry < timezone.now()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, token):
+        try:
+            digest = hash_token(token.decode('utf-8'))
+        except (TypeError, ValueError):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        auth_token = self._cached(digest)
+        if auth_token is None or _expired(auth_token):
+            invalidate_token(digest)
+            # knox's own lookup, with its expiry cleanup; raises for unknown or expired tokens
+            user, auth_token = super().authenticate_credentials(token)
+            self._store(digest, auth_token)
+            return user, auth_token
+
+        if knox_settings.AUTO_REFRESH and auth_token.expiry:
+            self.renew_token(auth_token)
+        return self.validate_user(auth_token)
+
+    def _cached(self, digest):
+        local = local_cache()
+        auth_token = local.get(digest)
+        if auth_token is not None:
+            if cache.get(_revoked_key(digest)) is None:
+                return auth_token
+            local.delete(digest)
+            return None
+        shared = cache.get_many([_cache_key(digest), _revoked_key(digest)])
+        blob = shared.get(_cache_key(digest))
+        if blob is None or _revoked_key(digest) in shared:
+            return None
+        local.set(digest, blob)
+        return pickle.loads(blob)
+
+    def _store(self, digest, auth_token):
+        blob = pickle.dumps(auth_token)
+        local_cache().set(digest, blob)
+        cache.set(_cache_key(digest), blob, token_cache_settings()['SHARED_TTL_SECONDS'])
+
+    def renew_token(self, auth_token):
+        """
+        knox's renewal, but a cached token may carry an old expiry, so the
+        write is also limited to one per MIN_REFRESH_INTERVAL per token by
+        a shared-cache marker; the cached copies get the new expiry.
+        """
+        new_expiry = timezone.now() + knox_settings.TOKEN_TTL
+        if knox_settings.AUTO_REFRESH_MAX_TTL is not None:
+            new_expiry = min(new_expiry, auth_token.created + knox_settings.AUTO_REFRESH_MAX_TTL)
+        interval = knox_settings.MIN_REFRESH_INTERVAL
+        if (new_expiry - auth_token.expiry).total_seconds() <= interval:
+            return
+        if not cache.add(_refresh_key(auth_token.digest), 1, interval):
+            return
+        get_token_model().objects.filter(digest=auth_token.digest).update(expiry=new_expiry)
+        auth_token.expiry = new_expiry
+        self._store(auth_token.digest, auth_token)
+
+
+def delete_expired_tokens(batch_size=5000, now=None):
+    """Delete tokens past their expiry, ``batch_size`` at a time; returns how many."""
+    AuthToken = get_token_model()
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            digests = list(
+                AuthToken.objects.filter(expiry__lt=now).values_list('digest', flat=True)[:batch_size]
+            )
+            if not digests:
+                return deleted
+            deleted += AuthToken.objects.filter(digest__in=digests).delete()[0]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.authentication import delete_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired knox tokens in batches. Celery beat runs this hourly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted = delete_expired_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:36
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(null=True)),
+                ('response', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('locked_until', models.DateTimeField(null=True)),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'idempotency_keys',
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
@@ -13,3 +14,22 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's Idempotency-Key, scoped to a view and user: the lock while
+    its first request runs, then the response retries get back. See
+    core.idempotency.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    # Null until the first request has finished
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    # Null once finished; a lock past this time was left by a request that died
+    locked_until = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'idempotency_keys'
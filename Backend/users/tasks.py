@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from core.idempotency import delete_expired_keys
+from .authentication import delete_expired_tokens as delete_expired
+
+
+@shared_task(name='users.tasks.delete_expired_tokens', ignore_result=True)
+def delete_expired_tokens():
+    """Beat task; knox only deletes expired tokens of users who still make requests."""
+    return delete_expired()
+
+
+@shared_task(name='users.tasks.delete_expired_idempotency_keys', ignore_result=True)
+def delete_expired_idempotency_keys():
+    """Beat task; an expired key is otherwise only replaced when its client reuses it."""
+    return delete_expired_keys()
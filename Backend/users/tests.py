@@ -1,3 +1,75 @@
+import pickle
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from knox.models import AuthToken
+from rest_framework.test import APIClient
+
+from .authentication import delete_expired_tokens, local_cache
+from .models import User
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    """Token checks are served from the cache after the first request, and logout takes effect at once."""
+
+    def setUp(self):
+        cache.clear()
+        local_cache().clear()
+        self.user = User.objects.create_user(username='traveller', password='secret')
+        self.auth_token, token = AuthToken.objects.create(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+    def profile(self):
+        return self.client.get('/api/auth/profile/')
+
+    def test_repeat_requests_skip_the_database(self):
+        self.assertEqual(self.profile().status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.profile()
+        self.assertEqual(response.data['username'], 'traveller')
+
+        # Another process: only the shared tier is warm
+        local_cache().clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.profile().status_code, 200)
+
+    def test_logout_revokes_token_immediately(self):
+        self.profile()
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertFalse(AuthToken.objects.exists())
+        self.assertEqual(self.profile().status_code, 401)
+
+    def test_logout_reaches_other_processes(self):
+        self.profile()
+        digest = self.auth_token.digest
+        held_elsewhere = pickle.dumps(local_cache().get(digest))
+        self.client.post('/api/auth/logout/')
+        # Another process still has the token in its local tier
+        local_cache().set(digest, held_elsewhere)
+        self.assertEqual(self.profile().status_code, 401)
+
+    def test_expired_token_is_not_served_from_cache(self):
+        self.profile()
+        later = timezone.now() + timedelta(days=3)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.profile().status_code, 401)
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_refresh_writes_are_throttled(self):
+        AuthToken.objects.filter(pk=self.auth_token.pk).update(expiry=timezone.now() + timedelta(hours=1))
+        self.profile()
+        refreshed = AuthToken.objects.get().expiry
+        self.assertGreater(refreshed, timezone.now() + timedelta(hours=47))
+        with self.assertNumQueries(0):
+            self.profile()
+        self.assertEqual(AuthToken.objects.get().expiry, refreshed)
 
-# Create your tests here.
+    def test_delete_expired_tokens(self):
+        AuthToken.objects.create(self.user, expiry=timedelta(seconds=-1))
+        AuthToken.objects.create(self.user, expiry=timedelta(seconds=-1))
+        self.assertEqual(delete_expired_tokens(batch_size=1), 2)
+        self.assertEqual(list(AuthToken.objects.all()), [self.auth_token])
@@ -2,6 +2,8 @@ from typing import Dict, Any, cast
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.contrib.auth import login, logout
+from knox.models import AuthToken
+from .authentication import revoke_token
 from .models import User
 from .serializer import UserSerializer, RegisterSerializer, LoginSerializer
 
@@ -68,5 +70,10 @@ class LogoutAPI(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
+        # The token must stop working everywhere now, not when its cached copies lapse
+        if isinstance(request.auth, AuthToken):
+            digest = request.auth.digest  # the primary key, cleared by delete()
+            request.auth.delete()
+            revoke_token(digest)
         logout(request)
         return Response({"message": "Logged out successfully"}, status=status.HTTP_200_OK)